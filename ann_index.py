@@ -0,0 +1,233 @@
+# ann_index.py
+# 近似最近邻索引：用球面 k-means 把电影向量分簇（倒排簇，IVF），查询时只在最相近的几个簇中精确打分。
+#
+# 精确模式需要为每部电影计算与全部电影的相似度（N×N），构建时间随电影数平方增长。
+# 分簇索引的构建只需在样本上训练簇中心，再把每部电影分配到最近的簇（N × 簇数），
+# 簇数固定时构建时间随电影数线性增长；查询先与簇中心比较，再只对 probes 个簇的成员计算余弦相似度。
+#
+# 用法（比较不同参数下的召回率和查询速度）:
+#   python ann_index.py --clusters 0 64 256 --probes 4 8 16 --k 10
+import argparse
+import time
+
+import numpy as np
+import scipy.sparse as sp
+
+DEFAULT_PROBES = 8
+# 自动选择簇数时的上下限
+MIN_CLUSTERS = 8
+MAX_CLUSTERS = 4096
+# 训练簇中心时，每个簇平均使用的样本数
+SAMPLES_PER_CLUSTER = 64
+TRAIN_ITERATIONS = 10
+# 分配阶段每次处理的行数
+ASSIGN_BLOCK_ROWS = 32768
+
+
+def auto_clusters(n_rows):
+    """根据电影数选择簇数（约为 √N），使每个簇的大小和簇数保持平衡"""
+    return int(np.clip(round(np.sqrt(max(n_rows, 1))), MIN_CLUSTERS, MAX_CLUSTERS))
+
+
+def _normalize_rows(dense):
+    norms = np.linalg.norm(dense, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (dense / norms).astype(np.float32)
+
+
+def _assign(matrix, centroids_t):
+    """把矩阵每一行分配到点积最大的簇中心，分块计算以限制内存"""
+    labels = np.empty(matrix.shape[0], dtype=np.int32)
+    for start in range(0, matrix.shape[0], ASSIGN_BLOCK_ROWS):
+        stop = min(start + ASSIGN_BLOCK_ROWS, matrix.shape[0])
+        labels[start:stop] = np.asarray(matrix[start:stop] @ centroids_t).argmax(axis=1)
+    return labels
+
+
+def _cluster_sums(matrix, labels, n_clusters):
+    """每个簇的成员向量之和，形状 (簇数, 特征数)"""
+    indicator = sp.csr_matrix((np.ones(len(labels), dtype=np.float32), (labels, np.arange(len(labels)))),
+                              shape=(n_clusters, len(labels)))
+    result = indicator @ matrix
+    return result.toarray() if sp.issparse(result) else np.asarray(result)
+
+
+class ClusterIndex:
+    """
+    余弦相似度的倒排簇（IVF）近似最近邻索引。
+
+    参数对召回率和速度的影响：
+    - n_clusters 越多，每个簇越小，查询越快，但近邻被分到未探查的簇里的概率越高；
+    - probes 为查询时探查的簇数，越大召回率越高，查询越慢（候选数约为 N × probes / 簇数）。
+
+    簇中心和按簇排列的行号都是普通数组，可以随模型一起保存并内存映射加载。
+    """
+
+    def __init__(self, centroids, labels, probes=DEFAULT_PROBES):
+        self.centroids = centroids  # (簇数, 特征数) float32，已归一化
+        self.probes = probes
+        self._set_labels(labels)
+
+    @property
+    def n_clusters(self):
+        return self.centroids.shape[0]
+
+    def _set_labels(self, labels):
+        self.labels = labels  # (N,) int32，每行所属的簇
+        # 按簇排列的行号，第 c 个簇的成员为 members[offsets[c]:offsets[c + 1]]
+        self.members = np.argsort(labels, kind='stable').astype(np.int32)
+        self.offsets = np.searchsorted(labels[self.members], np.arange(self.n_clusters + 1)).astype(np.int64)
+        self._centroids_t = np.ascontiguousarray(self.centroids.T)
+
+    @classmethod
+    def build(cls, matrix, n_clusters=None, probes=DEFAULT_PROBES, iterations=TRAIN_ITERATIONS, seed=0):
+        """
+        为 L2 归一化的（稀疏）矩阵构建索引。
+
+        先在随机样本上迭代训练簇中心（球面 k-means），再把全部行分配到最近的簇，
+        耗时约为 行数 × 每行非零元素数 × 簇数。
+
+        参数:
+        - matrix: 形状 (N, 特征数) 的矩阵，每行是一部电影的向量。
+        - n_clusters (int): 簇数，None 表示按电影数自动选择。
+        - probes (int): 查询时探查的簇数。
+        - iterations (int): 训练迭代次数。
+        - seed (int): 抽样和初始化的随机种子。
+        """
+        n_rows = matrix.shape[0]
+        n_clusters = min(n_clusters or auto_clusters(n_rows), n_rows)
+        rng = np.random.default_rng(seed)
+        sample_size = min(n_rows, n_clusters * SAMPLES_PER_CLUSTER)
+        sample = matrix[np.sort(rng.choice(n_rows, size=sample_size, replace=False))]
+
+        dense = sample[rng.choice(sample_size, size=n_clusters, replace=False)]
+        centroids = _normalize_rows(dense.toarray() if sp.issparse(dense) else np.asarray(dense))
+        for _ in range(iterations):
+            labels = _assign(sample, centroids.T)
+            sums = _cluster_sums(sample, labels, n_clusters)
+            empty = ~sums.any(axis=1)
+            # 空簇保留原来的中心
+            sums[empty] = centroids[empty]
+            centroids = _normalize_rows(sums)
+
+        return cls(centroids, _assign(matrix, centroids.T), probes)
+
+    def updated(self, matrix, rows):
+        """
+        返回把 rows（矩阵行号）重新分配到最近簇之后的新索引，用于增量更新：
+        rows 中超出原有行数的是新追加的电影。簇中心保持不变，原索引不受影响。
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        labels = np.zeros(matrix.shape[0], dtype=np.int32)
+        labels[:len(self.labels)] = self.labels
+        if len(rows):
+            labels[rows] = _assign(matrix[rows], self._centroids_t)
+        return ClusterIndex(self.centroids, labels, self.probes)
+
+    def candidates(self, centroid_scores):
+        """根据查询向量与各簇中心的相似度，返回 probes 个最近簇的全部成员"""
+        probes = min(self.probes, self.n_clusters)
+        if probes < self.n_clusters:
+            nearest = np.argpartition(-centroid_scores, probes - 1)[:probes]
+        else:
+            nearest = np.arange(self.n_clusters)
+        return np.concatenate([self.members[self.offsets[c]:self.offsets[c + 1]] for c in nearest])
+
+    def query(self, query_matrix, matrix, k, self_rows=None):
+        """
+        对 query_matrix 的每一行，在候选中按精确余弦相似度取 top-k。
+
+        参数:
+        - query_matrix: 查询向量（每行一个）。
+        - matrix: 建立索引的完整矩阵，用于候选的精确打分。
+        - k (int): 每行返回的近邻数。
+        - self_rows (array): 查询行在 matrix 中的行号，结果中会排除它们自身。
+
+        返回:
+        - a tuple: (矩阵行号数组 int32, 相似度数组 float32)，形状均为 (查询数, k)；
+          候选不足 k 个时，行号以 -1、相似度以 -inf 补齐。
+        """
+        n_queries = query_matrix.shape[0]
+        ids = np.full((n_queries, k), -1, dtype=np.int32)
+        scores = np.full((n_queries, k), -np.inf, dtype=np.float32)
+        centroid_scores = np.asarray(query_matrix @ self._centroids_t)
+        for i in range(n_queries):
+            candidates = self.candidates(centroid_scores[i])
+            if self_rows is not None:
+                candidates = candidates[candidates != self_rows[i]]
+            if not len(candidates):
+                continue
+            sims = matrix[candidates] @ query_matrix[i].T
+            sims = np.asarray(sims.toarray() if sp.issparse(sims) else sims, dtype=np.float32).ravel()
+            top = min(k, len(candidates))
+            best = np.argpartition(-sims, top - 1)[:top] if top < len(sims) else np.arange(len(sims))
+            best = best[np.argsort(-sims[best], kind='stable')]
+            ids[i, :top] = candidates[best]
+            scores[i, :top] = sims[best]
+        return ids, scores
+
+    def to_arrays(self, prefix='ann_'):
+        """保存到模型缓存用的数组（按簇排列的行号可由 labels 重新计算；probes 只影响查询，不保存）"""
+        return {prefix + 'centroids': self.centroids, prefix + 'labels': self.labels}
+
+    @classmethod
+    def from_arrays(cls, arrays, probes=DEFAULT_PROBES, prefix='ann_'):
+        """从 to_arrays 保存的（可能是内存映射的）数组恢复索引；缺少数组时返回 None"""
+        try:
+            return cls(arrays[prefix + 'centroids'], np.asarray(arrays[prefix + 'labels']), probes)
+        except KeyError:
+            return None
+
+
+def recall_at_k(matrix, index, k=10, sample=500, seed=0):
+    """
+    用精确的分块 top-k 结果作为基准，计算索引在随机抽取的 sample 行上的 recall@k。
+
+    返回:
+    - dict: {'recall', 'query_ms'（近似查询的平均耗时）, 'exact_ms'（精确查询的平均耗时）}
+    """
+    from recommend import _topk_similar
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(matrix.shape[0], size=min(sample, matrix.shape[0]), replace=False))
+    query = matrix[rows]
+
+    start = time.perf_counter()
+    exact_ids, exact_scores = _topk_similar(query, matrix, k, self_rows=rows)
+    exact_ms = (time.perf_counter() - start) * 1000 / len(rows)
+
+    start = time.perf_counter()
+    approx_ids, _ = index.query(query, matrix, k, self_rows=rows)
+    query_ms = (time.perf_counter() - start) * 1000 / len(rows)
+
+    hits = total = 0
+    for i in range(len(rows)):
+        # 相似度为0的“近邻”没有意义，不计入基准
+        truth = set(exact_ids[i][exact_scores[i] > 0].tolist())
+        total += len(truth)
+        hits += len(truth & set(approx_ids[i].tolist()))
+    return {'recall': hits / total if total else 1.0, 'query_ms': query_ms, 'exact_ms': exact_ms}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="比较不同近似索引参数下的召回率和查询速度")
+    parser.add_argument('--clusters', type=int, nargs='+', default=[0], help="簇数，0 表示自动")
+    parser.add_argument('--probes', type=int, nargs='+', default=[DEFAULT_PROBES], help="查询时探查的簇数")
+    parser.add_argument('--k', type=int, default=10, help="recall@k 中的 k")
+    parser.add_argument('--sample', type=int, default=500, help="参与评估的查询数")
+    args = parser.parse_args()
+
+    from recommend import MovieRecommender
+    matrix = MovieRecommender().tfidf_matrix
+    if matrix is None:
+        raise SystemExit("数据库为空，无法评估。")
+    print(f"共 {matrix.shape[0]} 部电影，自动选择的簇数为 {auto_clusters(matrix.shape[0])}。")
+    print(f"{'簇数':>6} {'探查':>4} {'构建(s)':>8} {'recall@' + str(args.k):>10} {'近似(ms)':>9} {'精确(ms)':>9}")
+    for n_clusters in args.clusters:
+        start = time.perf_counter()
+        index = ClusterIndex.build(matrix, n_clusters or None)
+        build_s = time.perf_counter() - start
+        for probes in args.probes:
+            index.probes = probes
+            result = recall_at_k(matrix, index, args.k, args.sample)
+            print(f"{index.n_clusters:>8} {probes:>6} {build_s:>9.2f} {result['recall']:>11.3f} "
+                  f"{result['query_ms']:>10.3f} {result['exact_ms']:>10.3f}")
@@ -0,0 +1,452 @@
+# benchmark.py
+# 可重复的性能基准：用合成语料测量数据导入、模型构建/加载、推荐查询、分页浏览和爬虫的耗时与内存。
+#
+# 用法:
+#   python benchmark.py run --sizes 1000 10000 100000 --output results.json
+#   python benchmark.py compare old.json new.json
+#   python benchmark.py generate --size 10000 --output corpus.csv
+#
+# 全程离线运行：语料由 data/movies_3.csv 中的真实字段随机组合生成，爬虫阶段使用 crawl_fixtures 的本地样例网站。
+# 每个阶段都在独立的子进程中运行，因此峰值内存互不影响，也不会受到上一阶段缓存的干扰。
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import subprocess
+import sys
+import time
+
+SOURCE_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'movies_3.csv')
+CSV_HEADER = ['id', 'title ', 'image_link ', 'country ', 'years ', 'director_description', 'leader', 'star ',
+              'description', 'all_tags', 'imdb', 'language', 'time_length']
+# 直接从真实数据中整体抽样的列
+SAMPLED_COLUMNS = ['country ', 'years ', 'director_description', 'leader', 'language', 'time_length']
+
+STAGES = ['ingest', 'build', 'load', 'query', 'browse', 'crawl']
+DEFAULT_SIZES = [1000, 10000]
+DEFAULT_QUERIES = 200
+DEFAULT_PAGE_SIZE = 50
+DEFAULT_CRAWL_PAGES = 10
+DEFAULT_SEED = 0
+# 子进程输出结果时使用的行前缀，其余输出（进度信息等）都会被忽略
+RESULT_PREFIX = 'BENCHMARK_RESULT '
+# 比较结果时，变化超过该比例才算回退
+DEFAULT_THRESHOLD = 0.1
+
+
+# --- 合成语料 ---
+class CorpusSampler:
+    """从 movies_3.csv 收集标题、句子片段、类别等素材，用来随机拼出任意数量的电影"""
+
+    def __init__(self, source_csv=SOURCE_CSV, seed=DEFAULT_SEED):
+        self.rng = random.Random(seed)
+        self.titles, self.clauses, self.categories = [], [], []
+        self.columns = {column: [] for column in SAMPLED_COLUMNS}
+        if os.path.exists(source_csv):
+            with open(source_csv, encoding='utf-8-sig', newline='') as f:
+                for row in csv.DictReader(f):
+                    self.titles.append(row['title '].strip())
+                    self.categories.append(row['all_tags'].strip())
+                    self.clauses.extend(c.strip() for c in re.split(r'[，。！？；\s]+', row['description']) if c.strip())
+                    for column in SAMPLED_COLUMNS:
+                        self.columns[column].append(row[column])
+        if not self.titles:
+            # 找不到真实数据时，退回到爬虫样例网站的词汇
+            from crawl_fixtures import WORDS, random_category
+            self.titles = ['样例电影']
+            self.clauses = [''.join(self.rng.choices(WORDS, k=self.rng.randint(2, 5))) for _ in range(2000)]
+            self.categories = [random_category(self.rng) for _ in range(200)]
+            self.columns = {column: [''] for column in SAMPLED_COLUMNS}
+
+    def row(self, movie_id):
+        rng = self.rng
+        description = '，'.join(rng.choices(self.clauses, k=rng.randint(8, 30))) + '。'
+        row = {
+            'id': movie_id,
+            # 加上编号保证标题唯一
+            'title ': f"{rng.choice(self.titles)}#{movie_id}",
+            'image_link ': '',
+            'star ': round(rng.uniform(2.0, 9.8), 1),
+            'description': description,
+            'all_tags': rng.choice(self.categories),
+            'imdb': '',
+        }
+        for column in SAMPLED_COLUMNS:
+            row[column] = rng.choice(self.columns[column])
+        return row
+
+
+def generate_corpus(path, size, seed=DEFAULT_SEED, source_csv=SOURCE_CSV):
+    """生成与 movies_3.csv 列结构相同的 size 行合成语料，相同的 seed 总是生成相同的文件"""
+    sampler = CorpusSampler(source_csv, seed)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_HEADER)
+        writer.writeheader()
+        for movie_id in range(size):
+            writer.writerow(sampler.row(movie_id))
+    return path
+
+
+# --- 测量工具 ---
+def _peak_rss_mb(who='self'):
+    """当前进程（或已结束的子进程）的峰值常驻内存（MB），平台不支持时返回 None"""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset / 1024 / 1024 if who == 'self' else None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == 'self' else resource.RUSAGE_CHILDREN)
+    # Linux 上单位是 KB，macOS 上是字节
+    return usage.ru_maxrss / 1024 / (1024 if sys.platform == 'darwin' else 1)
+
+
+def _cpu_seconds():
+    """本进程及已回收子进程（如并行分词的进程池）的CPU时间之和"""
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+def latency_summary(samples, prefix):
+    """把一组耗时（秒）汇总为毫秒单位的 p50/p95/p99/max"""
+    import numpy as np
+    values = np.asarray(samples, dtype=np.float64) * 1000
+    if not len(values):
+        return {}
+    return {f'{prefix}_p50_ms': float(np.percentile(values, 50)),
+            f'{prefix}_p95_ms': float(np.percentile(values, 95)),
+            f'{prefix}_p99_ms': float(np.percentile(values, 99)),
+            f'{prefix}_max_ms': float(values.max())}
+
+
+def _remove(*paths):
+    for path in paths:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+
+# --- 各个阶段（在子进程中、以该规模的工作目录为当前目录运行） ---
+def stage_ingest(args):
+    import csv_import
+    import db_function
+    _remove(db_function.DATABASE, db_function.DATABASE + '-wal', db_function.DATABASE + '-shm')
+    start = time.perf_counter()
+    csv_import.import_from_csv(args.corpus, progress_callback=lambda message: None)
+    elapsed = time.perf_counter() - start
+    rows = db_function.count_movies()
+    return {'rows': rows, 'rows_per_s': rows / elapsed}
+
+
+def stage_build(args):
+    import model_store
+    import text_segment
+    from recommend import MovieRecommender
+    # 清掉模型缓存和分词缓存，测量冷启动的完整构建
+    _remove(model_store.DEFAULT_STORE_DIR, text_segment.TOKEN_CACHE_DB)
+    recommender = MovieRecommender()
+    return {'rows': len(recommender.df), 'vocabulary': recommender.tfidf_matrix.shape[1]}
+
+
+def stage_load(args):
+    from recommend import MovieRecommender
+    recommender = MovieRecommender()
+    return {'rows': len(recommender.df)}
+
+
+def stage_query(args):
+    from recommend import MovieRecommender
+    recommender = MovieRecommender()
+    rng = random.Random(args.seed)
+    sample = recommender.df.sample(min(args.queries, len(recommender.df)), random_state=args.seed)
+
+    exact, search = [], []
+    for title in sample['title']:
+        start = time.perf_counter()
+        recommender.get_recommendations(title, top_n=5)
+        exact.append(time.perf_counter() - start)
+        # 模糊搜索：标题中随机截取的两个字
+        offset = rng.randrange(max(len(title) - 1, 1))
+        start = time.perf_counter()
+        recommender.resolve_title(title[offset:offset + 2])
+        search.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    recommender.recommend_many(sample.index.to_numpy(), top_n=5)
+    batch = time.perf_counter() - start
+
+    metrics = {'queries': len(sample), 'batch_ms': batch * 1000}
+    metrics.update(latency_summary(exact, 'query'))
+    metrics.update(latency_summary(search, 'search'))
+    return metrics
+
+
+def stage_browse(args):
+    import db_function
+    page_size = args.page_size
+    total = db_function.count_movies()
+
+    # 用键集分页从头翻到尾，每一页都计时
+    latencies, rows = [], db_function.get_movies_page(page_size)
+    while rows:
+        start = time.perf_counter()
+        rows = db_function.get_movies_page(page_size, after=db_function.row_key(rows[-1]))
+        latencies.append(time.perf_counter() - start)
+
+    # 对比：OFFSET 分页直接跳到最后一页
+    last_page = max(1, (total + page_size - 1) // page_size)
+    start = time.perf_counter()
+    db_function.get_movies_paginated(last_page, page_size)
+    offset_last = time.perf_counter() - start
+
+    metrics = {'rows': total, 'pages': len(latencies) + 1, 'offset_last_page_ms': offset_last * 1000}
+    metrics.update(latency_summary(latencies, 'page'))
+    return metrics
+
+
+def stage_crawl(args):
+    import crawler
+    import crawl_fixtures
+    import db_function
+    db_function.DATABASE = 'crawl.db'
+    _remove('crawl_site', 'crawl_http_cache', db_function.DATABASE, db_function.DATABASE + '-wal',
+            db_function.DATABASE + '-shm')
+    total = crawl_fixtures.write_fixture_site('crawl_site', pages=args.crawl_pages, seed=args.seed)
+    db_function.create_movies_table()
+    with crawl_fixtures.FixtureServer('crawl_site', latency=args.crawl_latency) as server:
+        stats = crawler.pachong(args.crawl_pages, progress_callback=lambda message: None, base_url=server.base_url,
+                                cache_dir='crawl_http_cache')
+        # 再爬一次：列表页走条件请求，已导入的电影不再下载详情页
+        recrawl = crawler.pachong(args.crawl_pages, progress_callback=lambda message: None,
+                                  base_url=server.base_url, cache_dir='crawl_http_cache')
+    return {'rows': total, 'items': stats['items'], 'items_per_s': stats['items_per_s'],
+            'pages_per_s': stats['pages_per_s'], 'requests': stats['requests'],
+            'recrawl_s': recrawl['elapsed'], 'recrawl_requests': recrawl['requests'],
+            'recrawl_not_modified': recrawl['not_modified']}
+
+
+STAGE_FUNCTIONS = {
+    'ingest': stage_ingest,
+    'build': stage_build,
+    'load': stage_load,
+    'query': stage_query,
+    'browse': stage_browse,
+    'crawl': stage_crawl,
+}
+
+
+# 子进程在计时前导入的模块
+PRELOAD_MODULES = ['db_function', 'csv_import', 'recommend', 'crawler', 'crawl_fixtures']
+
+
+def run_stage(args):
+    """子进程入口：运行单个阶段，把结果以一行 JSON 打印到标准输出"""
+    real_stdout = sys.stdout
+    # 先导入各模块，import 的耗时单独记录，不计入阶段耗时
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for module in PRELOAD_MODULES:
+            __import__(module)
+    import_s = time.perf_counter() - start
+
+    rss_before = _peak_rss_mb()
+    cpu_start = _cpu_seconds()
+    start = time.perf_counter()
+    # 各模块的进度信息不属于测量结果，丢弃
+    with contextlib.redirect_stdout(io.StringIO()):
+        metrics = STAGE_FUNCTIONS[args.stage](args)
+    result = {
+        'stage': args.stage,
+        'import_s': import_s,
+        'wall_s': time.perf_counter() - start,
+        'cpu_s': _cpu_seconds() - cpu_start,
+        'start_rss_mb': rss_before,
+        'peak_rss_mb': _peak_rss_mb(),
+        'children_peak_rss_mb': _peak_rss_mb('children'),
+    }
+    result.update(metrics)
+    real_stdout.write(RESULT_PREFIX + json.dumps(result) + '\n')
+
+
+# --- 主进程：按规模依次运行各阶段 ---
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _spawn_stage(stage, size_dir, corpus, args):
+    command = [sys.executable, os.path.abspath(__file__), '_stage', stage,
+               '--corpus', corpus, '--seed', str(args.seed), '--queries', str(args.queries),
+               '--page-size', str(args.page_size), '--crawl-pages', str(args.crawl_pages),
+               '--crawl-latency', str(args.crawl_latency)]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        [os.path.dirname(os.path.abspath(__file__))] + [p for p in [os.environ.get('PYTHONPATH')] if p]))
+    completed = subprocess.run(command, cwd=size_dir, env=env, capture_output=True, text=True, encoding='utf-8')
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    return {'stage': stage, 'error': (completed.stderr.strip().splitlines() or ['未知错误'])[-1]}
+
+
+def _format_result(result):
+    skip = {'stage', 'size'}
+    parts = []
+    for key, value in result.items():
+        if key in skip or value is None:
+            continue
+        parts.append(f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}")
+    return ', '.join(parts)
+
+
+def run_benchmarks(args):
+    workdir = os.path.abspath(args.workdir)
+    os.makedirs(workdir, exist_ok=True)
+    stages = args.stages
+    results = []
+
+    for size in args.sizes:
+        corpus = os.path.join(workdir, f'corpus-{size}-{args.seed}.csv')
+        if not os.path.exists(corpus):
+            print(f"正在生成 {size} 行合成语料...")
+            generate_corpus(corpus, size, args.seed)
+        size_dir = os.path.join(workdir, f'size-{size}')
+        os.makedirs(size_dir, exist_ok=True)
+        for stage in stages:
+            if stage == 'crawl':
+                continue
+            result = dict(_spawn_stage(stage, size_dir, corpus, args), size=size)
+            results.append(result)
+            print(f"[{size:>8}] {stage:<7} {_format_result(result)}")
+
+    # 爬虫阶段只与样例网站的页数有关，只运行一次
+    if 'crawl' in stages:
+        crawl_dir = os.path.join(workdir, 'crawl')
+        os.makedirs(crawl_dir, exist_ok=True)
+        result = _spawn_stage('crawl', crawl_dir, '', args)
+        result['size'] = result.get('rows')
+        results.append(result)
+        print(f"[{'fixture':>8}] {'crawl':<7} {_format_result(result)}")
+
+    report = {
+        'meta': {
+            'revision': _git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'seed': args.seed,
+            'queries': args.queries,
+            'page_size': args.page_size,
+            'crawl_pages': args.crawl_pages,
+            'crawl_latency': args.crawl_latency,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 '{args.output}'。")
+
+
+# --- 比较两次结果 ---
+def _higher_is_better(metric):
+    return metric.endswith('_per_s')
+
+
+def _is_compared(metric):
+    return metric.endswith(('_s', '_ms', '_mb', '_per_s'))
+
+
+def compare_results(old_path, new_path, threshold=DEFAULT_THRESHOLD):
+    """
+    逐项比较两次基准结果，打印每个指标的变化。
+
+    返回:
+    - list: 变差超过 threshold 的 (规模, 阶段, 指标, 旧值, 新值) 列表
+    """
+    with open(old_path, encoding='utf-8') as f:
+        old = {(r.get('size'), r['stage']): r for r in json.load(f)['results']}
+    with open(new_path, encoding='utf-8') as f:
+        new = {(r.get('size'), r['stage']): r for r in json.load(f)['results']}
+
+    regressions = []
+    print(f"{'规模':>8} {'阶段':<7} {'指标':<22} {'旧值':>12} {'新值':>12} {'变化':>9}")
+    for key in sorted(old.keys() & new.keys(), key=lambda k: (STAGES.index(k[1]), k[0] or 0)):
+        size, stage = key
+        for metric, old_value in old[key].items():
+            new_value = new[key].get(metric)
+            if not _is_compared(metric) or not isinstance(old_value, (int, float)) \
+                    or not isinstance(new_value, (int, float)):
+                continue
+            change = (new_value - old_value) / old_value if old_value else 0.0
+            worse = -change if _higher_is_better(metric) else change
+            flag = ''
+            if worse > threshold:
+                flag = ' ▲'
+                regressions.append((size, stage, metric, old_value, new_value))
+            print(f"{size or '':>8} {stage:<7} {metric:<22} {old_value:12.3f} {new_value:12.3f} {change:+8.1%}{flag}")
+    print(f"共 {len(regressions)} 项指标变差超过 {threshold:.0%}。")
+    return regressions
+
+
+def _add_stage_options(parser):
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help="随机种子")
+    parser.add_argument('--queries', type=int, default=DEFAULT_QUERIES, help="查询阶段的查询次数")
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE, help="浏览阶段每页条目数")
+    parser.add_argument('--crawl-pages', type=int, default=DEFAULT_CRAWL_PAGES, help="爬虫样例网站的列表页数")
+    parser.add_argument('--crawl-latency', type=float, default=0.01, help="样例服务器每个请求的模拟延迟（秒）")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="电影推荐系统性能基准")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="运行基准测试")
+    run_parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="语料规模（电影数）")
+    run_parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES, help="要运行的阶段")
+    run_parser.add_argument('--workdir', default='benchmark_runs', help="语料和各规模数据库所在目录")
+    run_parser.add_argument('--output', default='benchmark_results.json', help="结果JSON文件")
+    _add_stage_options(run_parser)
+
+    compare_parser = subparsers.add_parser('compare', help="比较两次基准结果")
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                                help="变差超过该比例时以非零状态码退出")
+
+    generate_parser = subparsers.add_parser('generate', help="只生成合成语料")
+    generate_parser.add_argument('--size', type=int, required=True)
+    generate_parser.add_argument('--output', required=True)
+    generate_parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+
+    stage_parser = subparsers.add_parser('_stage', help=argparse.SUPPRESS)
+    stage_parser.add_argument('stage', choices=STAGES)
+    stage_parser.add_argument('--corpus', default='')
+    _add_stage_options(stage_parser)
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        run_benchmarks(args)
+    elif args.command == 'compare':
+        return 1 if compare_results(args.old, args.new, args.threshold) else 0
+    elif args.command == 'generate':
+        generate_corpus(args.output, args.size, args.seed)
+        print(f"已生成 {args.size} 行语料到 '{args.output}'。")
+    else:
+        run_stage(args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
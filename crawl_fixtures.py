@@ -0,0 +1,162 @@
+# crawl_fixtures.py
+# 爬虫测试用的本地样例网站：生成与 hdmoli.pro 结构相同的HTML页面，并用本地HTTP服务器提供访问。
+import argparse
+import functools
+import os
+import random
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+# 生成样例文本用的词汇
+WORDS = ['一个', '故事', '男人', '女人', '家庭', '爱情', '城市', '秘密', '警察', '少年', '战争', '命运',
+         '梦想', '世界', '旅程', '真相', '朋友', '父亲', '母亲', '时间', '记忆', '冒险', '小镇', '江湖',
+         '复仇', '青春', '未来', '宇宙', '英雄', '危机', '逃离', '发现', '成长', '守护', '追寻', '救赎']
+CATEGORIES = ['剧情', '喜剧', '动作', '爱情', '科幻', '动画', '悬疑', '惊悚', '恐怖', '犯罪',
+              '奇幻', '冒险', '战争', '历史', '家庭', '传记', '音乐', '纪录片']
+
+LIST_ITEM_TEMPLATE = '''
+<div class="myui-vodlist__box">
+  <a class="myui-vodlist__thumb" href="/movie/{movie_id}.html" title="{title}">
+    <span class="pic-tag pic-tag-top">{rating}分</span>
+  </a>
+  <div class="myui-vodlist__detail">
+    <h4 class="title text-overflow"><a href="/movie/{movie_id}.html" title="{title}">{title}</a></h4>
+    <p class="text text-overflow text-muted hidden-xs">{year}/{category}</p>
+  </div>
+</div>'''
+
+DETAIL_TEMPLATE = '''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title></head>
+<body>
+<h1 class="title">{title}</h1>
+<p class="text-muted col-pd">剧情：{description}</p>
+</body></html>'''
+
+
+def random_sentence(rng, min_words=20, max_words=60):
+    """随机拼出一段中文简介"""
+    return '，'.join(''.join(rng.choices(WORDS, k=rng.randint(2, 5)))
+                    for _ in range(rng.randint(min_words, max_words) // 3)) + '。'
+
+
+def random_category(rng):
+    """随机的斜杠分隔类别，如 '剧情/爱情'"""
+    return '/'.join(rng.sample(CATEGORIES, rng.randint(1, 3)))
+
+
+def write_fixture_site(directory, pages=3, per_page=24, seed=0):
+    """
+    在 directory 下生成样例网站：mlist/index1-{页码}.html 列表页和 movie/{id}.html 详情页。
+
+    返回:
+    - int: 生成的电影总数。
+    """
+    rng = random.Random(seed)
+    os.makedirs(os.path.join(directory, 'mlist'), exist_ok=True)
+    os.makedirs(os.path.join(directory, 'movie'), exist_ok=True)
+    movie_id = 0
+    for page in range(1, pages + 1):
+        items = []
+        for _ in range(per_page):
+            movie_id += 1
+            title = f"样例电影{movie_id}"
+            items.append(LIST_ITEM_TEMPLATE.format(
+                movie_id=movie_id, title=title, rating=round(rng.uniform(5, 9.5), 1),
+                year=rng.randint(1990, 2025), category=random_category(rng).replace('/', ',')))
+            with open(os.path.join(directory, 'movie', f'{movie_id}.html'), 'w', encoding='utf-8') as f:
+                f.write(DETAIL_TEMPLATE.format(title=title, description=random_sentence(rng)))
+        with open(os.path.join(directory, 'mlist', f'index1-{page}.html'), 'w', encoding='utf-8') as f:
+            f.write('<!DOCTYPE html><html><head><meta charset="utf-8"></head><body>'
+                    + ''.join(items) + '</body></html>')
+    return movie_id
+
+
+class _FixtureHandler(SimpleHTTPRequestHandler):
+    """
+    在 SimpleHTTPRequestHandler 的 Last-Modified / If-Modified-Since 之外，
+    按文件修改时间和大小生成 ETag 并支持 If-None-Match，用于测试爬虫的条件请求。
+    """
+    # HTTP/1.1 才能保持长连接，SimpleHTTPRequestHandler 会发送 Content-Length
+    protocol_version = 'HTTP/1.1'
+
+    def __init__(self, *args, latency=0.0, **kwargs):
+        self.latency = latency
+        self._etag = None
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        if self.latency:
+            # 模拟网络延迟
+            time.sleep(self.latency)
+        path = self.translate_path(self.path)
+        self._etag = None
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            self._etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+            if self._etag in self.headers.get('If-None-Match', '').split(', '):
+                self.send_response(304)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+        super().do_GET()
+
+    def end_headers(self):
+        if self._etag:
+            self.send_header('ETag', self._etag)
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer:
+    """
+    在后台线程运行的本地HTTP服务器，提供 directory 下的样例页面。
+
+    用法:
+        with FixtureServer(directory) as server:
+            crawler.pachong(3, base_url=server.base_url)
+    """
+
+    def __init__(self, directory, port=0, latency=0.0):
+        handler = functools.partial(_FixtureHandler, directory=directory, latency=latency)
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f'http://127.0.0.1:{self.httpd.server_address[1]}'
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="生成并启动爬虫用的本地样例网站")
+    parser.add_argument('--dir', help="样例页面目录，默认生成到临时目录")
+    parser.add_argument('--pages', type=int, default=3, help="列表页数量")
+    parser.add_argument('--per-page', type=int, default=24, help="每页电影数")
+    parser.add_argument('--port', type=int, default=8000, help="监听端口")
+    parser.add_argument('--latency', type=float, default=0.0, help="每个请求的模拟延迟（秒）")
+    args = parser.parse_args()
+
+    directory = args.dir or tempfile.mkdtemp(prefix='crawl_fixtures_')
+    total = write_fixture_site(directory, args.pages, args.per_page)
+    server = FixtureServer(directory, args.port, args.latency)
+    print(f"已生成 {args.pages} 页共 {total} 部电影到 '{directory}'，服务地址: {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,125 @@
+# crawl_frontier.py
+# 可续爬的爬取队列：每个URL的状态保存在 movies.db 的 crawl_frontier 表中。
+#
+# 状态为 pending（已发现、尚未下载）、fetched（已下载并解析）、imported（解析结果已写入数据库）
+# 或 failed（下载或解析失败）。
+# 详情页下载解析成功后，解析出的电影信息也保存在表中，写入数据库后清除并标记为 imported。
+# 爬虫在两者之间被中断时，下次爬取直接使用保存的结果而不再下载；其余页面照常请求（有缓存时为条件请求）。
+# attempts 为连续失败的次数（下载成功后清零），详情页连续失败 MAX_ATTEMPTS 次后不再尝试。
+import json
+import time
+
+from db_function import get_db_connection
+
+PENDING, FETCHED, IMPORTED, FAILED = 'pending', 'fetched', 'imported', 'failed'
+# 详情页最多连续失败的次数
+MAX_ATTEMPTS = 5
+
+ENTRY_FIELDS = ('url', 'kind', 'state', 'attempts', 'last_seen', 'fetched_at', 'payload')
+
+
+def create_frontier_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS crawl_frontier (
+            url TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            state TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_seen REAL NOT NULL,
+            fetched_at REAL,
+            payload TEXT
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_crawl_frontier_state ON crawl_frontier (state)')
+    conn.commit()
+
+
+def _entry(row):
+    entry = dict(zip(ENTRY_FIELDS, row))
+    entry['payload'] = json.loads(entry['payload']) if entry['payload'] else None
+    return entry
+
+
+class CrawlFrontier:
+    """
+    爬取队列。只应在一个线程中使用（爬虫的调度线程），下载线程只负责下载。
+
+    每次状态变化都立即提交，进程随时被中断，已完成的工作都不会丢失。
+    """
+
+    def __init__(self, db_path=None, max_attempts=MAX_ATTEMPTS):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        with get_db_connection(db_path) as conn:
+            create_frontier_table(conn)
+
+    def get(self, url):
+        """返回 {'url', 'kind', 'state', 'attempts', 'last_seen', 'fetched_at', 'payload'}，不存在时返回 None"""
+        with get_db_connection(self.db_path) as conn:
+            row = conn.execute(f'SELECT {", ".join(ENTRY_FIELDS)} FROM crawl_frontier WHERE url = ?',
+                               (url,)).fetchone()
+        return None if row is None else _entry(row)
+
+    def see(self, urls, kind):
+        """
+        记录本次爬取发现的一批URL（新URL为 pending 状态，已有的只更新 last_seen），在一个事务中完成。
+
+        返回:
+        - dict: URL -> 该URL当前的记录，见 get。
+        """
+        urls = list(dict.fromkeys(urls))
+        now = time.time()
+        entries = {}
+        with get_db_connection(self.db_path) as conn:
+            conn.executemany('''
+                INSERT INTO crawl_frontier (url, kind, last_seen) VALUES (?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET last_seen = excluded.last_seen
+            ''', [(url, kind, now) for url in urls])
+            conn.commit()
+            for start in range(0, len(urls), 500):
+                batch = urls[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                for row in conn.execute(f'SELECT {", ".join(ENTRY_FIELDS)} FROM crawl_frontier '
+                                        f'WHERE url IN ({placeholders})', batch):
+                    entries[row[0]] = _entry(row)
+        return entries
+
+    def should_fetch(self, entry):
+        """连续失败次数已达上限的URL不再下载"""
+        return not (entry['state'] == FAILED and entry['attempts'] >= self.max_attempts)
+
+    def mark_fetched(self, url, payload=None):
+        with get_db_connection(self.db_path) as conn:
+            conn.execute('''
+                UPDATE crawl_frontier SET state = ?, attempts = 0, fetched_at = ?, payload = ?
+                WHERE url = ?
+            ''', (FETCHED, time.time(), None if payload is None else json.dumps(payload, ensure_ascii=False), url))
+            conn.commit()
+
+    def mark_imported(self, urls):
+        """这些详情页的解析结果已写入数据库：清除保存的结果，下次爬取时重新（条件）请求"""
+        urls = list(dict.fromkeys(urls))
+        with get_db_connection(self.db_path) as conn:
+            for start in range(0, len(urls), 500):
+                batch = urls[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                conn.execute(f'UPDATE crawl_frontier SET state = ?, payload = NULL WHERE url IN ({placeholders})',
+                             [IMPORTED] + batch)
+            conn.commit()
+
+    def mark_failed(self, url):
+        with get_db_connection(self.db_path) as conn:
+            conn.execute('UPDATE crawl_frontier SET state = ?, attempts = attempts + 1 WHERE url = ?',
+                         (FAILED, url))
+            conn.commit()
+
+    def counts(self):
+        """返回 {状态: URL数}"""
+        with get_db_connection(self.db_path) as conn:
+            return dict(conn.execute('SELECT state, COUNT(*) FROM crawl_frontier GROUP BY state'))
+
+    def reset(self):
+        """清空爬取队列（下次爬取从头开始）"""
+        with get_db_connection(self.db_path) as conn:
+            conn.execute('DELETE FROM crawl_frontier')
+            conn.commit()
@@ -1,45 +1,295 @@
 #! /usr/bin/python
 # -*- coding: UTF-8 -*-
+# 并发爬虫：共享连接池的 requests.Session + 线程池，按主机限制并发数，失败自动重试。
+# 爬取队列保存在数据库中（crawl_frontier），中断后可以接着爬；页面缓存在磁盘上（http_cache），
+# 再次爬取时发送条件请求，未变化的页面不重新传输，已在数据库中的电影不再下载详情页。
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from urllib.parse import urljoin, urlparse
+
 import requests
-import json
 from bs4 import BeautifulSoup
-#数据库采用sqlite
-import sqlite3
-import re
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
 import db_function
-from lxml import html
-import re
-def pachong(num_pages=1, progress_callback=None):
-    url='https://www.hdmoli.pro/mlist/index1-{}.html'.format(num_pages)
-    headers={
-        'User-Agent':'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36 Edg/137.0.0.0'
-
-    }
-    req=requests.get(url=url,headers=headers)
-    if req.status_code==200:
-        html_doc=req.content.decode('utf-8')
-        soup=BeautifulSoup(html_doc,'lxml')
-        lis=soup.find_all('div',class_='myui-vodlist__box')
-        i=0
-        for li in lis:
-            try:
-                i+=1
-                new_url=li.find('a')['href']
-                new_url='https://www.hdmoli.pro{}'.format(new_url)
-                response=requests.get(new_url,headers=headers)
-                if response.status_code==200:
-                    html_doc=response.content.decode('utf-8')
-                    soup=BeautifulSoup(html_doc,'lxml')
-                    comment=soup.find_all('p',class_='text-muted col-pd')[0].get_text()
-                    description = re.search(r'剧情：(.*)', comment).group(1)
-                score=li.find('span',class_='pic-tag pic-tag-top').get_text().strip()
-                name=li.find('div',class_='myui-vodlist__detail').find('a').get_text().strip()
-                ty_pe=li.find('p',class_='text text-overflow text-muted hidden-xs').get_text().strip()
-                ty_pe=re.sub(r'^\d{4}/',' ',ty_pe)
-                db_function.insert_movie(name,score,ty_pe,description)
-                print("爬取成功第{}部电影并成功导入到数据库".format(i))
-
-            except :
-                    continue
-    else:
-        print("数据爬取失败")
\ No newline at end of file
+import instrumentation
+from crawl_frontier import CrawlFrontier, FETCHED
+from http_cache import HttpCache, DEFAULT_CACHE_DIR
+from dedup import DuplicateDetector, DEFAULT_ACTION
+
+BASE_URL = 'https://www.hdmoli.pro'
+LIST_PATH = '/mlist/index1-{}.html'
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36 Edg/137.0.0.0'
+}
+
+# 默认的并发与重试参数
+DEFAULT_WORKERS = 8
+DEFAULT_PER_HOST = 4
+DEFAULT_TIMEOUT = 10
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+
+
+def create_session(pool_size=DEFAULT_WORKERS, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF):
+    """
+    创建所有线程共享的 Session：连接池保持长连接，连接错误和 429/5xx 响应按指数退避重试。
+    """
+    retry = Retry(total=retries, backoff_factor=backoff,
+                  status_forcelist=(429, 500, 502, 503, 504), allowed_methods=('GET',))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class HostLimiter:
+    """限制对同一主机同时进行的请求数"""
+
+    def __init__(self, per_host=DEFAULT_PER_HOST):
+        self.per_host = per_host
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    def __call__(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.per_host)
+            return self._semaphores[host]
+
+
+def fetch(session, url, limiter, timeout=DEFAULT_TIMEOUT, cache=None):
+    """
+    下载一个页面。给出 cache 时发送条件请求，服务器返回 304 则使用缓存的内容。
+
+    返回:
+    - a tuple: (解码后的HTML, 是否来自缓存)；请求失败（含重试后仍失败）时HTML为 None。
+    """
+    headers = cache.conditional_headers(url) if cache is not None else {}
+    with limiter(url), instrumentation.span('crawl.fetch'):
+        try:
+            response = session.get(url, timeout=timeout, headers=headers)
+        except requests.RequestException:
+            instrumentation.incr('crawl.errors')
+            return None, False
+    if response.status_code == 304 and headers:
+        content = cache.load(url)
+        if content is not None:
+            instrumentation.incr('crawl.not_modified')
+            return content.decode('utf-8'), True
+    if response.status_code != 200:
+        instrumentation.incr('crawl.errors')
+        return None, False
+    if cache is not None:
+        cache.store(url, response.content, response.headers)
+    return response.content.decode('utf-8'), False
+
+
+def parse_list_page(html_doc, base_url=BASE_URL):
+    """
+    解析电影列表页。
+
+    返回:
+    - list: 每部电影一个字典 {'title', 'rating', 'category', 'detail_url'}，解析失败的条目会被跳过。
+    """
+    soup = BeautifulSoup(html_doc, 'lxml')
+    items = []
+    for li in soup.find_all('div', class_='myui-vodlist__box'):
+        try:
+            detail_url = urljoin(base_url, li.find('a')['href'])
+            score = li.find('span', class_='pic-tag pic-tag-top').get_text().strip()
+            name = li.find('div', class_='myui-vodlist__detail').find('a').get_text().strip()
+            ty_pe = li.find('p', class_='text text-overflow text-muted hidden-xs').get_text().strip()
+            ty_pe = re.sub(r'^\d{4}/', ' ', ty_pe)
+        except (AttributeError, KeyError, TypeError):
+            continue
+        items.append({'title': name, 'rating': score, 'category': ty_pe, 'detail_url': detail_url})
+    return items
+
+
+def parse_detail_page(html_doc):
+    """解析电影详情页，返回剧情简介；找不到时返回 None"""
+    soup = BeautifulSoup(html_doc, 'lxml')
+    paragraphs = soup.find_all('p', class_='text-muted col-pd')
+    if not paragraphs:
+        return None
+    match = re.search(r'剧情：(.*)', paragraphs[0].get_text())
+    return match.group(1) if match else None
+
+
+def crawl(start_page=1, end_page=1, base_url=BASE_URL, workers=DEFAULT_WORKERS, per_host=DEFAULT_PER_HOST,
+          timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, progress_callback=None,
+          frontier=None, cache=None, skip_known=True):
+    """
+    并发爬取 [start_page, end_page] 范围内的列表页及其中每部电影的详情页。
+
+    列表页一下载完成，其中的详情页就立即提交给线程池，列表页和详情页并行下载。
+    标题已在数据库中的电影不再请求；上次下载解析后、写入数据库前被中断的详情页直接使用爬取队列中保存的结果。
+    其余页面都会重新请求，有缓存时为条件请求（未变化时返回 304，不传输页面内容）。
+
+    参数:
+    - start_page, end_page (int): 列表页页码范围（包含两端）。
+    - base_url (str): 网站根地址，测试时可指向本地的样例服务器。
+    - workers (int): 线程池大小（同时也是连接池大小）。
+    - per_host (int): 对同一主机的最大并发请求数。
+    - timeout (float): 单次请求超时时间（秒）。
+    - retries (int), backoff (float): 失败重试次数和指数退避系数。
+    - progress_callback (function): 用于报告进度的回调函数。
+    - frontier (CrawlFrontier): 爬取队列，记录每个URL的状态；None 表示不记录、不续爬。
+    - cache (HttpCache): 磁盘响应缓存，None 表示不发送条件请求。
+    - skip_known (bool): 是否跳过标题已在数据库中的电影。
+
+    返回:
+    - a tuple: (电影列表, 统计信息字典)
+    """
+    def report(message):
+        if progress_callback:
+            progress_callback(message)
+        else:
+            print(message)
+
+    session = create_session(workers, retries, backoff)
+    limiter = HostLimiter(per_host)
+    # requests: 实际发出的请求数；not_modified: 其中返回 304、使用缓存的数量；
+    # skipped_known: 标题已在数据库中而跳过的电影；resumed: 直接使用爬取队列中已有结果的电影；
+    # gave_up: 连续失败次数过多而不再尝试的详情页
+    stats = {'pages': 0, 'failed_pages': 0, 'items': 0, 'failed_items': 0, 'requests': 0, 'not_modified': 0,
+             'skipped_known': 0, 'resumed': 0, 'gave_up': 0}
+    movies = []
+    start = time.perf_counter()
+
+    with instrumentation.span('crawl') as record, ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        queued = set()  # 本次已提交的URL，同一部电影出现在多个列表页时只下载一次
+
+        def submit(url, kind, payload):
+            queued.add(url)
+            stats['requests'] += 1
+            pending[pool.submit(fetch, session, url, limiter, timeout, cache)] = (kind, url, payload)
+
+        list_urls = {page: urljoin(base_url, LIST_PATH.format(page)) for page in range(start_page, end_page + 1)}
+        if frontier is not None:
+            frontier.see(list_urls.values(), 'list')
+        for page, url in list_urls.items():
+            submit(url, 'list', page)
+
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    kind, url, payload = pending.pop(future)
+                    html_doc, not_modified = future.result()
+                    stats['not_modified'] += not_modified
+                    if kind == 'list':
+                        if html_doc is None:
+                            stats['failed_pages'] += 1
+                            if frontier is not None:
+                                frontier.mark_failed(url)
+                            report(f"第 {payload} 页列表下载失败。")
+                            continue
+                        stats['pages'] += 1
+                        if frontier is not None:
+                            frontier.mark_fetched(url)
+                        items = parse_list_page(html_doc, base_url)
+                        report(f"第 {payload} 页列表解析完成，共 {len(items)} 部电影。")
+                        known = db_function.get_existing_titles(item['title'] for item in items) if skip_known else set()
+                        entries = frontier.see((item['detail_url'] for item in items), 'detail') if frontier else {}
+                        for item in items:
+                            detail_url = item['detail_url']
+                            if item['title'] in known:
+                                stats['skipped_known'] += 1
+                                continue
+                            if detail_url in queued:
+                                continue
+                            entry = entries.get(detail_url)
+                            if entry is not None and entry['state'] == FETCHED and entry['payload'] is not None:
+                                # 上次已下载解析，但还没有写入数据库（爬取中途被中断）
+                                queued.add(detail_url)
+                                stats['resumed'] += 1
+                                stats['items'] += 1
+                                movies.append(entry['payload'])
+                            elif entry is not None and not frontier.should_fetch(entry):
+                                stats['gave_up'] += 1
+                            else:
+                                submit(detail_url, 'detail', item)
+                    else:
+                        description = parse_detail_page(html_doc) if html_doc is not None else None
+                        if description is None:
+                            stats['failed_items'] += 1
+                            if frontier is not None:
+                                frontier.mark_failed(url)
+                            continue
+                        stats['items'] += 1
+                        movie = dict(payload, comments=description)
+                        if frontier is not None:
+                            frontier.mark_fetched(url, movie)
+                        movies.append(movie)
+        except BaseException:
+            # 出错或任务被取消（进度回调抛出异常）时丢弃尚未开始的下载，不必等它们全部完成
+            for future in pending:
+                future.cancel()
+            raise
+        record.rows = stats['items']
+
+    session.close()
+    elapsed = time.perf_counter() - start
+    stats['elapsed'] = elapsed
+    stats['pages_per_s'] = stats['pages'] / elapsed if elapsed else 0.0
+    stats['items_per_s'] = stats['items'] / elapsed if elapsed else 0.0
+    report(f"爬取完成：列表页 {stats['pages']} 个（失败 {stats['failed_pages']}），电影 {stats['items']} 部"
+           f"（失败 {stats['failed_items']}），用时 {elapsed:.2f} 秒，"
+           f"{stats['pages_per_s']:.2f} 页/秒，{stats['items_per_s']:.2f} 部/秒。")
+    if frontier is not None or cache is not None or skip_known:
+        report(f"共发出请求 {stats['requests']} 个（未变化 {stats['not_modified']}），跳过已有电影 {stats['skipped_known']} 部，"
+               f"沿用上次的爬取结果 {stats['resumed']} 部，放弃多次失败的页面 {stats['gave_up']} 个。")
+    return movies, stats
+
+
+def pachong(num_pages=1, progress_callback=None, start_page=1, base_url=BASE_URL, dedup=DEFAULT_ACTION,
+            resume=True, cache_dir=DEFAULT_CACHE_DIR, **options):
+    """
+    爬取第 start_page 到第 num_pages 页的电影并导入数据库。
+
+    参数:
+    - num_pages (int): 爬取到第几页（包含）。
+    - progress_callback (function): 用于报告进度的回调函数。
+    - start_page (int): 从第几页开始爬取。
+    - base_url (str): 网站根地址。
+    - dedup (str): 近似重复的处理方式，'merge' 或 'flag'（默认，只标记不合并），None 表示不检测。
+    - resume (bool): 是否使用数据库中的爬取队列，沿用上次（可能被中断的）爬取结果。
+    - cache_dir (str): 磁盘响应缓存的目录，None 表示不缓存。
+    - options: 传给 crawl 的并发、超时、重试参数（含 skip_known）。
+    """
+    def report(message):
+        if progress_callback:
+            progress_callback(message)
+        else:
+            print(message)
+
+    db_function.create_movies_table()  # 跳过已有电影时需要查询 movies 表
+    frontier = CrawlFrontier() if resume else None
+    cache = HttpCache(cache_dir) if cache_dir else None
+    movies, stats = crawl(start_page, num_pages, base_url=base_url, progress_callback=progress_callback,
+                          frontier=frontier, cache=cache, **options)
+    if not movies:
+        report("没有需要导入的新电影。" if stats['pages'] else "数据爬取失败")
+        return stats
+
+    rows = ((movie['title'], movie['rating'], movie['category'], movie['comments']) for movie in movies)
+    detector = DuplicateDetector(dedup) if dedup else None
+    inserted, ignored = db_function.insert_movies_bulk(rows, detector=detector)
+    if frontier is not None:
+        # 已写入（或因重复被忽略、合并）的电影不再从爬取队列续爬
+        frontier.mark_imported(movie['detail_url'] for movie in movies)
+    stats['inserted'], stats['ignored'] = inserted, ignored
+    report(f"成功导入 {inserted} 部新电影到数据库，跳过 {ignored} 部已存在的电影。")
+    if detector is not None:
+        stats['merged'], stats['flagged'] = detector.merged, detector.flagged
+        report(detector.summary())
+    return stats
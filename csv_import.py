@@ -1,16 +1,79 @@
 # csv_import.py
-import sqlite3
 import csv
+import io
+import os
+import queue
+import re
+import threading
+import instrumentation
 from db_function import *
+from dedup import DuplicateDetector, DEFAULT_ACTION
 
+# 数据库字段 -> CSV列名 的默认对应关系。比较列名时会去掉首尾空白，
+# 因此 'title ' 、'star ' 这类带空格的列名也能直接匹配。
+DEFAULT_COLUMN_MAP = {
+    'title': 'title',
+    'rating': 'star',
+    'category': 'all_tags',
+    'comments': 'description',
+    'director': 'director_description',
+    'leader': 'leader',
+    'country': 'country',
+    'years': 'years',
+    'language': 'language',
+}
+# 这些描述字段在CSV中缺少对应列时按空字符串导入，其余字段缺列时无法导入
+OPTIONAL_FIELDS = set(EXTRA_COLUMNS)
 
-def import_from_csv(file_path, progress_callback=None):
+# 解析线程和写入线程之间最多缓存的批次数，决定了导入时的内存上限
+MAX_PENDING_BATCHES = 4
+
+
+def _resolve_columns(header, column_map):
+    """
+    根据表头找到每个数据库字段对应的列号。
+
+    返回:
+    - a tuple: (字段 -> 列号 的字典, 缺少的必需列名列表)
+    """
+    positions = {name.strip(): i for i, name in enumerate(header)}
+    columns, missing = {}, []
+    for field, column in column_map.items():
+        column = column.strip()
+        if column in positions:
+            columns[field] = positions[column]
+        elif field not in OPTIONAL_FIELDS:
+            missing.append(column)
+    return columns, missing
+
+
+def _normalize_names(value):
+    """
+    把多值字段统一成以 '/' 分隔的形式，例如
+    "['房祖名', '王子文']" -> '房祖名/王子文'，' 美国 / 日本' -> '美国/日本'。
+    """
+    value = value.strip()
+    if value.startswith('['):
+        names = re.findall(r"'([^']*)'|\"([^\"]*)\"", value)
+        return '/'.join(a or b for a, b in names if (a or b).strip())
+    return '/'.join(part.strip() for part in value.split('/') if part.strip())
+
+
+def import_from_csv(file_path, progress_callback=None, batch_size=DEFAULT_BATCH_SIZE, column_map=None,
+                    dedup=DEFAULT_ACTION):
     """
-    从用户指定的CSV文件路径导入数据。
+    从用户指定的CSV文件路径流式导入数据。
+
+    文件逐块读取、逐行解析，解析出的行按 batch_size 打包后交给后台写入线程批量写库，
+    解析和写库同时进行；两者之间的队列有长度上限，所以无论文件多大，内存占用都是恒定的。
+    进度按已读取的字节数占文件大小的比例报告，不需要预先数出总行数。
 
     参数:
     - file_path (str): CSV文件的完整路径。
     - progress_callback (function): 用于报告进度的回调函数。
+    - batch_size (int): 每个数据库事务批量写入的行数。
+    - column_map (dict): 数据库字段到CSV列名的对应关系，只需提供与 DEFAULT_COLUMN_MAP 不同的部分。
+    - dedup (str): 近似重复（如同一部电影的不同标题写法）的处理方式，'merge' 或 'flag'（默认，只标记不合并），None 表示不检测。
     """
 
     # 定义一个安全的报告函数
@@ -21,55 +84,107 @@ def import_from_csv(file_path, progress_callback=None):
             print(message)
 
     report(f"准备从 '{file_path}' 文件导入数据...")
+    column_map = dict(DEFAULT_COLUMN_MAP, **(column_map or {}))
+    with instrumentation.span('import.csv') as record:
+        _import_rows(file_path, report, batch_size, column_map, record, dedup)
+
+
+def _import_rows(file_path, report, batch_size, column_map, record, dedup):
+    """import_from_csv 的主体，record 为记录本次导入耗时和行数的 span"""
     try:
         # 确保表已创建
         create_movies_table()
 
-        with open(file_path, 'r', encoding='utf-8') as file:
-            csv_reader = csv.DictReader(file)
-            inserted_count = 0
-            processed_count = 0
+        with open(file_path, 'rb') as raw_file:
+            total_bytes = os.fstat(raw_file.fileno()).st_size
+            # utf-8-sig 会去掉部分CSV文件开头的BOM
+            text_file = io.TextIOWrapper(raw_file, encoding='utf-8-sig', newline='')
+            csv_reader = csv.reader(text_file)
+
+            header = next(csv_reader, None)
+            if header is None:
+                report("CSV文件为空。")
+                return
+            columns, missing = _resolve_columns(header, column_map)
+            if missing:
+                report(f"警告：CSV文件中缺少列 {missing}，无法导入。")
+                return
+            report(f"文件大小 {total_bytes / 1024 / 1024:.1f} MB，开始处理...")
+
+            # 后台写入线程：从队列中取出批次写入数据库，None 表示结束
+            pending = queue.Queue(maxsize=MAX_PENDING_BATCHES)
+            writer_result = {}
+            detector = DuplicateDetector(dedup) if dedup else None
 
-            # 先读取所有行，以便报告总进度
-            rows = list(csv_reader)
-            total_rows = len(rows)
-            report(f"文件包含 {total_rows} 行数据，开始处理...")
+            def drain():
+                while True:
+                    batch = pending.get()
+                    if batch is None:
+                        return
+                    yield from batch
 
-            for i, row in enumerate(rows):
-                processed_count += 1
+            def write():
                 try:
-                    # 注意：这里的列名可能需要根据不同的CSV文件进行调整
-                    # 这是一个常见的挑战，暂时我们假设列名是固定的
-                    title = row['title '].strip()
-                    rating = float(row['star '].strip())
-                    category = row['all_tags'].strip()
-                    comment = row['description'].strip()
-
-                    # 使用我们之前优化过的 insert_movie，它能处理重复数据
-                    # 为了获取反馈，我们不能直接调用，而是需要用 get_db_connection
-                    with get_db_connection() as conn:
-                        cursor = conn.cursor()
-                        cursor.execute('''
-                            INSERT OR IGNORE INTO movies (title, rating, category, comments)
-                            VALUES (?, ?, ?, ?)
-                        ''', (title, rating, category, comment))
-                        if cursor.rowcount > 0:
-                            inserted_count += 1
-                        conn.commit()
-
-                    # 每处理10%的行数，报告一次进度
-                    if (i + 1) % (total_rows // 10 + 1) == 0:
-                        report(f"处理进度: {i + 1}/{total_rows}")
-
-                except KeyError as e:
-                    report(f"警告：CSV文件中缺少列 {e}，已跳过第 {i + 1} 行。")
-                    continue
+                    writer_result['counts'] = insert_movies_bulk(drain(), batch_size, detector)
                 except Exception as e:
-                    report(f"导入行 '{row.get('title ', 'N/A')}' 时出错: {e}, 已跳过。")
+                    writer_result['error'] = e
+                    # 继续取空队列，避免解析线程阻塞在 put 上
+                    while pending.get() is not None:
+                        pass
+
+            writer = threading.Thread(target=write, daemon=True)
+            writer.start()
+
+            processed_count = 0
+            next_report = 0.1
+            batch = []
+            # 解析中途出错或被取消（进度回调抛出异常）时，也要通知写入线程结束，已写入的批次保留
+            try:
+                for line_no, row in enumerate(csv_reader, start=2):
+                    processed_count += 1
+                    try:
+                        title = row[columns['title']].strip()
+                        rating = float(row[columns['rating']].strip())
+                        category = row[columns['category']].strip()
+                        comment = row[columns['comments']].strip()
+                        extras = tuple(_normalize_names(row[columns[field]]) if field in columns else ''
+                                       for field in EXTRA_COLUMNS)
+                        batch.append((title, rating, category, comment) + extras)
+                    except IndexError:
+                        report(f"警告：第 {line_no} 行的列数不足，已跳过。")
+                    except ValueError as e:
+                        report(f"导入第 {line_no} 行 '{title}' 时出错: {e}, 已跳过。")
+
+                    if len(batch) >= batch_size:
+                        pending.put(batch)
+                        batch = []
+                        if 'error' in writer_result:
+                            break
+                        # 按已读取的字节数报告进度，每增加10%报告一次
+                        done = raw_file.tell() / total_bytes if total_bytes else 1.0
+                        if done >= next_report:
+                            report(f"处理进度: {done:.0%}（已解析 {processed_count} 行）")
+                            next_report = int(done * 10) / 10 + 0.1
+
+                if batch:
+                    pending.put(batch)
+            finally:
+                pending.put(None)
+                writer.join()
+                text_file.detach()
 
-        report(f"CSV数据导入完成！共处理 {processed_count} 行，成功插入 {inserted_count} 条新数据。")
+        if 'error' in writer_result:
+            raise writer_result['error']
+        inserted_count, ignored_count = writer_result['counts']
+        record.rows = processed_count
+        instrumentation.incr('import.inserted', inserted_count)
+        instrumentation.incr('import.ignored', ignored_count)
+        report(f"CSV数据导入完成！共处理 {processed_count} 行，成功插入 {inserted_count} 条新数据，"
+               f"跳过 {ignored_count} 条已存在的数据。")
+        if detector is not None:
+            report(detector.summary())
 
     except FileNotFoundError:
         report(f"错误：文件 '{file_path}' 未找到。")
     except Exception as e:
-        report(f"导入过程中发生未知错误: {e}")
\ No newline at end of file
+        report(f"导入过程中发生未知错误: {e}")
@@ -1,17 +1,148 @@
 #数据库模组
+import atexit
+import os
 import sqlite3
+import threading
+import weakref
 #文件正常关闭装饰器，即实现数据库的自动关闭功能
 from contextlib import contextmanager
 
+import instrumentation
+
 # 数据库连接配置
 DATABASE = 'movies.db'
 
-# 上下文管理器，确保每次数据库连接后自动关闭
+# 连接参数配置方案。所有方案都使用WAL日志模式：写入（如爬虫）进行时读取不会被阻塞。
+# - safe:     每次提交都同步到磁盘，断电也不丢数据
+# - balanced: 默认方案，WAL下只在检查点同步，崩溃不会损坏数据库，断电可能丢失最后几个事务
+# - bulk:     大批量导入时使用，不主动同步，缓存更大
+PRAGMA_PROFILES = {
+    'safe': {'journal_mode': 'WAL', 'synchronous': 'FULL', 'cache_size': -16000,
+             'mmap_size': 0, 'temp_store': 'DEFAULT', 'busy_timeout': 5000},
+    'balanced': {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'cache_size': -64000,
+                 'mmap_size': 256 * 1024 * 1024, 'temp_store': 'MEMORY', 'busy_timeout': 5000},
+    'bulk': {'journal_mode': 'WAL', 'synchronous': 'OFF', 'cache_size': -256000,
+             'mmap_size': 1024 * 1024 * 1024, 'temp_store': 'MEMORY', 'busy_timeout': 10000},
+}
+DEFAULT_PROFILE = 'balanced'
+
+
+class _ManagedConnection(sqlite3.Connection):
+    """支持弱引用的连接类型，以便连接管理器在线程结束后自动释放连接"""
+
+
+class ConnectionManager:
+    """
+    数据库连接管理器：每个线程对每个数据库文件复用一个长连接。
+
+    连接在第一次使用时创建并设置 PRAGMA，之后同一线程的所有操作都复用它，
+    不再有反复打开/关闭连接的开销。线程结束时它的连接随之释放；
+    close_all() 可在程序退出或删除数据库文件前关闭所有线程的连接。
+    """
+
+    def __init__(self, profile=DEFAULT_PROFILE):
+        self.pragmas = dict(PRAGMA_PROFILES[profile])
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = weakref.WeakSet()
+        # close_all / configure 后递增，各线程发现代数变化就重新建立连接
+        self._generation = 0
+
+    def configure(self, profile=None, **pragmas):
+        """切换连接参数方案或单独修改某些 PRAGMA，对之后新建的连接生效"""
+        with self._lock:
+            if profile is not None:
+                self.pragmas = dict(PRAGMA_PROFILES[profile])
+            self.pragmas.update(pragmas)
+        self.close_all()
+
+    def _open(self, path):
+        # 连接只会在创建它的线程中使用；关闭 check_same_thread 是为了 close_all 能跨线程关闭它
+        conn = sqlite3.connect(path, factory=_ManagedConnection, check_same_thread=False)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        with self._lock:
+            self._connections.add(conn)
+        return conn
+
+    def connection(self, db_path=None):
+        """返回当前线程连接到 db_path（默认 DATABASE）的长连接"""
+        path = os.path.abspath(db_path or DATABASE)
+        if getattr(self._local, 'generation', None) != self._generation:
+            self._local.connections = {}
+            self._local.generation = self._generation
+        conn = self._local.connections.get(path)
+        if conn is None:
+            conn = self._local.connections[path] = self._open(path)
+        return conn
+
+    def close_thread(self):
+        """关闭当前线程的所有连接"""
+        for conn in getattr(self._local, 'connections', {}).values():
+            conn.close()
+        self._local.connections = {}
+
+    def close_all(self):
+        """关闭所有线程的连接，未提交的事务会被回滚"""
+        with self._lock:
+            self._generation += 1
+            connections = list(self._connections)
+            self._connections.clear()
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+
+connection_manager = ConnectionManager()
+atexit.register(connection_manager.close_all)
+
+
+def configure_connections(profile=None, **pragmas):
+    """设置数据库连接参数方案，例如 configure_connections('bulk') 或 configure_connections(cache_size=-128000)"""
+    connection_manager.configure(profile, **pragmas)
+
+
+def close_all_connections():
+    """关闭所有数据库连接（程序退出或删除数据库文件之前调用）"""
+    connection_manager.close_all()
+
+
+# 上下文管理器，返回当前线程复用的数据库连接
+@contextmanager
+def get_db_connection(db_path=None):
+    connection = connection_manager.connection(db_path)
+    try:
+        yield connection
+    except Exception:
+        # 出现异常（如重复标题）时回滚未结束的事务，否则它会一直锁住数据库
+        connection.rollback()
+        raise
+
+
 @contextmanager
-def get_db_connection():
-    connection = sqlite3.connect(DATABASE)
-    yield connection
-    connection.close()
+def read_snapshot(db_path=None):
+    """
+    在一个只读事务中执行多条查询。WAL 模式下事务内的所有查询看到的是同一时刻的数据，
+    分几次读取各列时，即使爬虫等同时在写入，各列的行也能一一对应。
+    """
+    with get_db_connection(db_path) as conn:
+        started = not conn.in_transaction
+        if started:
+            conn.execute('BEGIN')
+        try:
+            yield conn
+        finally:
+            if started:
+                conn.rollback()
+
+# 电影的描述字段：导演、主演、国家/地区、上映日期、语言。
+# 多个值用 '/' 分隔，缺失时为空字符串；旧数据库在 create_movies_table 中自动补上这些列
+EXTRA_COLUMNS = ('director', 'leader', 'country', 'years', 'language')
+# 插入电影时的字段顺序
+MOVIE_COLUMNS = ('title', 'rating', 'category', 'comments') + EXTRA_COLUMNS
+
 
 # 创建电影表
 def create_movies_table():
@@ -23,21 +154,128 @@ def create_movies_table():
                 title TEXT NOT NULL UNIQUE, 
                 rating REAL NOT NULL,
                 category TEXT NOT NULL,
-                comments TEXT NOT NULL 
+                comments TEXT NOT NULL,
+                director TEXT NOT NULL DEFAULT '',
+                leader TEXT NOT NULL DEFAULT '',
+                country TEXT NOT NULL DEFAULT '',
+                years TEXT NOT NULL DEFAULT '',
+                language TEXT NOT NULL DEFAULT ''
             )
         ''')
+        # 迁移：旧版本创建的表只有前五列，补上缺少的描述字段（只修改表结构，不重写已有数据）
+        existing = {row[1] for row in cursor.execute('PRAGMA table_info(movies)')}
+        for column in EXTRA_COLUMNS:
+            if column not in existing:
+                cursor.execute(f"ALTER TABLE movies ADD COLUMN {column} TEXT NOT NULL DEFAULT ''")
+        # 按评分排序浏览时使用的索引（按标题排序可直接使用 UNIQUE 约束自带的索引）
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_movies_rating ON movies (rating, id)')
+        # 由触发器维护的电影总数，翻页时不必每次都 COUNT(*) 扫描全表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS movies_stats (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute("INSERT OR IGNORE INTO movies_stats (name, value) "
+                       "SELECT 'movie_count', COUNT(*) FROM movies")
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS movies_count_insert AFTER INSERT ON movies BEGIN
+                UPDATE movies_stats SET value = value + 1 WHERE name = 'movie_count';
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS movies_count_delete AFTER DELETE ON movies BEGIN
+                UPDATE movies_stats SET value = value - 1 WHERE name = 'movie_count';
+            END
+        ''')
+        # 数据修订号：每插入、修改、删除一行都加一，推荐模型缓存的指纹据此判断数据是否变化过
+        cursor.execute("INSERT OR IGNORE INTO movies_stats (name, value) VALUES ('revision', 0)")
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS movies_revision_{event.lower()} AFTER {event} ON movies BEGIN
+                    UPDATE movies_stats SET value = value + 1 WHERE name = 'revision';
+                END
+            ''')
         conn.commit()
 
 # 插入一部电影数据
-def insert_movie(title, rating, category,comments):
+def insert_movie(title, rating, category,comments, director='', leader='', country='', years='', language=''):
     with get_db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('''
-            INSERT INTO movies (title, rating, category,comments)
-            VALUES (?, ?, ?, ?)
-        ''', (title, rating, category,comments))
+            INSERT INTO movies (title, rating, category, comments, director, leader, country, years, language)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (title, rating, category,comments, director, leader, country, years, language))
         conn.commit()
 
+# 批量插入时每个事务包含的行数
+DEFAULT_BATCH_SIZE = 500
+
+
+def _batched(rows, batch_size):
+    """把可迭代对象按 batch_size 切成若干列表，不会一次性读入全部数据"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def insert_movies_bulk(rows, batch_size=DEFAULT_BATCH_SIZE, detector=None):
+    """
+    批量插入电影数据，已存在的同名电影会被忽略。
+
+    所有批次共用一个连接，每批用 executemany 写入并在一个事务中提交，
+    避免逐条插入时每行都要打开连接、提交事务的开销。
+
+    参数:
+    - rows (iterable): 每项为按 MOVIE_COLUMNS 顺序排列的元组，可以是生成器；
+      只有 (title, rating, category, comments) 四项时，描述字段按空字符串写入。
+    - batch_size (int): 每个事务包含的行数。
+    - detector (dedup.DuplicateDetector): 近似重复检测器，None 表示只靠标题的 UNIQUE 约束去重。
+      每批写入前由它合并或标记与已有电影近似重复的行，写入后为新电影保存签名。
+
+    返回:
+    - a tuple: (成功插入的条数, 因重复被忽略（含被合并）的条数)
+    """
+    inserted_count = 0
+    ignored_count = 0
+    with instrumentation.span('db.insert_bulk') as record, get_db_connection() as conn:
+        cursor = conn.cursor()
+        padding = ('',) * len(MOVIE_COLUMNS)
+        for batch in _batched(rows, batch_size):
+            batch = [tuple(row) + padding[len(row):] for row in batch]
+            rows_to_insert = batch if detector is None else detector.filter_batch(conn, batch)
+            cursor.executemany('''
+                INSERT OR IGNORE INTO movies (title, rating, category, comments, director, leader, country, years, language)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows_to_insert)
+            # rowcount 只统计插入的行；total_changes 还会把计数触发器的更新算进去
+            inserted = cursor.rowcount
+            if detector is not None:
+                detector.index_batch(conn, rows_to_insert)
+            conn.commit()
+            inserted_count += inserted
+            ignored_count += len(batch) - inserted
+        record.rows = inserted_count + ignored_count
+    return inserted_count, ignored_count
+
+def get_existing_titles(titles):
+    """返回 titles 中已经在数据库里的标题集合"""
+    titles = list(titles)
+    existing = set()
+    with get_db_connection() as conn:
+        # 分批组装 IN 查询，避免超过SQLite的参数个数上限
+        for start in range(0, len(titles), 500):
+            batch = titles[start:start + 500]
+            placeholders = ','.join('?' * len(batch))
+            existing.update(row[0] for row in conn.execute(
+                f'SELECT title FROM movies WHERE title IN ({placeholders})', batch))
+    return existing
+
 # 获取所有电影
 def get_all_movies():
     with get_db_connection() as conn:
@@ -50,6 +288,8 @@ def get_movies_paginated(page=1, page_size=10):
     """
     分页获取电影数据。
 
+    按页码跳转需要 OFFSET，页码越大越慢；顺序翻页请使用 get_movies_page。
+
     参数:
     - page (int): 当前页码 (从1开始)。
     - page_size (int): 每页显示的条目数。
@@ -57,15 +297,13 @@ def get_movies_paginated(page=1, page_size=10):
     返回:
     - a tuple: (list of movies, total_pages)
     """
+    total_items = count_movies()
+    # 计算总页数，使用 (a + b - 1) // b 的技巧来向上取整
+    total_pages = (total_items + page_size - 1) // page_size
+
     with get_db_connection() as conn:
-        conn.row_factory = sqlite3.Row  # 让查询结果可以像字典一样通过列名访问
         cursor = conn.cursor()
-
-        # 首先，计算总条目数和总页数
-        cursor.execute('SELECT COUNT(*) FROM movies')
-        total_items = cursor.fetchone()[0]
-        # 计算总页数，使用 (a + b - 1) // b 的技巧来向上取整
-        total_pages = (total_items + page_size - 1) // page_size
+        cursor.row_factory = sqlite3.Row  # 让查询结果可以像字典一样通过列名访问（只影响这个游标）
 
         # 计算偏移量 (OFFSET)
         offset = (page - 1) * page_size
@@ -75,4 +313,80 @@ def get_movies_paginated(page=1, page_size=10):
                        (page_size, offset))
         movies = cursor.fetchall()
 
-        return movies, total_pages
\ No newline at end of file
+        return movies, total_pages
+
+
+def count_movies():
+    """返回电影总数（读取触发器维护的计数，表还没有计数时才 COUNT(*)）"""
+    with get_db_connection() as conn:
+        try:
+            row = conn.execute("SELECT value FROM movies_stats WHERE name = 'movie_count'").fetchone()
+        except sqlite3.OperationalError:
+            row = None
+        if row is not None:
+            return row[0]
+        return conn.execute('SELECT COUNT(*) FROM movies').fetchone()[0]
+
+
+# 浏览数据时允许排序的列。只允许白名单中的列名拼进SQL，并且这些列都有索引
+SORTABLE_COLUMNS = ('id', 'title', 'rating')
+# get_movies_page 返回的列
+PAGE_COLUMNS = ('id', 'title', 'rating', 'category')
+
+
+def row_key(row, order_by='id'):
+    """
+    返回一行在指定排序下的翻页键：按 id 排序时为 (id,)，否则为 (排序列的值, id)。
+
+    参数:
+    - row: get_movies_page 返回的一行。
+    - order_by (str): 排序列。
+    """
+    if order_by == 'id':
+        return (row[0],)
+    return (row[PAGE_COLUMNS.index(order_by)], row[0])
+
+
+def get_movies_page(page_size=10, after=None, before=None, order_by='id', descending=False, last=False):
+    """
+    键集（seek）分页：从上一页最后一行的键之后（或下一页第一行的键之前）继续读取一页。
+
+    查询直接在索引上定位到键的位置，不需要像 OFFSET 那样跳过前面的所有行，
+    因此无论翻到多深，每一页的读取速度都和第一页相同。
+
+    参数:
+    - page_size (int): 每页的条目数。
+    - after (tuple): 上一页最后一行的 row_key，返回排在它之后的一页；为 None 且没有 before 时返回第一页。
+    - before (tuple): 下一页第一行的 row_key，返回排在它之前的一页（向前翻页）。
+    - order_by (str): 排序列，必须是 SORTABLE_COLUMNS 之一；值相同时再按 id 排序，保证顺序稳定。
+    - descending (bool): 是否降序。
+    - last (bool): 为 True 时返回最后一页（最后 page_size 行）。
+
+    返回:
+    - list: (id, title, rating, category) 元组列表，按排序顺序排列
+    """
+    if order_by not in SORTABLE_COLUMNS:
+        raise ValueError(f"不支持按 '{order_by}' 排序")
+    key_columns = '(id)' if order_by == 'id' else f'({order_by}, id)'
+    # 向前翻页或取最后一页时，按相反方向查询，取到结果后再反转
+    backward = before is not None or last
+    reverse = descending != backward
+    direction = 'DESC' if reverse else 'ASC'
+    order = 'id ' + direction if order_by == 'id' else f'{order_by} {direction}, id {direction}'
+
+    sql = 'SELECT id, title, rating, category FROM movies'
+    key = before if before is not None else after
+    params = []
+    if key is not None and not last:
+        placeholders = ', '.join('?' * len(key))
+        sql += f' WHERE {key_columns} {"<" if reverse else ">"} ({placeholders})'
+        params.extend(key)
+    sql += f' ORDER BY {order} LIMIT ?'
+    params.append(page_size)
+
+    with instrumentation.span('db.page') as record, get_db_connection() as conn:
+        rows = conn.execute(sql, params).fetchall()
+        record.rows = len(rows)
+    if backward:
+        rows.reverse()
+    return rows
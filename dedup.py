@@ -0,0 +1,474 @@
+# dedup.py
+# 入库时的近似重复检测：对标题计算 MinHash 签名，用 LSH 分桶在持久化索引中查找候选，再用年份、导演或剧情简介确认。
+#
+# 同一部电影从不同来源导入时标题往往不完全相同（如 "肖申克的救赎 The Shawshank Redemption" 与 "肖申克的救赎"），
+# 标题上的 UNIQUE 约束拦不住它们。每部电影的签名按带（band）切开，各带的哈希作为桶号写入 movies.db 的
+# dedup_buckets 表；新电影只需按自己的几个桶号查索引取出候选，再逐个确认，
+# 检查开销与电影总数基本无关，电影库增长到上百万部时也不会变慢。
+#
+# 标题相似只说明“可能是同一部”：续集、翻拍、同名的不同电影标题都很接近。只有标题相似、
+# 外文原名/年份/导演没有一项对不上，并且至少有一项能对上时，才认为是同一部电影。
+# 爬虫抓取的电影只有标题、评分、类别和简介，没有年份和导演，这时改用剧情简介（字符三元组的 MinHash）确认。
+#
+# 用法:
+#   python dedup.py scan              # 列出数据库中已有的近似重复电影
+#   python dedup.py rebuild           # 重新计算全部签名
+import argparse
+import hashlib
+import re
+import unicodedata
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+import instrumentation
+from db_function import get_db_connection, create_movies_table, EXTRA_COLUMNS, MOVIE_COLUMNS
+
+# 签名长度与分带方式：NUM_PERM // BAND_ROWS 个带，每带 BAND_ROWS 行。
+# 相似度为 s 的两部电影至少落入一个相同桶的概率是 1 - (1 - s^BAND_ROWS)^带数，s=0.8 时约为 98.5%
+NUM_PERM = 32
+BAND_ROWS = 4
+SIGNATURE_SEED = 1
+
+# 主标题（去掉标点后的字符二元组）的 Jaccard 相似度达到该值才可能是同一部电影；
+# 两边都有外文原名时，外文原名的相似度也要达到该值
+TITLE_THRESHOLD = 0.8
+# 年份和导演都无法比较时，剧情简介的估计相似度达到该值才算对得上（只用于确认标题相似的候选）
+TEXT_THRESHOLD = 0.5
+# 简介的三元组少于该数量时（如“暂无简介”）不参与比较
+MIN_TEXT_SHINGLES = 20
+# 简介只取前这么多个字符计算签名
+MAX_TEXT_CHARS = 2000
+# 上映年份相差不超过该值算“年份对得上”（不同地区的上映日期可能跨年），超过则一定不是同一部（例如同名翻拍）
+MAX_YEAR_GAP = 1
+
+# 'merge': 不插入重复的电影，只把它有而已有电影缺少的描述字段补上；
+# 'flag':  照常插入，但记录到 dedup_log 表中供人工检查
+DEDUP_ACTIONS = ('merge', 'flag')
+DEFAULT_ACTION = 'flag'
+
+# 签名参数变化后，数据库中保存的旧签名作废，需要重新计算
+SIGNATURE_VERSION = f'3:{NUM_PERM}:{BAND_ROWS}:{SIGNATURE_SEED}'
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.RandomState(SIGNATURE_SEED)
+_PERM_A = _rng.randint(1, (1 << 61) - 1, NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, (1 << 61) - 1, NUM_PERM, dtype=np.uint64)
+
+_CJK = re.compile(r'[一-鿿]')
+# 中文标题后面常跟着外文原名（英文、日文假名、韩文），从第一个外文单词处分开
+_FOREIGN_SUFFIX = re.compile(r'\s+(?=[a-z぀-ヿ가-힯])')
+_WORD_CHARS = re.compile(r'\w')
+_YEAR = re.compile(r'(1[89]\d\d|20\d\d)')
+_NUMBER = re.compile(r'\d+')
+_NAME_SEPARATORS = re.compile(r'[/,，、;；]')
+
+# 一部电影用于比较的特征：主标题二元组集合、外文原名二元组集合（没有时为空集）、标题中的数字、
+# 上映年份（未知时为 None）、导演姓名集合（未知时为空集）、简介签名（简介太短时为 None）、LSH 桶号
+MovieSketch = namedtuple('MovieSketch', ['title_shingles', 'foreign_shingles', 'title_numbers', 'year',
+                                         'directors', 'text_signature', 'buckets'])
+
+
+def _clean(text):
+    return ''.join(_WORD_CHARS.findall(text))
+
+
+def normalize_title(title):
+    """
+    标题归一化：全角转半角、转小写、去掉标点和空白，并把含中文的标题拆成主标题和外文原名。
+    例如 "肖申克的救赎 The Shawshank Redemption" -> ('肖申克的救赎', 'theshawshankredemption')。
+
+    返回:
+    - tuple: (主标题, 外文原名)，没有外文原名时后者为空字符串。
+    """
+    title = unicodedata.normalize('NFKC', title or '').lower().strip()
+    if not _CJK.search(title):
+        return _clean(title), ''
+    parts = _FOREIGN_SUFFIX.split(title, 1)
+    return _clean(parts[0]), _clean(parts[1]) if len(parts) > 1 else ''
+
+
+def _bigrams(text):
+    text = f'^{text}$'
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def title_shingles(title):
+    """主标题和外文原名的字符二元组集合（外文原名为空时返回空集）"""
+    primary, foreign = normalize_title(title)
+    return _bigrams(primary), _bigrams(foreign) if foreign else set()
+
+
+def title_numbers(title):
+    """
+    主标题和外文原名中的数字，如 '教父2 The Godfather: Part II' -> (('2',), ())。
+    续集往往只差一个数字，数字不同的标题不算相似；外文原名中的数字（如 'Se7en'）只和外文原名比较。
+    """
+    primary, foreign = normalize_title(title)
+    return tuple(_NUMBER.findall(primary)), tuple(_NUMBER.findall(foreign))
+
+
+def text_shingles(comments):
+    text = unicodedata.normalize('NFKC', (comments or '')[:MAX_TEXT_CHARS]).lower()
+    text = _clean(text)
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def director_names(director):
+    """
+    导演字段拆成归一化的姓名集合，每个姓名只取中文名（"弗兰克·德拉邦特 Frank Darabont" -> '弗兰克德拉邦特'），
+    不同来源的写法也能对上。
+    """
+    names = set()
+    for name in _NAME_SEPARATORS.split(director or ''):
+        name = normalize_title(name)[0]
+        if name:
+            names.add(name)
+    return names
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+def minhash(shingles):
+    """NUM_PERM 个 uint32 组成的 MinHash 签名；两个签名相同位置相等的比例是 Jaccard 相似度的无偏估计"""
+    hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+    permuted = (hashes[:, None] * _PERM_A + _PERM_B) % _MERSENNE_PRIME
+    return (permuted & np.uint64(0xFFFFFFFF)).min(axis=0).astype(np.uint32)
+
+
+def band_keys(signature):
+    """把签名切成若干带，每带哈希成一个 SQLite INTEGER 能存下的64位有符号桶号"""
+    keys = []
+    for band in range(NUM_PERM // BAND_ROWS):
+        chunk = signature[band * BAND_ROWS:(band + 1) * BAND_ROWS].tobytes()
+        digest = hashlib.blake2b(bytes([band]) + chunk, digest_size=8).digest()
+        keys.append(int.from_bytes(digest, 'little', signed=True))
+    return keys
+
+
+def _year(years):
+    match = _YEAR.search(years or '')
+    return int(match.group(1)) if match else None
+
+
+def text_signature(comments):
+    """剧情简介的 MinHash 签名，简介太短时返回 None"""
+    texts = text_shingles(comments)
+    return minhash(texts) if len(texts) >= MIN_TEXT_SHINGLES else None
+
+
+def sketch(title, comments='', years='', director='', with_buckets=True):
+    """计算一部电影的 MovieSketch；with_buckets=False 时不计算桶号（只用于比较）"""
+    titles, foreign = title_shingles(title)
+    buckets = band_keys(minhash(titles)) if with_buckets else []
+    return MovieSketch(titles, foreign, title_numbers(title), _year(years), director_names(director),
+                       text_signature(comments), buckets)
+
+
+def match_score(a, b):
+    """
+    判断两部电影是否是同一部：主标题相似、标题中的数字相同，外文原名、年份、导演都没有冲突，
+    并且年份或导演至少有一项对得上；两者都无法比较时，剧情简介要足够相似。
+    简介也无法比较（缺少或太短）时无法确认，不算重复。
+
+    返回:
+    - float 或 None: 是同一部时返回主标题的相似度，否则返回 None。
+    """
+    if a.title_numbers[0] != b.title_numbers[0]:
+        return None
+    title_similarity = jaccard(a.title_shingles, b.title_shingles)
+    if title_similarity < TITLE_THRESHOLD:
+        return None
+    if a.foreign_shingles and b.foreign_shingles and (
+            a.title_numbers[1] != b.title_numbers[1] or
+            jaccard(a.foreign_shingles, b.foreign_shingles) < TITLE_THRESHOLD):
+        return None
+
+    year_agrees = director_agrees = False
+    if a.year is not None and b.year is not None:
+        if abs(a.year - b.year) > MAX_YEAR_GAP:
+            return None
+        year_agrees = True
+    if a.directors and b.directors:
+        if not a.directors & b.directors:
+            return None
+        director_agrees = True
+    if year_agrees or director_agrees:
+        return title_similarity
+    # 年份和导演都无法比较：同一部电影的不同来源常常一边有年份、导演，另一边只有简介
+    if a.text_signature is not None and b.text_signature is not None and \
+            float(np.mean(a.text_signature == b.text_signature)) >= TEXT_THRESHOLD:
+        return title_similarity
+    return None
+
+
+def create_dedup_tables(conn):
+    # 已计算过桶号的电影及其简介签名
+    conn.execute('CREATE TABLE IF NOT EXISTS dedup_signatures (movie_id INTEGER PRIMARY KEY, text_signature BLOB)')
+    if 'text_signature' not in {row[1] for row in conn.execute('PRAGMA table_info(dedup_signatures)')}:
+        conn.execute('ALTER TABLE dedup_signatures ADD COLUMN text_signature BLOB')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS dedup_buckets (
+            bucket INTEGER NOT NULL,
+            movie_id INTEGER NOT NULL,
+            PRIMARY KEY (bucket, movie_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS dedup_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            movie_id INTEGER,
+            duplicate_of INTEGER NOT NULL,
+            similarity REAL NOT NULL,
+            action TEXT NOT NULL,
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE TABLE IF NOT EXISTS dedup_meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)')
+
+
+def _chunks(items, size=500):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _store_sketches(conn, movie_ids, sketches):
+    conn.executemany('INSERT OR REPLACE INTO dedup_signatures (movie_id, text_signature) VALUES (?, ?)',
+                     [(movie_id, None if s.text_signature is None else s.text_signature.tobytes())
+                      for movie_id, s in zip(movie_ids, sketches)])
+    conn.executemany('INSERT OR IGNORE INTO dedup_buckets (bucket, movie_id) VALUES (?, ?)',
+                     [(bucket, movie_id) for movie_id, s in zip(movie_ids, sketches) for bucket in s.buckets])
+
+
+def _load_sketches(conn, movie_ids):
+    """从数据库取出若干电影的比较特征（简介签名读取已保存的），不含桶号"""
+    sketches = {}
+    for batch in _chunks(movie_ids):
+        placeholders = ','.join('?' * len(batch))
+        for movie_id, title, years, director, signature in conn.execute(f'''
+                SELECT m.id, m.title, m.years, m.director, s.text_signature
+                FROM movies m LEFT JOIN dedup_signatures s ON s.movie_id = m.id
+                WHERE m.id IN ({placeholders})''', batch):
+            sketches[movie_id] = sketch(title, '', years, director, with_buckets=False)._replace(
+                text_signature=None if signature is None else np.frombuffer(signature, dtype=np.uint32))
+    return sketches
+
+
+def ensure_index(conn, rebuild=False):
+    """
+    建表，并为还没有签名的电影（如引入去重之前导入的电影）补算签名。
+    签名参数变化或 rebuild=True 时清空后全部重新计算。
+
+    返回:
+    - int: 本次补算签名的电影数。
+    """
+    # 旧版本的 movies 表缺少 years、director 等列，先执行 movies 表的迁移
+    create_movies_table()
+    create_dedup_tables(conn)
+    version = conn.execute("SELECT value FROM dedup_meta WHERE name = 'signature_version'").fetchone()
+    if rebuild or version is None or version[0] != SIGNATURE_VERSION:
+        conn.execute('DELETE FROM dedup_signatures')
+        conn.execute('DELETE FROM dedup_buckets')
+        conn.execute("INSERT OR REPLACE INTO dedup_meta (name, value) VALUES ('signature_version', ?)",
+                     (SIGNATURE_VERSION,))
+
+    with instrumentation.span('dedup.backfill') as record:
+        missing = conn.execute('''
+            SELECT id, title, comments FROM movies
+            WHERE id NOT IN (SELECT movie_id FROM dedup_signatures) ORDER BY id
+        ''').fetchall()
+        for batch in _chunks(missing, 1000):
+            _store_sketches(conn, [row[0] for row in batch], [sketch(*row[1:]) for row in batch])
+        record.rows = len(missing)
+    conn.commit()
+    return len(missing)
+
+
+class DuplicateDetector:
+    """
+    批量入库时的近似重复检测，由 db_function.insert_movies_bulk 在每批写入前后调用：
+    filter_batch 找出这一批中与已有电影（或同批中排在前面的电影）重复的行，
+    index_batch 在写入后为新电影保存签名和桶号。
+    """
+
+    def __init__(self, action=DEFAULT_ACTION):
+        if action not in DEDUP_ACTIONS:
+            raise ValueError(f"action 必须是 {DEDUP_ACTIONS} 之一")
+        self.action = action
+        self.merged = 0
+        self.flagged = 0
+        self._indexed = False
+        self._max_id = 0
+        # 当前批次：保留下来的行的特征，以及待记录的标记 (行号, 重复的已有电影id 或 同批行号, 相似度)
+        self._sketches = []
+        self._flags = []
+
+    def filter_batch(self, conn, rows):
+        """
+        参数:
+        - rows (list): 按 MOVIE_COLUMNS 顺序排列的元组。
+
+        返回:
+        - list: 需要插入的行（'merge' 模式下去掉了重复的行）。
+        """
+        if not self._indexed:
+            ensure_index(conn)
+            self._indexed = True
+
+        with instrumentation.span('dedup.check', rows=len(rows)):
+            columns = {name: i for i, name in enumerate(MOVIE_COLUMNS)}
+            sketches = [sketch(row[columns['title']], row[columns['comments']], row[columns['years']],
+                               row[columns['director']]) for row in rows]
+            # 本批写入的电影 id 都大于当前的最大 id，index_batch 据此区分真正插入的行和被 UNIQUE 约束忽略的行
+            self._max_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM movies').fetchone()[0]
+
+            # 一次查询取出整批电影所有桶号下的已有电影，再一次性读出这些候选的特征
+            bucket_movies = {}
+            for batch in _chunks({bucket for s in sketches for bucket in s.buckets}):
+                placeholders = ','.join('?' * len(batch))
+                for bucket, movie_id in conn.execute(
+                        f'SELECT bucket, movie_id FROM dedup_buckets WHERE bucket IN ({placeholders})', batch):
+                    bucket_movies.setdefault(bucket, []).append(movie_id)
+            existing = _load_sketches(conn, {m for ids in bucket_movies.values() for m in ids})
+            existing_titles = {}
+
+            kept, self._sketches, self._flags = [], [], []
+            pending = {}  # 桶号 -> 本批已保留的行号
+            for row, s in zip(rows, sketches):
+                best = None
+                for movie_id in {m for bucket in s.buckets for m in bucket_movies.get(bucket, ())}:
+                    if movie_id not in existing:
+                        continue  # 电影已被删除，桶号是残留的
+                    score = match_score(s, existing[movie_id])
+                    if score is not None and (best is None or score > best[0]):
+                        best = (score, 'db', movie_id)
+                for index in {i for bucket in s.buckets for i in pending.get(bucket, ())}:
+                    score = match_score(s, self._sketches[index])
+                    if score is not None and (best is None or score > best[0]):
+                        best = (score, 'batch', index)
+
+                if best is not None and best[1] == 'db' and self._same_title(conn, best[2], row, existing_titles):
+                    # 标题完全相同的由 UNIQUE 约束忽略，不算作近似重复
+                    best = None
+                if best is None or self.action == 'flag':
+                    if best is not None:
+                        self._flags.append((len(kept), best[1], best[2], best[0]))
+                    for bucket in s.buckets:
+                        pending.setdefault(bucket, []).append(len(kept))
+                    kept.append(row)
+                    self._sketches.append(s)
+                    continue
+
+                score, where, target = best
+                if where == 'db':
+                    self._merge_into(conn, target, row)
+                    self._log(conn, row[0], None, target, score, 'merged')
+                else:
+                    kept[target] = _fill_missing(kept[target], row)
+                self.merged += 1
+                instrumentation.incr('dedup.merged')
+        return kept
+
+    def index_batch(self, conn, rows):
+        """
+        rows 写入后调用：为其中真正插入的行保存签名和桶号，并记录 'flag' 模式下发现的重复。
+        与已有电影同名、被 INSERT OR IGNORE 忽略的行不建索引，以免把已有电影的 id 记到它的桶号下。
+        """
+        if not rows:
+            return
+        ids = {}
+        for batch in _chunks({row[0] for row in rows}):
+            placeholders = ','.join('?' * len(batch))
+            ids.update(conn.execute(f'SELECT title, id FROM movies WHERE id > ? AND title IN ({placeholders})',
+                                    [self._max_id] + batch))
+        # 同一批中标题相同的行只有第一行被插入
+        row_ids = [ids.pop(row[0], None) for row in rows]
+        inserted = [i for i, movie_id in enumerate(row_ids) if movie_id is not None]
+        _store_sketches(conn, [row_ids[i] for i in inserted], [self._sketches[i] for i in inserted])
+        for index, where, target, score in self._flags:
+            duplicate_of = target if where == 'db' else row_ids[target]
+            if row_ids[index] is None or duplicate_of is None:
+                continue
+            self._log(conn, rows[index][0], row_ids[index], duplicate_of, score, 'flagged')
+            self.flagged += 1
+            instrumentation.incr('dedup.flagged')
+
+    @staticmethod
+    def _same_title(conn, movie_id, row, cache):
+        if movie_id not in cache:
+            cache[movie_id] = conn.execute('SELECT title FROM movies WHERE id = ?', (movie_id,)).fetchone()[0]
+        return cache[movie_id] == row[0]
+
+    @staticmethod
+    def _merge_into(conn, movie_id, row):
+        """把新来源有、已有电影缺少（为空）的简介和描述字段补上，已有的值不覆盖"""
+        values = dict(zip(MOVIE_COLUMNS, row))
+        fields = ('comments',) + EXTRA_COLUMNS
+        assignments = ', '.join(f"{field} = CASE WHEN {field} = '' THEN ? ELSE {field} END" for field in fields)
+        conn.execute(f'UPDATE movies SET {assignments} WHERE id = ?',
+                     [values[field] or '' for field in fields] + [movie_id])
+
+    @staticmethod
+    def _log(conn, title, movie_id, duplicate_of, similarity, action):
+        conn.execute('INSERT INTO dedup_log (title, movie_id, duplicate_of, similarity, action) VALUES (?, ?, ?, ?, ?)',
+                     (title, movie_id, duplicate_of, round(similarity, 4), action))
+
+    def summary(self):
+        if self.action == 'merge':
+            return f"合并近似重复的电影 {self.merged} 部"
+        return f"标记近似重复的电影 {self.flagged} 部（见 dedup_log 表）"
+
+
+def _fill_missing(kept_row, row):
+    """同一批中的两行重复时，用后一行补上前一行为空的简介和描述字段"""
+    fields = {'comments'} | set(EXTRA_COLUMNS)
+    return tuple(new if name in fields and not old else old
+                 for name, old, new in zip(MOVIE_COLUMNS, kept_row, row))
+
+
+def scan_duplicates(conn):
+    """
+    找出数据库中已有的近似重复电影：共享桶号的电影才需要比较，不做两两比较。
+
+    返回:
+    - list: [(相似度, id_a, 标题a, id_b, 标题b)]，按相似度降序。
+    """
+    ensure_index(conn)
+    pairs = set()
+    for (members,) in conn.execute('''
+            SELECT group_concat(movie_id) FROM dedup_buckets GROUP BY bucket HAVING COUNT(*) > 1'''):
+        ids = sorted(int(i) for i in members.split(','))
+        pairs.update((a, b) for i, a in enumerate(ids) for b in ids[i + 1:])
+    sketches = _load_sketches(conn, {movie_id for pair in pairs for movie_id in pair})
+    titles = {}
+    for batch in _chunks(sketches):
+        placeholders = ','.join('?' * len(batch))
+        titles.update(conn.execute(f'SELECT id, title FROM movies WHERE id IN ({placeholders})', batch))
+    results = []
+    for a, b in pairs:
+        if a in sketches and b in sketches:
+            score = match_score(sketches[a], sketches[b])
+            if score is not None:
+                results.append((score, a, titles[a], b, titles[b]))
+    return sorted(results, reverse=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="电影近似重复检测")
+    parser.add_argument('command', choices=('scan', 'rebuild'), help="scan: 列出已有的近似重复；rebuild: 重新计算全部签名")
+    parser.add_argument('--limit', type=int, default=50, help="scan 最多列出的重复对数")
+    args = parser.parse_args()
+
+    with get_db_connection() as conn:
+        if args.command == 'rebuild':
+            print(f"已重新计算 {ensure_index(conn, rebuild=True)} 部电影的签名。")
+        else:
+            duplicates = scan_duplicates(conn)
+            print(f"共发现 {len(duplicates)} 对近似重复的电影。")
+            for score, a, title_a, b, title_b in duplicates[:args.limit]:
+                print(f"  {score:.2f}  [{a}] {title_a}  <->  [{b}] {title_b}")
@@ -0,0 +1,196 @@
+# field_features.py
+# 多字段特征：类型、剧情/评论、导演、主演、国家/地区、语言、年代各自向量化成独立的稀疏块。
+#
+# 每个块单独做 L2 归一化，电影向量是各块横向拼接的结果（不含权重）。两部电影的相似度为
+#   Σ w_f · cos_f / Σ w_f
+# 其中 cos_f 是字段 f 上的余弦相似度。权重只乘在查询向量上，电影向量不变，
+# 所以调整权重不需要重新分词或训练，可以在界面上或每个请求中随时修改。
+import re
+
+import numpy as np
+import scipy.sparse as sp
+
+# 字段名 -> 数据库列
+FIELD_COLUMNS = {
+    'genre': 'category',
+    'plot': 'comments',
+    'director': 'director',
+    'cast': 'leader',
+    'country': 'country',
+    'language': 'language',
+    'year': 'years',
+}
+
+FIELD_LABELS = {
+    'genre': '类型',
+    'plot': '剧情/评论',
+    'director': '导演',
+    'cast': '主演',
+    'country': '国家/地区',
+    'language': '语言',
+    'year': '年代',
+}
+
+DEFAULT_WEIGHTS = {
+    'genre': 1.0,
+    'plot': 1.0,
+    'director': 0.5,
+    'cast': 0.5,
+    'country': 0.2,
+    'language': 0.2,
+    'year': 0.2,
+}
+
+# 剧情/评论块的词表大小（其余字段的词表是名字、类型等，不设上限）
+PLOT_MAX_FEATURES = 5000
+
+
+def _split_values(text):
+    """多值字段按 '/'、','、'，'、'、' 拆分，每个完整的名字或类型是一个词"""
+    return [value.strip() for value in re.split(r'[/,，、|]', text) if value.strip()]
+
+
+def _year_tokens(text):
+    """上映日期只保留年份和年代，例如 '2011-10-01(中国大陆)' -> ['2011', '2010s']"""
+    match = re.search(r'(1[89]\d\d|20\d\d)', text)
+    if not match:
+        return []
+    year = int(match.group(1))
+    return [str(year), f'{year // 10 * 10}s']
+
+
+def _make_vectorizer(field):
+    # 导入 sklearn 约需1~2秒，推迟到真正需要向量化器时（从模型缓存加载时不需要）
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    if field == 'plot':
+        # 剧情/评论已用 jieba 分好词（空格分隔），沿用 TfidfVectorizer 默认的切词规则
+        return TfidfVectorizer(max_features=PLOT_MAX_FEATURES)
+    return TfidfVectorizer(analyzer=_year_tokens if field == 'year' else _split_values)
+
+
+def resolve_weights(weights=None):
+    """
+    把调用方提供的（部分）字段权重与默认权重合并并校验。
+
+    返回:
+    - dict: 包含全部字段的权重。
+
+    异常:
+    - ValueError: 字段名未知、权重为负数或全部为0。
+    """
+    resolved = dict(DEFAULT_WEIGHTS)
+    for field, weight in (weights or {}).items():
+        if field not in FIELD_COLUMNS:
+            raise ValueError(f"未知的字段 '{field}'，可选字段: {', '.join(FIELD_COLUMNS)}")
+        weight = float(weight)
+        if not weight >= 0:
+            raise ValueError(f"字段 '{field}' 的权重不能为负数")
+        resolved[field] = weight
+    if not any(resolved.values()):
+        raise ValueError("至少要有一个字段的权重大于0")
+    return resolved
+
+
+class FieldFeatures:
+    """各字段的向量化器，以及它们在拼接后的电影向量中所占的列"""
+
+    def __init__(self, vectorizers=None, stored=None):
+        """
+        参数:
+        - vectorizers (dict): 字段 -> TfidfVectorizer；某个字段在全部电影中都为空时为 None，对应的块没有列。
+        - stored (tuple): 代替 vectorizers 传入 to_store 保存的 (词表, IDF)，向量化器在第一次使用时才创建。
+        """
+        self._vectorizers = vectorizers
+        self._stored = stored
+        if vectorizers is not None:
+            sizes = [len(v.vocabulary_) if v is not None else 0 for v in vectorizers.values()]
+        else:
+            sizes = [len(stored[0].get(field) or ()) for field in FIELD_COLUMNS]
+        self.offsets = dict(zip(FIELD_COLUMNS, np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(int)))
+        self.sizes = dict(zip(FIELD_COLUMNS, sizes))
+        self.n_features = int(sum(sizes))
+
+    @property
+    def vectorizers(self):
+        if self._vectorizers is None:
+            vocabulary, idf = self._stored
+            vectorizers, offset = {}, 0
+            for field in FIELD_COLUMNS:
+                terms = vocabulary.get(field)
+                if terms is None:
+                    vectorizers[field] = None
+                    continue
+                vectorizer = _make_vectorizer(field)
+                vectorizer.vocabulary_ = {term: i for i, term in enumerate(terms)}
+                vectorizer.idf_ = np.asarray(idf[offset:offset + len(terms)])
+                offset += len(terms)
+                vectorizers[field] = vectorizer
+            self._vectorizers = vectorizers
+        return self._vectorizers
+
+    @property
+    def plot_vectorizer(self):
+        return self.vectorizers['plot']
+
+    @classmethod
+    def fit(cls, docs, n_docs=None):
+        """
+        在全部电影上训练各字段的向量化器。
+
+        参数:
+        - docs (dict): 字段 -> 文本列表；'plot' 为已分词的文本。每个字段只遍历一次，
+          也可以是直接从数据库逐行读取的生成器，此时需要提供 n_docs。
+        - n_docs (int): 电影数，None 表示取 len(docs['plot'])。
+
+        返回:
+        - a tuple: (FieldFeatures, 拼接后的 CSR 矩阵)
+        """
+        n_docs = len(docs['plot']) if n_docs is None else n_docs
+        vectorizers, blocks = {}, []
+        for field in FIELD_COLUMNS:
+            vectorizer = _make_vectorizer(field)
+            try:
+                blocks.append(vectorizer.fit_transform(docs[field]))
+                vectorizers[field] = vectorizer
+            except ValueError:
+                # 词表为空（如旧数据没有导演信息）
+                vectorizers[field] = None
+                blocks.append(sp.csr_matrix((n_docs, 0)))
+        return cls(vectorizers), sp.hstack(blocks, format='csr')
+
+    def transform(self, docs):
+        """用已训练的向量化器把电影转换成拼接后的 CSR 矩阵"""
+        blocks = []
+        for field, vectorizer in self.vectorizers.items():
+            if vectorizer is None:
+                blocks.append(sp.csr_matrix((len(docs[field]), 0)))
+            else:
+                blocks.append(vectorizer.transform(docs[field]))
+        return sp.hstack(blocks, format='csr')
+
+    def column_weights(self, weights):
+        """
+        每一列的查询权重：字段 f 的各列都是 w_f / Σw，
+        查询向量按列乘以它之后，与电影向量的点积就是按权重加权的余弦相似度。
+        """
+        total = sum(weights.values())
+        return np.concatenate([np.full(self.sizes[field], weights[field] / total, dtype=np.float32)
+                               for field in FIELD_COLUMNS])
+
+    def to_store(self):
+        """返回 (词表 {字段: 按列号排列的词表}, 按列号拼接的 IDF 权重)，供模型缓存保存"""
+        if self._vectorizers is None:
+            return self._stored
+        vocabulary, idf = {}, []
+        for field, vectorizer in self.vectorizers.items():
+            if vectorizer is None:
+                vocabulary[field] = None
+                continue
+            vocabulary[field] = vectorizer.get_feature_names_out().tolist()
+            idf.append(vectorizer.idf_)
+        return vocabulary, np.concatenate(idf) if idf else np.empty(0)
+
+    @classmethod
+    def from_store(cls, vocabulary, idf):
+        """从 to_store 保存的词表和 IDF 恢复，不需要重新训练；向量化器推迟到增量更新等需要时才创建"""
+        return cls(stored=(vocabulary, idf))
@@ -1,48 +1,15 @@
 # gui.py
+import os
 import sys
-import pandas as pd
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-                             QPushButton, QLineEdit, QTableWidget, QTableWidgetItem,
-                             QHeaderView, QGroupBox, QLabel, QTextEdit, QSpinBox,
-                             QTabWidget, QStyle, QSpacerItem, QSizePolicy,QFileDialog)  # 引入新控件
-from PyQt5.QtCore import QThread, QObject, pyqtSignal, pyqtSlot, QSize
+                             QPushButton, QLineEdit, QTableWidget, QTableWidgetItem, QTableView,
+                             QHeaderView, QGroupBox, QLabel, QTextEdit, QSpinBox, QDoubleSpinBox, QGridLayout,
+                             QTabWidget, QStyle, QSpacerItem, QSizePolicy,QFileDialog, QCompleter, QComboBox,
+                             QListWidget, QListWidgetItem)  # 引入新控件
+from PyQt5.QtCore import QObject, pyqtSignal, QSize, QStringListModel, Qt, QTimer
 from PyQt5.QtGui import QIcon  # 引入QIcon
 
 
-# ... (Worker 和 Stream 类保持不变) ...
-# --- 后台工作线程 ---
-class Worker(QObject):
-    finished = pyqtSignal()
-    error = pyqtSignal(tuple)
-    result = pyqtSignal(object)
-    progress = pyqtSignal(str)
-
-    def __init__(self, fn, *args,use_progress_callback=False, **kwargs):
-        super().__init__()
-        self.fn = fn
-        self.args = args
-        self.kwargs = kwargs
-        self.use_progress_callback = use_progress_callback
-
-    @pyqtSlot()
-    def run(self):
-        # 复制一份kwargs，避免修改原始字典
-        local_kwargs = self.kwargs.copy()
-
-        # 如果标记为需要回调，才添加它
-        if self.use_progress_callback:
-            local_kwargs['progress_callback'] = self.progress.emit
-
-        try:
-            # 使用新的局部字典
-            result = self.fn(*self.args, **local_kwargs)
-            self.result.emit(result)
-        except Exception as e:
-            self.error.emit((type(e), e, e.__traceback__))
-        finally:
-            self.finished.emit()
-
-
 # --- 用于重定向 print 输出到GUI日志窗口的类 ---
 class Stream(QObject):
     newText = pyqtSignal(str)
@@ -54,11 +21,36 @@ class Stream(QObject):
         pass  # 在GUI中，flush通常是无操作的
 
 
+# --- 把埋点记录从后台线程转发到界面线程 ---
+class SpanBridge(QObject):
+    spanFinished = pyqtSignal(object)
+
+
 # --- 导入后端逻辑模块 ---
+# recommend（连同 pandas、scipy）和 crawler（requests、bs4）导入较慢，推迟到后台任务或第一次使用时再导入，
+# 窗口可以立即显示
 import db_function
-import crawler
+import instrumentation
 import csv_import
-from recommend import MovieRecommender
+import text_segment
+from field_features import FIELD_LABELS, DEFAULT_WEIGHTS
+from table_model import MovieTableModel, COLUMNS
+from task_scheduler import (TaskScheduler, STATE_LABELS, PRIORITY_INTERACTIVE, PRIORITY_MODEL,
+                            PRIORITY_BACKGROUND)
+
+# 读写推荐模型的任务（加载、更新、重建、查询、口味画像）同属这个分组，依次执行
+MODEL_GROUP = 'model'
+# 写入数据库的导入、爬取任务同属这个分组，依次执行
+INGEST_GROUP = 'ingest'
+# 停止输入这么久（毫秒）之后才查询标题补全，连续输入时不会每个字都提交一个任务
+COMPLETION_DELAY_MS = 200
+
+
+def load_recommender():
+    """在后台线程中导入推荐模块并加载推荐模型"""
+    with instrumentation.span('startup.import_recommend'):
+        from recommend import MovieRecommender
+    return MovieRecommender()
 
 
 # --- 主窗口 ---
@@ -71,6 +63,19 @@ class MovieApp(QMainWindow):
 
         # 初始化推荐系统实例
         self.recommender = None
+        # 口味画像（推荐模型加载后创建），以及当前推荐结果的来源：'title' 或 'profile'
+        self.taste_profile = None
+        self.recommend_mode = 'title'
+        # 推荐页表格当前显示的结果对象；缓存命中时返回同一个对象，不必重新填充表格
+        self.shown_result = None
+        # 最近一次提交的推荐查询；新查询提交时取消尚未完成的旧查询
+        self.query_task = None
+        # 最近一次提交的标题补全查询
+        self.completion_task = None
+
+        # 后台任务调度：导入、爬取、模型更新和推荐查询可以同时进行
+        self.scheduler = TaskScheduler(self)
+        self.scheduler.taskChanged.connect(self.on_task_changed)
 
         # 应用QSS样式
         self.apply_stylesheet()
@@ -88,15 +93,18 @@ class MovieApp(QMainWindow):
         self.tab_data = QWidget()
         self.tab_recommend = QWidget()
         self.tab_browse = QWidget()
+        self.tab_stats = QWidget()
 
         self.tabs.addTab(self.tab_data, "数据管理")
         self.tabs.addTab(self.tab_recommend, "智能推荐")
         self.tabs.addTab(self.tab_browse, "浏览数据")
+        self.tabs.addTab(self.tab_stats, "性能统计")
 
         # 为每个选项卡页面设置布局和内容
         self._create_data_tab()
         self._create_recommend_tab()
         self._create_browse_tab()
+        self._create_stats_tab()
 
         # 创建右侧的日志区域
         self._create_log_area()
@@ -106,11 +114,7 @@ class MovieApp(QMainWindow):
 
         # 将选项卡和日志区添加到主布局
         self.main_layout.addWidget(self.tabs, 7)  # 占据70%宽度
-        self.main_layout.addWidget(self.log_group, 3)  # 占据30%宽度
-
-        # --- 线程和信号处理 ---
-        self.thread = None
-        self.worker = None
+        self.main_layout.addLayout(self.side_layout, 3)  # 占据30%宽度
 
         # 重定向print输出到日志窗口
         sys.stdout = Stream(newText=self.log)
@@ -118,19 +122,6 @@ class MovieApp(QMainWindow):
         # 启动时在后台加载推荐模型
         self.load_recommender_model()
 
-    def load_recommender_model(self):
-        self.log("正在后台加载推荐模型...")
-        # ---  ↓↓↓  更新状态栏  ↓↓↓  ---
-        self.statusBar().showMessage("正在加载推荐模型，请稍候...")
-
-        self.run_task(MovieRecommender)
-        self.worker.result.connect(self.on_recommender_loaded)
-
-    def on_recommender_loaded(self, recommender_instance):
-        self.recommender = recommender_instance
-        self.log("推荐模型加载完毕！")
-        # ---  ↓↓↓  再次更新状态栏，5000毫秒后自动消失  ↓↓↓  ---
-        self.statusBar().showMessage("模型加载成功，准备就绪！", 5000)
     def _create_data_tab(self):
         """创建“数据管理”选项卡页面"""
         layout = QVBoxLayout(self.tab_data)
@@ -167,7 +158,7 @@ class MovieApp(QMainWindow):
         csv_group.setLayout(csv_layout)
 
         csv_desc_label = QLabel(
-            "<b>作用:</b> 从utf-8编码的CSV文件批量导入电影数据。<b>要求:</b> CSV文件需包含 'title ', 'star ', 'all_tags', 'description' 等列。")
+            "<b>作用:</b> 从utf-8编码的CSV文件批量导入电影数据。<b>要求:</b> CSV文件需包含 title、star、all_tags、description 列（列名前后的空格会被忽略）。")
         csv_desc_label.setWordWrap(True)
         csv_desc_label.setStyleSheet("color: #ecf0f1;padding-left: 10px; padding-bottom: 15px;")
 
@@ -206,6 +197,16 @@ class MovieApp(QMainWindow):
         input_layout = QHBoxLayout()
         self.movie_input = QLineEdit()
         self.movie_input.setPlaceholderText("输入你喜欢的电影名（支持模糊搜索）")
+        # 边输入边补全：候选标题来自推荐模型的标题索引
+        self.title_completion_model = QStringListModel()
+        self.title_completer = QCompleter(self.title_completion_model, self)
+        self.title_completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.movie_input.setCompleter(self.title_completer)
+        self.completion_timer = QTimer(self)
+        self.completion_timer.setSingleShot(True)
+        self.completion_timer.setInterval(COMPLETION_DELAY_MS)
+        self.completion_timer.timeout.connect(self.update_title_completions)
+        self.movie_input.textEdited.connect(self.completion_timer.start)
         self.recommend_button = QPushButton("获取推荐")
         self.recommend_button.setIcon(self.style().standardIcon(QStyle.SP_DialogYesButton))
         self.recommend_button.clicked.connect(self.get_recommendations)
@@ -213,22 +214,74 @@ class MovieApp(QMainWindow):
         input_layout.addWidget(self.recommend_button)
         input_group.setLayout(input_layout)
 
+        # 口味画像：把多部喜欢/不喜欢的电影合成一个查询，每次增减电影后立即刷新推荐结果
+        profile_group = QGroupBox("口味画像（双击推荐结果可加入喜欢）")
+        profile_layout = QHBoxLayout()
+        self.profile_list = QListWidget()
+        self.profile_list.setMaximumHeight(90)
+        profile_buttons = QVBoxLayout()
+        self.like_button = QPushButton("加入喜欢")
+        self.like_button.clicked.connect(lambda: self.add_input_to_profile(liked=True))
+        self.dislike_button = QPushButton("加入不喜欢")
+        self.dislike_button.clicked.connect(lambda: self.add_input_to_profile(liked=False))
+        remove_pick_button = QPushButton("移除所选")
+        remove_pick_button.clicked.connect(self.remove_profile_pick)
+        clear_profile_button = QPushButton("清空")
+        clear_profile_button.clicked.connect(self.clear_profile)
+        for button in (self.like_button, self.dislike_button, remove_pick_button, clear_profile_button):
+            profile_buttons.addWidget(button)
+        profile_layout.addWidget(self.profile_list)
+        profile_layout.addLayout(profile_buttons)
+        profile_group.setLayout(profile_layout)
+
+        # 各字段的权重：只影响查询时的打分，修改后立即刷新当前推荐结果，不需要重新训练模型
+        weights_group = QGroupBox("字段权重")
+        weights_layout = QGridLayout()
+        self.weight_spinboxes = {}
+        for i, (field, label) in enumerate(FIELD_LABELS.items()):
+            spinbox = QDoubleSpinBox()
+            spinbox.setRange(0.0, 5.0)
+            spinbox.setSingleStep(0.1)
+            spinbox.setValue(DEFAULT_WEIGHTS[field])
+            spinbox.valueChanged.connect(self.on_weights_changed)
+            self.weight_spinboxes[field] = spinbox
+            weights_layout.addWidget(QLabel(label), i // 4, (i % 4) * 2)
+            weights_layout.addWidget(spinbox, i // 4, (i % 4) * 2 + 1)
+        reset_weights_button = QPushButton("恢复默认")
+        reset_weights_button.clicked.connect(self.reset_weights)
+        weights_layout.addWidget(reset_weights_button, len(FIELD_LABELS) // 4, 6, 1, 2)
+        weights_group.setLayout(weights_layout)
+
         result_group = QGroupBox("推荐结果")
         result_layout = QVBoxLayout()
         self.recommend_table = QTableWidget()
         self.setup_table_style(self.recommend_table)
+        self.recommend_table.cellDoubleClicked.connect(self.on_recommend_row_double_clicked)
         result_layout.addWidget(self.recommend_table)
         result_group.setLayout(result_layout)
 
         layout.addWidget(input_group)
+        layout.addWidget(profile_group)
+        layout.addWidget(weights_group)
         layout.addWidget(result_group)
 
     def _create_browse_tab(self):
         """创建“浏览数据”选项卡页面"""
         layout = QVBoxLayout(self.tab_browse)
 
-        self.browse_table = QTableWidget()
-        self.setup_table_style(self.browse_table)
+        # 浏览表格使用按需分页加载的模型，数据在后台线程读取，排序在数据库中完成
+        self.browse_model = MovieTableModel(self)
+        self.browse_model.totalChanged.connect(
+            lambda total: self.statusBar().showMessage(f"数据库中共有 {total} 部电影。", 5000))
+        self.browse_model.error.connect(lambda message: self.log(f"读取数据库出错: {message}"))
+        self.browse_table = QTableView()
+        self.browse_table.setModel(self.browse_model)
+        self.browse_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        self.browse_table.verticalHeader().setVisible(False)
+        self.browse_table.setAlternatingRowColors(True)
+        self.browse_table.horizontalHeader().setSortIndicator(0, Qt.AscendingOrder)
+        self.browse_table.setSortingEnabled(True)
+        self.browse_table.horizontalHeader().sortIndicatorChanged.connect(self.on_browse_sort_changed)
 
         self.show_db_button = QPushButton("刷新数据库内容")
         self.show_db_button.setIcon(self.style().standardIcon(QStyle.SP_BrowserReload))
@@ -236,9 +289,83 @@ class MovieApp(QMainWindow):
 
         layout.addWidget(self.show_db_button)
         layout.addWidget(self.browse_table)
+        self.browse_model.refresh()
+
+    def _create_stats_tab(self):
+        """创建“性能统计”选项卡页面：各阶段的耗时、CPU时间、行数和内存"""
+        layout = QVBoxLayout(self.tab_stats)
+
+        self.stats_table = QTableWidget()
+        self.stats_table.setColumnCount(len(self.STATS_HEADERS))
+        self.stats_table.setHorizontalHeaderLabels(self.STATS_HEADERS)
+        self.stats_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.stats_table.verticalHeader().setVisible(False)
+        self.stats_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.stats_table.setAlternatingRowColors(True)
+        self.counters_label = QLabel()
+        self.counters_label.setWordWrap(True)
+        self.counters_label.setStyleSheet("color: #ecf0f1;")
+
+        button_layout = QHBoxLayout()
+        self.export_stats_button = QPushButton("导出JSON...")
+        self.export_stats_button.clicked.connect(self.export_stats)
+        self.reset_stats_button = QPushButton("清空统计")
+        self.reset_stats_button.clicked.connect(self.reset_stats)
+        # 剖析模式：让所选阶段的下一次运行在 cProfile 和 tracemalloc 下进行
+        self.profile_combo = QComboBox()
+        self.profile_combo.setEditable(True)
+        self.profile_combo.addItems(self.PROFILE_SPANS)
+        self.profile_button = QPushButton("剖析下一次运行")
+        self.profile_button.clicked.connect(self.capture_next_span)
+        button_layout.addWidget(self.export_stats_button)
+        button_layout.addWidget(self.reset_stats_button)
+        button_layout.addStretch()
+        button_layout.addWidget(self.profile_combo)
+        button_layout.addWidget(self.profile_button)
+
+        layout.addLayout(button_layout)
+        layout.addWidget(self.stats_table)
+        layout.addWidget(self.counters_label)
+
+        # 埋点记录可能来自后台线程，经由信号转到界面线程处理
+        self.span_bridge = SpanBridge()
+        self.span_bridge.spanFinished.connect(self.on_span_finished)
+        self.span_listener = self.span_bridge.spanFinished.emit
+        instrumentation.add_listener(self.span_listener)
+        self.stats_dirty = True
+        self.stats_timer = QTimer(self)
+        self.stats_timer.timeout.connect(self.refresh_stats)
+        self.stats_timer.start(1000)
 
     def _create_log_area(self):
-        """创建右侧的日志区域"""
+        """创建右侧的任务列表和日志区域"""
+        self.side_layout = QVBoxLayout()
+
+        self.task_group = QGroupBox("任务")
+        task_layout = QVBoxLayout()
+        self.task_table = QTableWidget()
+        self.task_table.setColumnCount(len(self.TASK_HEADERS))
+        self.task_table.setHorizontalHeaderLabels(self.TASK_HEADERS)
+        self.task_table.horizontalHeader().setSectionResizeMode(len(self.TASK_HEADERS) - 1, QHeaderView.Stretch)
+        self.task_table.verticalHeader().setVisible(False)
+        self.task_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.task_table.setSelectionBehavior(QTableWidget.SelectRows)
+        task_buttons = QHBoxLayout()
+        self.cancel_task_button = QPushButton("取消所选任务")
+        self.cancel_task_button.clicked.connect(self.cancel_selected_tasks)
+        clear_tasks_button = QPushButton("清除已结束")
+        clear_tasks_button.clicked.connect(self.clear_finished_tasks)
+        task_buttons.addWidget(self.cancel_task_button)
+        task_buttons.addWidget(clear_tasks_button)
+        task_layout.addWidget(self.task_table)
+        task_layout.addLayout(task_buttons)
+        self.task_group.setLayout(task_layout)
+        # 进度信息可能很频繁，合并到定时器中刷新任务列表；运行中任务的用时也靠它更新
+        self.tasks_dirty = False
+        self.task_timer = QTimer(self)
+        self.task_timer.timeout.connect(self.refresh_task_table)
+        self.task_timer.start(250)
+
         self.log_group = QGroupBox("日志")
         layout = QVBoxLayout()
         self.log_text = QTextEdit()
@@ -246,19 +373,13 @@ class MovieApp(QMainWindow):
         layout.addWidget(self.log_text)
         self.log_group.setLayout(layout)
 
+        self.side_layout.addWidget(self.task_group, 2)
+        self.side_layout.addWidget(self.log_group, 3)
+
     def log(self, message):
         self.log_text.append(message)
         self.log_text.ensureCursorVisible()
 
-    # --- 按钮使能/禁能 ---
-    def set_buttons_enabled(self, enabled):
-        self.init_db_button.setEnabled(enabled)
-        self.import_csv_button.setEnabled(enabled)
-        self.import_custom_csv_button.setEnabled(enabled)
-        self.crawl_button.setEnabled(enabled)
-        self.recommend_button.setEnabled(enabled)
-        self.show_db_button.setEnabled(enabled)
-
     # --- 表格样式和数据填充 ---
     def setup_table_style(self, table):
         table.setColumnCount(4)
@@ -342,7 +463,7 @@ class MovieApp(QMainWindow):
                 QTabBar::tab:selected {
                     background: #4a627a;
                 }
-                QTableWidget {
+                QTableView {
                     background-color: #34495e;
                     color: #ecf0f1;
                     gridline-color: #4a627a;
@@ -365,7 +486,9 @@ class MovieApp(QMainWindow):
     def run_import_csv(self):
         self.log("开始从默认 top250.csv 导入数据 (后台执行)...")
         file_path = './data/top250.csv'
-        self.run_task(csv_import.import_from_csv, file_path, use_progress_callback=True)
+        task = self.run_task("导入 top250.csv", csv_import.import_from_csv, file_path, group=INGEST_GROUP,
+                             use_progress_callback=True)
+        task.finished.connect(self.update_recommender_model)
 
         # 添加新的槽函数，用于处理自定义CSV导入
     def run_import_custom_csv(self):
@@ -381,23 +504,95 @@ class MovieApp(QMainWindow):
           # 如果用户选择了文件 (file_path不是空字符串)
         # if file_path:
         self.log(f"用户选择了文件: {file_path}")
-        self.run_task(csv_import.import_from_csv, file_path, use_progress_callback=True)
+        task = self.run_task(f"导入 {os.path.basename(file_path)}", csv_import.import_from_csv, file_path,
+                             group=INGEST_GROUP, use_progress_callback=True)
+        task.finished.connect(self.update_recommender_model)
     def run_crawl(self):
         num_pages = self.pages_spinbox.value()
         self.log(f"开始爬取 {num_pages} 页数据 (后台执行)...")
-        self.run_task(crawler.pachong, num_pages, use_progress_callback=True)
-        self.worker.finished.connect(lambda: self.log("爬取任务完成。"))
+        import crawler
+        task = self.run_task(f"爬取 {num_pages} 页", crawler.pachong, num_pages, group=INGEST_GROUP,
+                             use_progress_callback=True)
+        task.finished.connect(lambda: self.log("爬取任务完成。"))
+        task.finished.connect(self.update_recommender_model)
+
+    def update_recommender_model(self):
+        """导入或爬取完成后，只把新增的电影增量更新进已加载的推荐模型"""
+        if not self.recommender:
+            return
+        self.log("正在增量更新推荐模型...")
+        task = self.run_task("增量更新推荐模型", self.recommender.update_movies, priority=PRIORITY_MODEL,
+                             group=MODEL_GROUP)
+        task.result.connect(self.on_recommender_updated)
+
+    def on_recommender_updated(self, result):
+        self.statusBar().showMessage(f"推荐模型已更新：新增 {result['added']} 部电影。", 5000)
+        if result['refit_pending']:
+            # 词表漂移过大，在后台安排一次完整重建
+            self.log("词表变化较大，正在后台完整重建推荐模型...")
+            self.run_task("完整重建推荐模型", self.recommender.refit_if_pending, priority=PRIORITY_MODEL,
+                          group=MODEL_GROUP)
 
     def load_recommender_model(self):
         self.log("正在后台加载推荐模型...")
-        self.run_task(MovieRecommender)
-        self.worker.result.connect(self.on_recommender_loaded)
+        self.statusBar().showMessage("正在加载推荐模型，请稍候...")
+        task = self.run_task("加载推荐模型", load_recommender, priority=PRIORITY_MODEL, group=MODEL_GROUP)
+        task.result.connect(self.on_recommender_loaded)
+        # 同时在另一个后台线程中预热 jieba 词典，之后的导入、爬取触发增量更新时不必再等待
+        text_segment.warm_up()
 
     def on_recommender_loaded(self, recommender_instance):
+        from recommend import TasteProfile
         self.recommender = recommender_instance
+        self.taste_profile = TasteProfile(recommender_instance)
+        self.profile_list.clear()
         self.log("推荐模型加载完毕！")
+        # 5000毫秒后自动消失
+        self.statusBar().showMessage("模型加载成功，准备就绪！", 5000)
+
+    def update_title_completions(self):
+        """
+        输入停顿 COMPLETION_DELAY_MS 毫秒后，根据输入框当前内容从标题索引中取出候选标题作为补全列表。
+        查询与模型更新同在 'model' 组中执行，不会读到重建了一半的标题索引；只保留最近一次查询。
+        """
+        text = self.movie_input.text()
+        if not self.recommender or not text.strip():
+            return
+        if self.completion_task is not None:
+            self.scheduler.cancel(self.completion_task)
+        # 补全任务结束后不保留在任务列表中
+        task = self.run_task("标题补全", self.recommender.resolve_title, text, limit=15,
+                             priority=PRIORITY_INTERACTIVE, group=MODEL_GROUP, transient=True)
+        task.result.connect(lambda candidates: self.on_title_completions(task, text, candidates))
+        self.completion_task = task
+
+    def on_title_completions(self, task, text, candidates):
+        if task is not self.completion_task or self.movie_input.text() != text:
+            return  # 输入框内容已经变化
+        self.title_completion_model.setStringList([c['title'] for c in candidates])
+        if candidates:
+            self.title_completer.complete()
+
+    def current_weights(self):
+        return {field: spinbox.value() for field, spinbox in self.weight_spinboxes.items()}
+
+    def reset_weights(self):
+        for field, spinbox in self.weight_spinboxes.items():
+            spinbox.blockSignals(True)
+            spinbox.setValue(DEFAULT_WEIGHTS[field])
+            spinbox.blockSignals(False)
+        self.on_weights_changed()
+
+    def on_weights_changed(self):
+        """权重变化时，如果已经显示了推荐结果，就按新权重重新打分"""
+        if not self.recommend_table.rowCount():
+            return
+        if self.recommend_mode == 'profile':
+            self.get_profile_recommendations(quiet=True)
+        elif self.movie_input.text().strip():
+            self.get_recommendations(quiet=True)
 
-    def get_recommendations(self):
+    def get_recommendations(self, quiet=False):
         movie_title = self.movie_input.text().strip()
         if not movie_title:
             self.log("请输入电影名称。")
@@ -406,37 +601,276 @@ class MovieApp(QMainWindow):
             self.log("推荐模型尚未加载完成，请稍候。")
             return
 
-        result = self.recommender.get_recommendations(movie_title)
+        recommender = self.recommender
+        weights = self.current_weights()
 
+        def query():
+            try:
+                return recommender.get_recommendations(movie_title, weights=weights)
+            except ValueError as e:
+                return f"字段权重无效: {e}"
+
+        task = self.submit_query(f"推荐：{movie_title}", query)
+        task.result.connect(lambda result: self.on_title_recommendations(task, movie_title, result, quiet))
+
+    def on_title_recommendations(self, task, movie_title, result, quiet):
+        if task is not self.query_task:
+            return  # 已有更新的查询
         if isinstance(result, str):
             self.log(result)
-        elif isinstance(result, pd.DataFrame):
-            self.log(f"为《{movie_title}》找到的推荐结果:")
+        elif result is not None:
+            if not quiet:
+                self.log(f"为《{movie_title}》找到的推荐结果:")
             # 将结果填充到“推荐”页的表格中
+            self.show_recommendations(result, 'title')
+
+    def submit_query(self, name, fn, supersedable=True):
+        """
+        在后台提交推荐查询：优先级最高，与模型更新同在 'model' 组中依次执行。
+        结果只在它仍是最近一次查询时显示；上一次查询尚未完成且可以被取代时直接取消。
+        修改口味画像的查询不能被取代，否则那次修改会丢失。
+        """
+        previous = self.query_task
+        if previous is not None and previous.supersedable:
+            self.scheduler.cancel(previous)
+        task = self.run_task(name, fn, priority=PRIORITY_INTERACTIVE, group=MODEL_GROUP)
+        task.supersedable = supersedable
+        self.query_task = task
+        return task
+
+    def show_recommendations(self, result, mode):
+        """把推荐结果填充到“推荐”页的表格中；与当前显示的是同一个（缓存的）结果时跳过"""
+        self.recommend_mode = mode
+        if result is self.shown_result:
+            return
+        self.shown_result = result
+        if result is None:
+            self.recommend_table.setRowCount(0)
+        else:
             self.populate_table(self.recommend_table, result.reset_index())
 
+    # --- 口味画像 ---
+    def add_input_to_profile(self, liked=True):
+        """把输入框中的电影加入口味画像；匹配到多部电影时只提示候选，不自动选择"""
+        movie_title = self.movie_input.text().strip()
+        if not movie_title:
+            self.log("请输入电影名称。")
+            return
+        if self.taste_profile is None or not self.recommender.ready:
+            self.log("推荐模型尚未加载完成，请稍候。")
+            return
+        task = self.run_task(f"查找：{movie_title}", self.recommender.resolve_title, movie_title, limit=10,
+                             priority=PRIORITY_INTERACTIVE, group=MODEL_GROUP)
+        task.result.connect(lambda candidates: self.on_profile_candidates(movie_title, candidates, liked))
+
+    def on_profile_candidates(self, movie_title, candidates, liked):
+        if not candidates:
+            self.log(f"错误：数据库中未找到任何包含 '{movie_title}' 的电影。")
+        elif len(candidates) == 1 or candidates[0]['title'].lower() == movie_title.lower():
+            self.add_to_profile(candidates[0]['id'], liked)
+        else:
+            self.log(f"找到多个匹配项，请在输入框中选择完整的标题: "
+                     f"{'、'.join(c['title'] for c in candidates)}")
+
+    def add_to_profile(self, movie_id, liked=True):
+        self.update_profile(lambda profile: profile.add(movie_id, liked))
+
+    def on_recommend_row_double_clicked(self, row, column):
+        """双击推荐结果中的一行，把这部电影加入喜欢（第0列为电影id）"""
+        item = self.recommend_table.item(row, 0)
+        if self.taste_profile is None or item is None:
+            return
+        try:
+            movie_id = int(item.text())
+        except ValueError:
+            return
+        self.add_to_profile(movie_id, liked=True)
+
+    def remove_profile_pick(self):
+        if self.taste_profile is None:
+            return
+        movie_ids = [item.data(Qt.UserRole) for item in self.profile_list.selectedItems()]
+
+        def remove(profile):
+            for movie_id in movie_ids:
+                profile.remove(movie_id)
+
+        self.update_profile(remove)
+
+    def clear_profile(self):
+        if self.taste_profile is not None:
+            self.update_profile(lambda profile: profile.clear())
+
+    def refresh_profile_list(self):
+        self.profile_list.clear()
+        if self.taste_profile is None:
+            return
+        titles = self.recommender.df['title']
+        # 画像在后台任务中修改，先复制一份再遍历
+        for movie_id, liked in list(self.taste_profile.picks.items()):
+            item = QListWidgetItem(f"{'喜欢' if liked else '不喜欢'}：{titles.get(movie_id, movie_id)}")
+            item.setData(Qt.UserRole, movie_id)
+            self.profile_list.addItem(item)
+
+    def get_profile_recommendations(self, quiet=False):
+        """按口味画像中的全部电影推荐，种子电影本身不会出现在结果中"""
+        if self.taste_profile is not None:
+            self.update_profile(quiet=quiet)
+
+    def update_profile(self, change=None, quiet=False):
+        """
+        在后台任务中修改口味画像（change 为接收画像的函数，None 表示不修改）并按新画像推荐。
+        画像的修改和读取都在 'model' 组的任务中进行，不会与模型更新或其它查询交错。
+        """
+        profile = self.taste_profile
+        weights = self.current_weights()
+
+        def work():
+            if change is not None:
+                try:
+                    change(profile)
+                except KeyError as e:
+                    return f"无法修改口味画像: {e}"
+            if not profile.picks:
+                return None
+            try:
+                return profile.recommend(top_n=10, weights=weights)
+            except (KeyError, ValueError) as e:
+                return f"无法按口味画像推荐: {e}"
+
+        task = self.submit_query("口味画像推荐", work, supersedable=change is None)
+        task.result.connect(lambda result: self.on_profile_recommendations(task, result, quiet))
+
+    def on_profile_recommendations(self, task, result, quiet):
+        self.refresh_profile_list()
+        if task is not self.query_task:
+            return
+        if isinstance(result, str):
+            self.log(result)
+        elif result is None:
+            if self.recommend_mode == 'profile':
+                self.show_recommendations(None, 'profile')
+        else:
+            if not quiet:
+                self.log(f"按口味画像（喜欢 {len(self.taste_profile.liked)} 部，"
+                         f"不喜欢 {len(self.taste_profile.disliked)} 部）找到 {len(result)} 部推荐电影。")
+            self.show_recommendations(result, 'profile')
+
     def show_all_db_content(self):
-        self.log("正在从数据库加载所有电影...")
-        movies, _ = db_function.get_movies_paginated(1, 10000)
-        df = pd.DataFrame(movies, columns=['id', 'title', 'rating', 'category'])
-        # 将结果填充到“浏览”页的表格中
-        self.populate_table(self.browse_table, df)
-        self.log(f"已加载 {len(df)} 条电影。")
-
-    # --- 后台任务处理 (保持不变) ---
-    def run_task(self, fn, *args,use_progress_callback=False, **kwargs):
-        self.thread = QThread()
-        self.worker = Worker(fn, *args, use_progress_callback=use_progress_callback,**kwargs)
-        self.worker.moveToThread(self.thread)
-
-        self.worker.progress.connect(self.log)
-        self.worker.error.connect(lambda e: self.log(f"错误: {e[1]}"))
-        self.thread.started.connect(self.worker.run)
-        self.worker.finished.connect(self.thread.quit)
-        self.worker.finished.connect(self.worker.deleteLater)
-        self.thread.finished.connect(self.thread.deleteLater)
-
-        self.thread.start()
-        self.set_buttons_enabled(False)
-        self.worker.finished.connect(lambda: self.set_buttons_enabled(True))
+        # 只重新读取总数和第一页，其余行在滚动时按需加载
+        self.log("正在刷新数据库内容...")
+        self.browse_model.refresh()
+
+    def on_browse_sort_changed(self, column, order):
+        """类别列不支持排序，点击时把排序指示恢复为当前的排序列"""
+        model = self.browse_model
+        if COLUMNS[column] not in db_function.SORTABLE_COLUMNS:
+            current = COLUMNS.index(model.order_by)
+            self.browse_table.horizontalHeader().setSortIndicator(
+                current, Qt.DescendingOrder if model.descending else Qt.AscendingOrder)
+
+    # --- 性能统计 ---
+    STATS_HEADERS = ["阶段", "次数", "总耗时(s)", "平均(ms)", "p95(ms)", "CPU(s)", "行数", "行/秒", "峰值内存(MB)"]
+    # 这些阶段结束时在状态栏显示耗时摘要
+    STATUS_SPANS = ('recommend.load_and_build', 'recommend.update', 'recommend.query', 'import.csv', 'crawl')
+    PROFILE_SPANS = ['recommend.build', 'recommend.load_and_build', 'recommend.update', 'recommend.query',
+                     'import.csv', 'crawl']
+
+    def on_span_finished(self, record):
+        self.stats_dirty = True
+        if record.name in self.STATUS_SPANS:
+            message = f"{record.name}: 耗时 {record.wall_s:.2f} 秒"
+            if record.rows is not None:
+                message += f"，{record.rows} 行"
+            if record.rss_mb is not None:
+                message += f"，内存 {record.rss_mb:.0f} MB"
+            self.statusBar().showMessage(message, 8000)
+
+    def refresh_stats(self):
+        """统计有变化且“性能统计”页可见时刷新表格"""
+        if not self.stats_dirty or self.tabs.currentWidget() is not self.tab_stats:
+            return
+        self.stats_dirty = False
+        summary = instrumentation.summary()
+        self.stats_table.setRowCount(len(summary['spans']))
+        for row, (name, stats) in enumerate(summary['spans'].items()):
+            values = [name, stats['count'], f"{stats['total_wall_s']:.3f}", f"{stats['mean_wall_s'] * 1000:.2f}",
+                      f"{stats['p95_wall_s'] * 1000:.2f}", f"{stats['total_cpu_s']:.3f}", stats['rows'],
+                      f"{stats['rows_per_s']:.0f}" if stats['rows_per_s'] else "",
+                      f"{stats['peak_rss_mb']:.0f}" if stats['peak_rss_mb'] is not None else ""]
+            for col, value in enumerate(values):
+                self.stats_table.setItem(row, col, QTableWidgetItem(str(value)))
+        counters = '，'.join(f"{name}={value}" for name, value in summary['counters'].items())
+        memory = f"当前内存 {summary['rss_mb']:.0f} MB" if summary['rss_mb'] is not None else ""
+        self.counters_label.setText(f"<b>计数器:</b> {counters or '无'}<br>{memory}")
+
+    def export_stats(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "导出性能统计", "stats.json", "JSON 文件 (*.json)")
+        if file_path:
+            instrumentation.dump_json(file_path)
+            self.log(f"性能统计已导出到: {file_path}")
+
+    def reset_stats(self):
+        instrumentation.reset()
+        self.stats_dirty = True
+        self.refresh_stats()
+
+    def capture_next_span(self):
+        name = self.profile_combo.currentText().strip()
+        if name:
+            instrumentation.capture_next(name)
+            self.log(f"将在下一次 '{name}' 运行时记录剖析结果（保存到 '{instrumentation.recorder.profile_dir}' 目录）。")
+
+    def closeEvent(self, event):
+        instrumentation.remove_listener(self.span_listener)
+        self.browse_model.shutdown()
+        self.task_timer.stop()
+        # 取消排队和运行中的任务（导入、爬取会在下一次报告进度时退出），等待线程池中的任务结束
+        self.scheduler.shutdown()
+        super().closeEvent(event)
+
+    # --- 后台任务处理 ---
+    TASK_HEADERS = ["ID", "任务", "状态", "用时(s)", "进度"]
+
+    def run_task(self, name, fn, *args, priority=PRIORITY_BACKGROUND, group=None, use_progress_callback=False,
+                 **kwargs):
+        """把任务提交给调度器，进度信息和错误写入日志；参数见 TaskScheduler.submit"""
+        task = self.scheduler.submit(name, fn, *args, priority=priority, group=group,
+                                     use_progress_callback=use_progress_callback, **kwargs)
+        task.progress.connect(self.log)
+        task.error.connect(lambda e: self.log(f"错误: {e[1]}"))
+        return task
+
+    def on_task_changed(self, task):
+        self.tasks_dirty = True
+
+    def refresh_task_table(self):
+        """任务有变化或有任务在运行（用时在变化）时刷新任务列表"""
+        tasks = list(self.scheduler.tasks.values())
+        if not self.tasks_dirty and not any(task.active for task in tasks):
+            return
+        self.tasks_dirty = False
+        # 进行中的任务排在前面，同类中新提交的在前
+        tasks.sort(key=lambda task: (not task.active, -task.id))
+        self.task_table.setRowCount(len(tasks))
+        for row, task in enumerate(tasks):
+            elapsed = task.elapsed()
+            values = [task.id, task.name, STATE_LABELS[task.state],
+                      "" if elapsed is None else f"{elapsed:.1f}", task.message]
+            for col, value in enumerate(values):
+                self.task_table.setItem(row, col, QTableWidgetItem(str(value)))
+        running = sum(1 for task in tasks if task.active)
+        self.task_group.setTitle(f"任务（进行中 {running}）" if running else "任务")
+
+    def cancel_selected_tasks(self):
+        rows = {index.row() for index in self.task_table.selectedIndexes()}
+        for row in rows:
+            task = self.scheduler.tasks.get(int(self.task_table.item(row, 0).text()))
+            if task is not None and self.scheduler.cancel(task):
+                self.log(f"已请求取消任务: {task.name}")
+
+    def clear_finished_tasks(self):
+        self.scheduler.clear_finished()
+        self.tasks_dirty = True
+        self.refresh_task_table()
 
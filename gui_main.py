@@ -1,23 +1,80 @@
 # main.py
 import sys
+import time
+
+# 进程启动的时刻，用于统计窗口显示前的总耗时
+STARTED = time.perf_counter()
+
+import importlib.util
+from PyQt5.QtCore import QTimer
 from PyQt5.QtWidgets import QApplication
-from gui import MovieApp # 从我们新建的 gui.py 中导入主窗口类
+
+import instrumentation
+
+# 模块名 -> pip 包名
+REQUIRED_MODULES = {
+    'pandas': 'pandas',
+    'jieba': 'jieba',
+    'sklearn': 'scikit-learn',
+    'requests': 'requests',
+    'bs4': 'beautifulsoup4',
+}
+
+# 启动报告中列出的阶段
+STARTUP_SPANS = ('startup.import_gui', 'startup.window', 'startup.import_recommend', 'recommend.load_and_build',
+                 'startup.jieba')
+
+
+def missing_modules():
+    """只在 sys.path 中查找模块是否已安装，不真正导入（导入 pandas、sklearn 等需要好几秒）"""
+    return [name for name in REQUIRED_MODULES if importlib.util.find_spec(name) is None]
+
+
+def startup_report(window_s):
+    """启动各阶段的耗时：窗口显示之前的阶段在主线程，其余在后台线程中与界面同时进行"""
+    spans = instrumentation.summary()['spans']
+    lines = [f"窗口显示用时 {window_s:.2f} 秒（从进程启动算起）"]
+    for name in STARTUP_SPANS:
+        if name in spans:
+            lines.append(f"  {name:<28}{spans[name]['total_wall_s']:>8.3f} 秒")
+    return '\n'.join(lines)
+
+
+def wait_and_report(app, window, window_s):
+    """--startup-report：等推荐模型加载完、jieba 预热完成后输出启动报告并退出"""
+    import text_segment
+
+    def check():
+        if window.recommender is None or text_segment.warm_up().is_alive():
+            return
+        timer.stop()
+        sys.__stdout__.write(startup_report(window_s) + '\n')
+        sys.__stdout__.write(f"推荐模型加载、jieba 预热全部完成用时 {time.perf_counter() - STARTED:.2f} 秒（从进程启动算起）\n")
+        app.quit()
+
+    timer = QTimer()
+    timer.timeout.connect(check)
+    timer.start(50)
+    return timer
+
 
 if __name__ == '__main__':
-    # 检查依赖的代码可以保留，但对于GUI来说，更好的方式是在GUI启动时提示
-    try:
-        import pandas
-        import jieba
-        import sklearn
-        import requests
-        import bs4
-    except ImportError as e:
-        print(f"错误：缺少必要的库: {e.name}")
+    missing = missing_modules()
+    if missing:
+        print(f"错误：缺少必要的库: {', '.join(missing)}")
         print("请运行: pip install pandas jieba scikit-learn requests beautifulsoup4 lxml PyQt5")
         sys.exit(1) # 退出程序
 
     # --- 启动GUI应用程序 ---
     app = QApplication(sys.argv)
-    window = MovieApp()
-    window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    with instrumentation.span('startup.import_gui'):
+        from gui import MovieApp # 从我们新建的 gui.py 中导入主窗口类
+    with instrumentation.span('startup.window'):
+        window = MovieApp()
+        window.show()
+    window_s = time.perf_counter() - STARTED
+    window.log(startup_report(window_s))
+
+    if '--startup-report' in sys.argv:
+        report_timer = wait_and_report(app, window, window_s)
+    sys.exit(app.exec_())
@@ -0,0 +1,83 @@
+# http_cache.py
+# 爬虫的磁盘响应缓存：保存页面内容及其 ETag / Last-Modified，再次请求同一页面时发送条件请求。
+#
+# 服务器返回 304 Not Modified 时不传输页面内容，直接使用缓存中的版本。
+# 每个URL对应缓存目录中的两个文件：{sha1}.body 为原始响应内容，{sha1}.json 为元数据。
+# 两个文件都先写临时文件再替换，爬虫中途被中断也不会留下半个文件。
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+DEFAULT_CACHE_DIR = 'http_cache'
+
+
+class HttpCache:
+    """
+    以URL为键的磁盘响应缓存，可被多个下载线程同时使用（不同URL写不同的文件）。
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url, suffix):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode('utf-8')).hexdigest() + suffix)
+
+    def _write(self, path, data):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def metadata(self, url):
+        """返回缓存的元数据 {'url', 'etag', 'last_modified', 'stored_at'}，没有缓存时返回 None"""
+        try:
+            with open(self._path(url, '.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def conditional_headers(self, url):
+        """
+        返回条件请求要附加的请求头。缓存的页面内容不存在时返回空字典，避免收到 304 却没有内容可用。
+        """
+        meta = self.metadata(url)
+        if meta is None or not os.path.exists(self._path(url, '.body')):
+            return {}
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def load(self, url):
+        """返回缓存的响应内容（bytes），没有缓存时返回 None"""
+        try:
+            with open(self._path(url, '.body'), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def store(self, url, content, headers):
+        """
+        保存一次 200 响应。响应既没有 ETag 也没有 Last-Modified 时无法发送条件请求，不缓存。
+
+        参数:
+        - url (str): 请求的URL。
+        - content (bytes): 响应内容。
+        - headers (mapping): 响应头（大小写不敏感，如 requests 的 response.headers）。
+        """
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+        self._write(self._path(url, '.body'), content)
+        meta = {'url': url, 'etag': etag, 'last_modified': last_modified, 'stored_at': time.time()}
+        self._write(self._path(url, '.json'), json.dumps(meta, ensure_ascii=False).encode('utf-8'))
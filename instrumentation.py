@@ -0,0 +1,280 @@
+# instrumentation.py
+# 轻量的性能埋点：用 span 记录每个阶段的耗时、CPU时间、内存和处理行数，用计数器记录事件次数。
+#
+# 用法:
+#   with instrumentation.span('recommend.tfidf') as s:
+#       ...
+#       s.rows = matrix.shape[0]
+#   instrumentation.incr('segment.cache_hits', hits)
+#   instrumentation.dump_json('stats.json')
+#
+# 默认只读取计时器和常驻内存，开销可以忽略；需要细节时用 capture_next(span名) 让下一次该 span
+# 在 cProfile 和 tracemalloc 下运行，分析结果写入 PROFILE_DIR。
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+# 每个 span 保留最近多少次的耗时，用于计算分位数
+MAX_SAMPLES = 1000
+PROFILE_DIR = 'profiles'
+# tracemalloc 报告中列出的内存分配位置数
+TOP_ALLOCATIONS = 20
+
+
+def current_rss_mb():
+    """当前进程的常驻内存（MB），平台不支持时返回 None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss / 1024 / 1024
+
+
+def peak_rss_mb():
+    """进程启动以来的峰值常驻内存（MB），平台不支持时返回 None"""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset / 1024 / 1024
+    # Linux 上单位是 KB，macOS 上是字节
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 / (1024 if sys.platform == 'darwin' else 1)
+
+
+class Span:
+    """一次 span 的测量结果；在 with 块内可以设置 rows 记录处理的行数"""
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = None
+        self.wall_s = 0.0
+        self.cpu_s = 0.0
+        self.rss_mb = None
+        self.peak_rss_mb = None
+        self.error = False
+
+    def as_dict(self):
+        return {'name': self.name, 'wall_s': self.wall_s, 'cpu_s': self.cpu_s, 'rows': self.rows,
+                'rss_mb': self.rss_mb, 'peak_rss_mb': self.peak_rss_mb, 'error': self.error}
+
+
+class _SpanStats:
+    """同名 span 的累计统计"""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_wall_s = 0.0
+        self.total_cpu_s = 0.0
+        self.max_wall_s = 0.0
+        self.rows = 0
+        self.peak_rss_mb = None
+        self.samples = deque(maxlen=MAX_SAMPLES)
+        self.last = None
+
+    def add(self, record):
+        self.count += 1
+        self.errors += record.error
+        self.total_wall_s += record.wall_s
+        self.total_cpu_s += record.cpu_s
+        self.max_wall_s = max(self.max_wall_s, record.wall_s)
+        self.rows += record.rows or 0
+        if record.peak_rss_mb is not None:
+            self.peak_rss_mb = max(self.peak_rss_mb or 0.0, record.peak_rss_mb)
+        self.samples.append(record.wall_s)
+        self.last = record
+
+    def percentile(self, q):
+        values = sorted(self.samples)
+        if not values:
+            return 0.0
+        return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'total_wall_s': self.total_wall_s,
+            'total_cpu_s': self.total_cpu_s,
+            'mean_wall_s': self.total_wall_s / self.count if self.count else 0.0,
+            'p50_wall_s': self.percentile(50),
+            'p95_wall_s': self.percentile(95),
+            'max_wall_s': self.max_wall_s,
+            'rows': self.rows,
+            'rows_per_s': self.rows / self.total_wall_s if self.rows and self.total_wall_s else None,
+            'peak_rss_mb': self.peak_rss_mb,
+            'last_wall_s': self.last.wall_s if self.last else None,
+        }
+
+
+class Recorder:
+    """线程安全的 span/计数器记录器，模块级的 recorder 供全程序共用"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spans = {}
+        self._counters = {}
+        self._listeners = []
+        self._capture = set()
+        self._capture_lock = threading.Lock()
+        self.profile_dir = PROFILE_DIR
+
+    # --- 记录 ---
+    @contextmanager
+    def span(self, name, rows=None):
+        """
+        测量 with 块的墙钟时间、当前线程的CPU时间和结束时的内存，块内可设置 record.rows。
+
+        CPU时间只统计当前线程，不包括子进程（如并行分词的进程池）。
+        """
+        record = Span(name)
+        record.rows = rows
+        capture = self._take_capture(name)
+        if capture:
+            with self._captured(name):
+                yield from self._measure(record)
+        else:
+            yield from self._measure(record)
+
+    def _measure(self, record):
+        cpu_start = time.thread_time()
+        start = time.perf_counter()
+        try:
+            yield record
+        except BaseException:
+            record.error = True
+            raise
+        finally:
+            record.wall_s = time.perf_counter() - start
+            record.cpu_s = time.thread_time() - cpu_start
+            record.rss_mb = current_rss_mb()
+            record.peak_rss_mb = peak_rss_mb()
+            self._add(record)
+
+    def incr(self, name, value=1):
+        """计数器加 value"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def _add(self, record):
+        with self._lock:
+            stats = self._spans.get(record.name)
+            if stats is None:
+                stats = self._spans[record.name] = _SpanStats()
+            stats.add(record)
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(record)
+
+    def add_listener(self, listener):
+        """每个 span 结束时调用 listener(record)；注意它会在执行该 span 的线程中被调用"""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    # --- 剖析模式 ---
+    def capture_next(self, name):
+        """让下一次名为 name 的 span 在 cProfile 和 tracemalloc 下运行"""
+        with self._capture_lock:
+            self._capture.add(name)
+
+    def _take_capture(self, name):
+        with self._capture_lock:
+            if name in self._capture:
+                self._capture.discard(name)
+                return True
+            return False
+
+    @contextmanager
+    def _captured(self, name):
+        """cProfile 剖析 + tracemalloc 内存跟踪，结果写到 profile_dir/<name>.prof 和 <name>.txt"""
+        os.makedirs(self.profile_dir, exist_ok=True)
+        base = os.path.join(self.profile_dir, name)
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            snapshot = tracemalloc.take_snapshot()
+            _, traced_peak = tracemalloc.get_traced_memory()
+            if not was_tracing:
+                tracemalloc.stop()
+            profiler.dump_stats(base + '.prof')
+            with open(base + '.txt', 'w', encoding='utf-8') as f:
+                f.write(f"Python 对象内存峰值: {traced_peak / 1024 / 1024:.1f} MB\n\n")
+                f.write(f"内存占用最多的 {TOP_ALLOCATIONS} 个位置:\n")
+                for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+                    f.write(f"  {stat}\n")
+                f.write("\n累计耗时最多的函数:\n")
+                pstats.Stats(profiler, stream=f).sort_stats('cumulative').print_stats(30)
+            self.incr('profile.captures')
+            print(f"已保存 '{name}' 的剖析结果: {base}.prof, {base}.txt")
+
+    # --- 汇总 ---
+    def summary(self):
+        """返回 {'spans': {名称: 统计}, 'counters': {名称: 值}, 'rss_mb', 'peak_rss_mb'}"""
+        with self._lock:
+            spans = {name: stats.as_dict() for name, stats in sorted(self._spans.items())}
+            counters = dict(sorted(self._counters.items()))
+        return {'spans': spans, 'counters': counters, 'rss_mb': current_rss_mb(), 'peak_rss_mb': peak_rss_mb()}
+
+    def format_summary(self):
+        """把汇总格式化为便于在控制台阅读的表格"""
+        summary = self.summary()
+        lines = [f"{'阶段':<28}{'次数':>6}{'总耗时(s)':>11}{'平均(ms)':>10}{'p95(ms)':>10}{'CPU(s)':>9}{'行数':>10}"]
+        for name, stats in summary['spans'].items():
+            lines.append(f"{name:<30}{stats['count']:>6}{stats['total_wall_s']:>11.3f}"
+                         f"{stats['mean_wall_s'] * 1000:>10.2f}{stats['p95_wall_s'] * 1000:>10.2f}"
+                         f"{stats['total_cpu_s']:>9.3f}{stats['rows']:>10}")
+        for name, value in summary['counters'].items():
+            lines.append(f"{name:<30}{value:>6}")
+        if summary['peak_rss_mb'] is not None:
+            lines.append(f"峰值内存: {summary['peak_rss_mb']:.1f} MB")
+        return '\n'.join(lines)
+
+    def dump_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self._counters.clear()
+
+
+recorder = Recorder()
+
+# 模块级快捷函数
+span = recorder.span
+incr = recorder.incr
+capture_next = recorder.capture_next
+add_listener = recorder.add_listener
+remove_listener = recorder.remove_listener
+summary = recorder.summary
+format_summary = recorder.format_summary
+dump_json = recorder.dump_json
+reset = recorder.reset
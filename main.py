@@ -1,9 +1,11 @@
 #! /usr/bin/python
 # -*- coding: UTF-8 -*-
 # main.py
+import argparse
 import csv
 import os
 import db_function
+import instrumentation
 from csv_import import *
 import crawler
 from recommend import MovieRecommender
@@ -17,13 +19,39 @@ def clear_screen():
 
 def initialize_database():
     """删除旧数据库（如果存在）并创建新表"""
+    # 先关闭所有复用的数据库连接，再删除数据库文件及其WAL日志文件
+    db_function.close_all_connections()
     if os.path.exists(db_function.DATABASE):
         os.remove(db_function.DATABASE)
         print(f"旧数据库 '{db_function.DATABASE}' 已删除。")
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(db_function.DATABASE + suffix):
+            os.remove(db_function.DATABASE + suffix)
     db_function.create_movies_table()
     print("数据库和 'movies' 表已成功创建。")
 
 
+def choose_movie(candidates):
+    """匹配到多部电影时，让用户在命令行中选择一部，输入 'q' 取消时返回 None"""
+    print("找到多部匹配的电影，请选择一部：")
+    for i, candidate in enumerate(candidates):
+        print(f"  {i + 1}. {candidate['title']}")
+
+    while True:
+        try:
+            choice_str = input(f"请输入序号 [1-{len(candidates)}] (或输入 'q' 取消): ")
+            if choice_str.lower() == 'q':
+                return None
+
+            choice_idx = int(choice_str) - 1
+            if 0 <= choice_idx < len(candidates):
+                return candidates[choice_idx]
+            else:
+                print("无效的序号，请重新输入。")
+        except ValueError:
+            print("请输入一个有效的数字。")
+
+
 def run_recommender():
     """运行推荐系统交互"""
     print("--- 电影智能推荐系统 ---")
@@ -40,7 +68,7 @@ def run_recommender():
         if movie_title.lower() == 'q':
             break
 
-        recommendations = recommender_system.get_recommendations(movie_title, top_n=5)
+        recommendations = recommender_system.get_recommendations(movie_title, top_n=5, choose=choose_movie)
 
         if isinstance(recommendations, str):
             # 如果返回的是错误信息字符串
@@ -53,14 +81,17 @@ def run_recommender():
 def show_database_content():
     """
     分页显示数据库中的电影内容。
+
+    使用键集分页：下一页从当前页最后一行的 id 之后读取，上一页从第一行的 id 之前读取，
+    翻到多深都和第一页一样快；总数读取自数据库维护的计数，不会每次翻页都重新统计。
     """
     current_page = 1
     page_size = 15  # 每页显示15条
+    movies = db_function.get_movies_page(page_size)
 
     while True:
         clear_screen()
-        # 调用我们新创建的分页函数
-        movies, total_pages = db_function.get_movies_paginated(page=current_page, page_size=page_size)
+        total_pages = max(1, (db_function.count_movies() + page_size - 1) // page_size)
 
         if not movies:
             print("数据库为空，或已超出最大页数。")
@@ -73,15 +104,28 @@ def show_database_content():
             print("-" * 60)
             print(f"第 {current_page} / {total_pages} 页")
 
-        print("\n操作: [n] 下一页, [p] 上一页, [q] 退出")
+        print("\n操作: [n] 下一页, [p] 上一页, [f] 首页, [l] 末页, [q] 退出")
         action = input("请输入你的操作: ").lower()
 
         if action == 'n':
-            if current_page < total_pages:
-                current_page += 1
+            if movies and current_page < total_pages:
+                next_movies = db_function.get_movies_page(page_size, after=db_function.row_key(movies[-1]))
+                if next_movies:
+                    movies = next_movies
+                    current_page += 1
         elif action == 'p':
-            if current_page > 1:
+            if movies and current_page > 1:
+                movies = db_function.get_movies_page(page_size, before=db_function.row_key(movies[0]))
                 current_page -= 1
+        elif action == 'f':
+            movies = db_function.get_movies_page(page_size)
+            current_page = 1
+        elif action == 'l':
+            # 最后一页只有余下的几行，保证页码与每页的内容对齐
+            total_items = db_function.count_movies()
+            last_size = total_items - (total_pages - 1) * page_size
+            movies = db_function.get_movies_page(max(last_size, 1), last=True)
+            current_page = total_pages
         elif action == 'q':
             break
         else:
@@ -101,9 +145,10 @@ def main_menu():
         print("4. 启动电影推荐服务")
         print("5. 查看数据库内容")
         print("6.退出")
+        print("7. 查看性能统计")
         print("-" * 30)
 
-        choice = input("请输入你的选择 [1-6]: ")
+        choice = input("请输入你的选择 [1-7]: ")
 
         if choice == '1':
             initialize_database()
@@ -140,11 +185,24 @@ def main_menu():
         elif choice == '6':
             print("感谢使用，再见！")
             break
+        elif choice == '7':
+            print(instrumentation.format_summary())
+            input("\n按回车键返回主菜单...")
         else:
             input("无效的选择，请按回车键重试...")
 
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="智能电影推荐系统（命令行版）")
+    parser.add_argument('--stats-json', metavar='PATH', help="退出时把各阶段的耗时和内存统计写入该JSON文件")
+    parser.add_argument('--profile', metavar='SPAN', action='append', default=[],
+                        help="用 cProfile 和 tracemalloc 剖析该阶段的下一次运行，如 recommend.build（可重复指定）")
+    parser.add_argument('--profile-dir', default=instrumentation.PROFILE_DIR, help="剖析结果的保存目录")
+    return parser.parse_args(argv)
+
+
 if __name__ == '__main__':
+    args = parse_args()
     # 确保运行所需依赖已安装
     try:
         import pandas
@@ -154,4 +212,12 @@ if __name__ == '__main__':
         print("错误：必要的库 (pandas, jieba, scikit-learn) 未安装。")
         print("请运行: pip install pandas jieba scikit-learn")
     else:
-        main_menu()
\ No newline at end of file
+        instrumentation.recorder.profile_dir = args.profile_dir
+        for span_name in args.profile:
+            instrumentation.capture_next(span_name)
+        try:
+            main_menu()
+        finally:
+            if args.stats_json:
+                instrumentation.dump_json(args.stats_json)
+                print(f"性能统计已写入 '{args.stats_json}'。")
\ No newline at end of file
@@ -0,0 +1,174 @@
+# model_store.py
+# 推荐模型的持久化存储：把构建好的模型产物保存到磁盘，下次启动时直接内存映射加载。
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import scipy.sparse as sp
+
+# 存储格式版本号，格式发生不兼容变化时递增，旧的缓存会被自动忽略
+FORMAT_VERSION = 3
+
+# 默认的模型缓存目录
+DEFAULT_STORE_DIR = 'model_cache'
+
+MANIFEST_FILE = 'manifest.json'
+
+# 每种模型参数组合（精确近邻 / ANN / 潜在语义等共用同一个缓存目录）保留的版本数：
+# 刚写入的一个，加上可能仍被其它进程（如 service.py 的工作进程）内存映射的上一个
+KEEP_VERSIONS = 2
+
+
+def table_fingerprint(conn, extra=None):
+    """
+    计算 movies 表的指纹，用于判断磁盘上的模型是否仍然有效。
+
+    指纹由 movies_stats 中的数据修订号（由 db_function.create_movies_table 创建的触发器在每次
+    插入、修改、删除时递增）以及行数、最大id、各文本列总长度和评分总和组成，全部在SQLite内部完成，
+    不需要把数据读到Python中。只改动内容而长度不变的编辑也会改变修订号。
+    extra 用于把模型参数（如 top_k）也纳入指纹。
+
+    返回:
+    - str: 十六进制的 sha1 指纹。
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT COUNT(*), MAX(id), TOTAL(LENGTH(title)), TOTAL(LENGTH(category)),
+               TOTAL(LENGTH(comments)), TOTAL(rating), TOTAL(LENGTH(director)), TOTAL(LENGTH(leader)),
+               TOTAL(LENGTH(country)), TOTAL(LENGTH(years)), TOTAL(LENGTH(language))
+        FROM movies
+    ''')
+    stats = cursor.fetchone()
+    has_stats = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'movies_stats'").fetchone()
+    revision = cursor.execute(
+        "SELECT value FROM movies_stats WHERE name = 'revision'").fetchone() if has_stats else None
+    payload = json.dumps({'version': FORMAT_VERSION, 'table': list(stats),
+                          'revision': revision[0] if revision else None, 'extra': extra},
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def model_variant(extra):
+    """模型参数组合的标识（table_fingerprint 的 extra 部分），用于区分同一缓存目录中不同模式的模型"""
+    payload = json.dumps(extra, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def save_model(store_dir, fingerprint, vocabulary, idf, tfidf_matrix, arrays, variant=None, keep=()):
+    """
+    把模型产物写入 store_dir/<指纹>/ 目录。
+
+    先写入临时目录再整体改名，避免进程中途退出留下半成品；
+    成功后只清理同一参数组合（variant）的旧版本，其它模式的模型不受影响。
+
+    参数:
+    - store_dir (str): 模型缓存根目录。
+    - fingerprint (str): movies 表指纹。
+    - vocabulary: 可JSON序列化的词表（如 {字段: 按列号排列的词表}）。
+    - idf (ndarray): 按列号排列的 IDF 权重。
+    - tfidf_matrix (csr_matrix): 稀疏 TF-IDF 矩阵；潜在语义模式下不保留稀疏矩阵，传入 None。
+    - arrays (dict): 其它需要保存的数组（近邻表、id映射等），键为文件名。
+    - variant (str): 模型参数组合的标识，见 model_variant。
+    - keep (iterable): 不能删除的指纹，如调用方当前正在内存映射的模型。
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    final_dir = os.path.join(store_dir, fingerprint)
+    tmp_dir = final_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    all_arrays = dict(arrays)
+    all_arrays['idf'] = np.asarray(idf)
+    if tfidf_matrix is not None:
+        tfidf_matrix = sp.csr_matrix(tfidf_matrix)
+        all_arrays.update({
+            'tfidf_data': tfidf_matrix.data,
+            'tfidf_indices': tfidf_matrix.indices,
+            'tfidf_indptr': tfidf_matrix.indptr,
+        })
+    for name, array in all_arrays.items():
+        np.save(os.path.join(tmp_dir, f'{name}.npy'), np.ascontiguousarray(array))
+
+    with open(os.path.join(tmp_dir, 'vocabulary.json'), 'w', encoding='utf-8') as f:
+        json.dump(vocabulary, f, ensure_ascii=False)
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'fingerprint': fingerprint,
+        'variant': variant,
+        'tfidf_shape': None if tfidf_matrix is None else list(tfidf_matrix.shape),
+        'arrays': sorted(all_arrays),
+    }
+    # manifest 最后写入，它的存在代表目录内容完整
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    shutil.rmtree(final_dir, ignore_errors=True)
+    os.replace(tmp_dir, final_dir)
+
+    _prune(store_dir, variant, set(keep) | {fingerprint})
+
+
+def _read_manifest(model_dir):
+    try:
+        with open(os.path.join(model_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _prune(store_dir, variant, keep):
+    """
+    删除同一参数组合中较旧的版本以及格式版本过期的目录。
+    正在写入的临时目录和 keep 中的版本（含刚写入的）不删除；在Windows上仍被映射的文件可能删不掉，忽略即可。
+    """
+    versions = []
+    for name in os.listdir(store_dir):
+        model_dir = os.path.join(store_dir, name)
+        if name.endswith('.tmp') or name in keep or not os.path.isdir(model_dir):
+            continue
+        manifest = _read_manifest(model_dir)
+        if manifest is None:
+            continue
+        if manifest.get('format_version') != FORMAT_VERSION or 'variant' not in manifest:
+            shutil.rmtree(model_dir, ignore_errors=True)
+        elif manifest['variant'] == variant:
+            versions.append((os.path.getmtime(os.path.join(model_dir, MANIFEST_FILE)), name))
+    # 除刚写入的版本外，再保留最新的 KEEP_VERSIONS - 1 个
+    for _, name in sorted(versions, reverse=True)[KEEP_VERSIONS - 1:]:
+        shutil.rmtree(os.path.join(store_dir, name), ignore_errors=True)
+
+
+def load_model(store_dir, fingerprint):
+    """
+    以内存映射方式加载指纹匹配的模型产物。
+
+    返回:
+    - dict 或 None: 包含 'vocabulary'、'idf'、'tfidf_matrix'（未保存时为 None）以及保存时的其它数组；
+      缓存不存在、版本不符或文件损坏时返回 None。
+    """
+    model_dir = os.path.join(store_dir, fingerprint)
+    manifest = _read_manifest(model_dir)
+    if manifest is None:
+        return None
+    try:
+        if manifest.get('format_version') != FORMAT_VERSION or manifest.get('fingerprint') != fingerprint:
+            return None
+
+        arrays = {name: np.load(os.path.join(model_dir, f'{name}.npy'), mmap_mode='r')
+                  for name in manifest['arrays']}
+        with open(os.path.join(model_dir, 'vocabulary.json'), 'r', encoding='utf-8') as f:
+            vocabulary = json.load(f)
+    except (OSError, ValueError, KeyError):
+        return None
+
+    arrays['tfidf_matrix'] = None
+    if manifest['tfidf_shape'] is not None:
+        arrays['tfidf_matrix'] = sp.csr_matrix(
+            (arrays.pop('tfidf_data'), arrays.pop('tfidf_indices'), arrays.pop('tfidf_indptr')),
+            shape=tuple(manifest['tfidf_shape']), copy=False)
+    arrays['vocabulary'] = vocabulary
+    return arrays
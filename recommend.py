@@ -1,140 +1,975 @@
 # recommender.py
 
+import numpy as np
 import pandas as pd
-import jieba
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from db_function import get_db_connection, DATABASE
+import scipy.sparse as sp
+from ann_index import ClusterIndex, DEFAULT_PROBES
+from db_function import get_db_connection, read_snapshot, create_movies_table, DATABASE, MOVIE_COLUMNS
+from field_features import FieldFeatures, FIELD_COLUMNS, resolve_weights
+import instrumentation
+import latent_space
+import model_store
+import text_segment
+from result_cache import ResultCache, DEFAULT_CACHE_SIZE, DEFAULT_CACHE_TTL
+from title_index import TitleIndex
+
+# 每个分块的相似度分数最多占用的内存（字节），决定分块的行数
+MAX_BLOCK_BYTES = 64 * 1024 * 1024
+
+# 标题模糊匹配时最多列出的候选数
+MAX_TITLE_CANDIDATES = 20
+
+# 增量更新中，不在现有词表里的词占比超过该阈值时，安排一次完整重建
+REFIT_DRIFT_THRESHOLD = 0.1
+
+# 推荐模型的 DataFrame 只保留查询结果需要的列（以id为索引）；评论、导演等全文只在建模时从数据库逐列读出
+QUERY_COLUMNS = ('title', 'rating', 'category')
+
+# 口味画像中“不喜欢”的电影的权重：画像向量 = 喜欢的均值 - DISLIKE_WEIGHT × 不喜欢的均值
+DISLIKE_WEIGHT = 0.5
+
+# 近邻检索方式：'exact' 预先计算全部电影的精确近邻表（构建 N×N），
+# 'ann' 构建分簇近似索引、查询时再打分（构建约为 N×簇数），适合百万级电影
+INDEX_MODES = ('exact', 'ann')
+
+
+def _transpose(matrix):
+    """相似度计算用的转置：稀疏矩阵转成 CSR 以加速乘法，稠密矩阵直接转置（不复制）"""
+    return matrix.T.tocsr() if sp.issparse(matrix) else matrix.T
+
+
+def _scores(query_matrix, matrix_t):
+    """查询向量与全部电影的点积，返回稠密 float32 分数；稠密 float32 向量直接走 BLAS"""
+    scores = query_matrix @ matrix_t
+    if sp.issparse(scores):
+        scores = scores.toarray()
+    return np.asarray(scores, dtype=np.float32)
+
+
+def _row_sum(matrix, rows):
+    """matrix 中若干行之和（1 × 特征数）；稀疏矩阵的结果仍是稀疏的"""
+    if sp.issparse(matrix):
+        return sp.csr_matrix(np.ones((1, len(rows)), dtype=np.float32)) @ matrix[rows]
+    return np.asarray(matrix[rows], dtype=np.float32).sum(axis=0, keepdims=True)
+
+
+def _topk_similar(query_matrix, matrix, k, self_rows=None, max_block_bytes=MAX_BLOCK_BYTES, matrix_t=None):
+    """
+    分块计算 query_matrix 每一行在 matrix 中最相似的 k 行（余弦相似度）。
+
+    TfidfVectorizer 输出的行向量和潜在语义向量都已做 L2 归一化，所以点积就是余弦相似度。
+    每次只物化一个 (块行数 × N) 的稠密分数块，用 argpartition 做局部选择，
+    因此内存只随电影数量线性增长，且每个块的占用有上限。
+
+    参数:
+    - query_matrix: 查询向量（稀疏矩阵或稠密数组，每行一个查询）。
+    - matrix: 被检索的全部电影向量（与 query_matrix 同类）。
+    - k (int): 每个查询保留的近邻个数。
+    - self_rows (array-like): 每个查询自身在 matrix 中的行号，用于排除自身；None 表示不排除。
+    - max_block_bytes (int): 单个分数块允许占用的最大字节数。
+    - matrix_t: 预先计算好的 _transpose(matrix)，反复查询同一矩阵时可以省去每次转置。
+
+    返回:
+    - a tuple: (int32 行号数组, float32 分数数组)，形状均为 (查询数, k)，按相似度降序排列。
+    """
+    n_queries, n_total = query_matrix.shape[0], matrix.shape[0]
+    k = max(0, min(k, n_total - (1 if self_rows is not None else 0)))
+    neighbor_ids = np.empty((n_queries, k), dtype=np.int32)
+    neighbor_scores = np.empty((n_queries, k), dtype=np.float32)
+    if k == 0 or n_queries == 0:
+        return neighbor_ids, neighbor_scores
+
+    # 稀疏乘积转稠密时是 float64，按它估算每块能放多少行
+    block_rows = max(1, max_block_bytes // (n_total * 8))
+    if matrix_t is None:
+        matrix_t = _transpose(matrix)
+    if self_rows is not None:
+        self_rows = np.asarray(self_rows)
+
+    for start in range(0, n_queries, block_rows):
+        stop = min(start + block_rows, n_queries)
+        scores = _scores(query_matrix[start:stop], matrix_t)
+        if self_rows is not None:
+            scores[np.arange(stop - start), self_rows[start:stop]] = -np.inf
+
+        # 先局部选择出 top-k（无序），再只对这 k 个元素排序
+        if k < n_total:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(n_total), (stop - start, 1))
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        neighbor_ids[start:stop] = np.take_along_axis(top, order, axis=1)
+        neighbor_scores[start:stop] = np.take_along_axis(top_scores, order, axis=1)
+
+    return neighbor_ids, neighbor_scores
+
+
+def _lean_frame(df):
+    """只保留 QUERY_COLUMNS；类别只有几百种组合，存成分类类型后每行只占一个整数编码"""
+    df = df[list(QUERY_COLUMNS)]
+    return df.assign(category=df['category'].astype('category'))
+
+
+def _column_texts(conn, column):
+    """按id顺序逐行读出一列文本的生成器，缺失值为空字符串"""
+    return (value or '' for (value,) in conn.execute(f'SELECT {column} FROM movies ORDER BY id'))
 
 
 class MovieRecommender:
     # ... __init__, _load_data_from_db, _chinese_word_cut, _build_model, load_and_build 方法保持不变 ...
-    def __init__(self):
+    def __init__(self, top_k=50, max_block_bytes=MAX_BLOCK_BYTES, store_dir=model_store.DEFAULT_STORE_DIR,
+                 workers=None, index_mode='exact', ann_clusters=None, ann_probes=DEFAULT_PROBES, latent_dims=None,
+                 field_weights=None, cache_size=DEFAULT_CACHE_SIZE, cache_ttl=DEFAULT_CACHE_TTL):
         """
         初始化推荐系统，加载数据并构建模型。
+
+        参数:
+        - top_k (int): 每部电影保存的近邻个数。不再保存 N×N 的稠密相似度矩阵，
+          而是只保存每部电影最相似的 top_k 部电影（int32 编号 + float32 分数）。
+        - max_block_bytes (int): 分块计算相似度时单个块的内存上限。
+        - store_dir (str): 模型缓存目录。数据库未变化时直接从这里内存映射加载模型，
+          传入 None 则每次都重新构建。
+        - workers (int): 并行分词的进程数，None 表示 CPU核数-1。
+        - index_mode (str): 'exact' 或 'ann'，见 INDEX_MODES。
+        - ann_clusters (int): 'ann' 模式的簇数，None 表示按电影数自动选择（约 √N）。
+        - ann_probes (int): 'ann' 模式查询时探查的簇数，越大召回率越高、查询越慢；
+          可以用 `python ann_index.py` 比较不同参数下相对精确结果的 recall@K。
+        - latent_dims (int): 潜在语义模式的维数（建议 64~256）。设置后用截断SVD把 TF-IDF
+          压缩成稠密 float32 向量，相似度在这些向量上计算，不再保留稀疏 TF-IDF 矩阵；
+          None 表示直接使用 TF-IDF。可以用 `python latent_space.py` 比较不同维数的推荐质量。
+        - field_weights (dict): 各字段（见 field_features.FIELD_COLUMNS）的默认权重，只需提供与
+          DEFAULT_WEIGHTS 不同的部分。近邻表按它预先计算；查询时也可以临时传入其它权重。
+        - cache_size (int): 推荐结果缓存的容量，0 表示不缓存。
+        - cache_ttl (float): 缓存结果的存活时间（秒），None 表示不过期。
         """
+        if index_mode not in INDEX_MODES:
+            raise ValueError(f"index_mode 必须是 {INDEX_MODES} 之一")
+        self.field_weights = resolve_weights(field_weights)
         self.db_path = DATABASE
+        self.top_k = top_k
+        self.max_block_bytes = max_block_bytes
+        self.store_dir = store_dir
+        self.workers = workers
+        self.fingerprint = None
+        # 当前内存映射的模型缓存版本，保存新版本时不能删除它
+        self.mapped_fingerprint = None
         self.df = None
-        self.cosine_sim = None
+        # 各字段的向量化器；tfidf_matrix 是各字段 TF-IDF 块横向拼接的电影向量（不含权重）
+        self.features = None
+        self.tfidf_matrix = None
+        # 查询时临时调整权重需要在全部电影上打分，缓存电影向量的转置，避免每次查询都转置一次
+        self._vectors_t = None
+        # 潜在语义模式：投影矩阵 (维数, 词表大小) 和电影向量 (N, 维数)，均为 float32
+        self.latent_dims = latent_dims
+        self.latent_components = None
+        self.embedding = None
+        # 近邻表：第 i 行是第 i 部电影最相似的 top_k 部电影的矩阵行号及相似度
+        self.neighbor_ids = None
+        self.neighbor_scores = None
+        # 'ann' 模式下代替近邻表的近似索引
+        self.index_mode = index_mode
+        self.ann_clusters = ann_clusters
+        self.ann_probes = ann_probes
+        self.ann_index = None
+        # 增量更新累计的词表外词数 / 总词数，用于判断词表漂移；
+        # 词表有 max_features 上限，训练语料本身也有词表外的词，漂移率是相对它的增量
+        self.drift_oov_tokens = 0
+        self.drift_total_tokens = 0
+        self.baseline_oov_ratio = 0.0
+        self.refit_pending = False
+        self._title_index = None
+        # 模型版本号：每次重建或增量更新后递增，推荐结果缓存随之失效
+        self.model_version = 0
+        self.result_cache = ResultCache(cache_size, cache_ttl)
         self.load_and_build()
 
     def _load_data_from_db(self):
         """
         从你定义的SQLite数据库加载数据到Pandas DataFrame。
         这里我们复用你的 get_db_connection 上下文管理器。
+        只读取 QUERY_COLUMNS，评论等全文在建模时由 _build_model 逐列读取，不保存在 DataFrame 中。
         """
         print("正在从数据库加载数据...")
         try:
-            with get_db_connection() as conn:
+            with instrumentation.span('recommend.load_db') as record, get_db_connection() as conn:
                 # 使用pandas的read_sql_query可以方便地将查询结果转为DataFrame
-                df = pd.read_sql_query("SELECT * FROM movies", conn)
+                df = pd.read_sql_query(f"SELECT id, {', '.join(QUERY_COLUMNS)} FROM movies ORDER BY id", conn)
+                record.rows = len(df)
 
             if df.empty:
                 print("警告：数据库中没有数据，推荐功能将不可用。")
                 return pd.DataFrame()
 
             # 将id设为索引，方便后续查找
-            df = df.set_index('id')
+            df = _lean_frame(df.set_index('id'))
             print(f"数据加载成功！共 {len(df)} 条电影。")
             return df
         except Exception as e:
             print(f"从数据库加载数据失败: {e}")
             return pd.DataFrame()
 
-    def _chinese_word_cut(self, text):
-        """中文分词函数"""
-        return " ".join(jieba.cut(text))
+    def _chinese_word_cut(self, texts):
+        """中文分词函数：多进程并行分词，已分过词的文本直接从分词缓存读取"""
+        return text_segment.cut_texts(texts, workers=self.workers)
 
     def _build_model(self):
-        """构建推荐模型的核心步骤"""
+        """
+        构建推荐模型的核心步骤。需要在读取 self.df 的同一个读事务（read_snapshot）中调用，
+        这样逐列读出的文本与 self.df 的行一一对应。
+        """
         if self.df is None or self.df.empty:
             return
 
         print("开始构建推荐模型...")
-        # 1. 特征工程：合并类别和评论作为电影的“内容”
-        # 给予类别更高的权重（重复3次），使其在相似度计算中更重要
-        self.df['content'] = self.df['category'].str.replace('/', ' ') * 3 + ' ' + self.df['comments']
+        rows = len(self.df)
+        with get_db_connection() as conn:
+            # 1. 中文分词：只有剧情/评论需要分词，其它字段是类型、人名等，按分隔符拆分即可
+            with instrumentation.span('recommend.segment', rows=rows):
+                plot_cut = self._chinese_word_cut(_column_texts(conn, 'comments'))
 
-        # 2. 中文分词
-        self.df['content_cut'] = self.df['content'].apply(self._chinese_word_cut)
+            # 2. 各字段分别做 TF-IDF 向量化，得到各自归一化的稀疏块；
+            #    其它字段的文本从数据库逐行直接交给向量化器，用完即丢，不经过 DataFrame
+            docs = {field: _column_texts(conn, column) for field, column in FIELD_COLUMNS.items() if field != 'plot'}
+            docs['plot'] = plot_cut
+            with instrumentation.span('recommend.tfidf', rows=rows):
+                self.features, self.tfidf_matrix = FieldFeatures.fit(docs, n_docs=rows)
+        sizes = '，'.join(f"{field} {size}" for field, size in self.features.sizes.items())
+        print(f"TF-IDF矩阵构建完成，形状: {self.tfidf_matrix.shape}（{sizes}）")
 
-        # 3. TF-IDF向量化
-        tfidf_vectorizer = TfidfVectorizer(max_features=5000)
-        tfidf_matrix = tfidf_vectorizer.fit_transform(self.df['content_cut'])
-        print(f"TF-IDF矩阵构建完成，形状: {tfidf_matrix.shape}")
+        if self.latent_dims:
+            with instrumentation.span('recommend.latent', rows=rows):
+                self.latent_components, self.embedding = latent_space.fit_latent(
+                    self._latent_input(self.tfidf_matrix), self.latent_dims)
+            # 之后的相似度只用潜在向量计算，稀疏矩阵不再保留
+            self.tfidf_matrix = None
+            print(f"潜在语义向量构建完成，形状: {self.embedding.shape}")
 
-        # 4. 计算余弦相似度矩阵
-        self.cosine_sim = cosine_similarity(tfidf_matrix, tfidf_matrix)
-        print("余弦相似度矩阵计算完成。")
+        # 3. 分块计算每部电影按默认权重的 top-K 近邻（'ann' 模式只构建近似索引）
+        self.drift_oov_tokens = self.drift_total_tokens = 0
+        self.baseline_oov_ratio = self._oov_ratio(plot_cut)
+        self.refit_pending = False
+        if self.index_mode == 'ann':
+            with instrumentation.span('recommend.ann_build', rows=rows):
+                self.ann_index = ClusterIndex.build(self.vectors, self.ann_clusters, self.ann_probes)
+            self.neighbor_ids = self.neighbor_scores = None
+            print(f"近似索引构建完成，共 {self.ann_index.n_clusters} 个簇，查询时探查 {self.ann_probes} 个。")
+            print("模型构建完毕！\n")
+            return
+        with instrumentation.span('recommend.neighbors', rows=rows):
+            self.neighbor_ids, self.neighbor_scores = _topk_similar(
+                self._query_vectors(self.vectors), self.vectors, self.top_k,
+                self_rows=np.arange(self.vectors.shape[0]),
+                max_block_bytes=self.max_block_bytes)
+        print(f"近邻表计算完成，每部电影保留 {self.neighbor_ids.shape[1]} 个近邻。")
         print("模型构建完毕！\n")
 
+    @staticmethod
+    def _field_docs(df, plot_cut):
+        """各字段用于向量化的文本；plot_cut 为已分词的剧情/评论"""
+        docs = {field: df[column].fillna('').astype(str).tolist() if column in df.columns else [''] * len(df)
+                for field, column in FIELD_COLUMNS.items()}
+        docs['plot'] = plot_cut
+        return docs
+
+    def _query_vectors(self, vectors, weights=None):
+        """
+        按字段权重缩放查询向量（电影向量本身不带权重），缩放后与电影向量的点积即加权相似度。
+        潜在语义模式的向量在训练时已经包含了默认权重，不再缩放。
+        """
+        if self.latent_dims:
+            return vectors
+        return vectors @ sp.diags(self.features.column_weights(weights or self.field_weights))
+
+    def _latent_input(self, tfidf_matrix):
+        """潜在语义模式下 SVD 的输入：每个字段块乘以 √权重，使降维后的点积近似按默认权重加权的相似度"""
+        return tfidf_matrix @ sp.diags(np.sqrt(self.features.column_weights(self.field_weights)))
+
+    @property
+    def vectors(self):
+        """计算相似度用的电影向量：潜在语义模式下是稠密的潜在向量，否则是稀疏 TF-IDF 矩阵"""
+        return self.embedding if self.latent_dims else self.tfidf_matrix
+
+    @property
+    def ready(self):
+        """模型是否已构建，可以提供推荐"""
+        if self.df is None or self.df.empty:
+            return False
+        return (self.ann_index if self.index_mode == 'ann' else self.neighbor_ids) is not None
+
+    def _model_options(self):
+        """影响模型产物的参数（探查簇数只影响查询，不纳入）"""
+        extra = {'top_k': self.top_k, 'field_weights': self.field_weights}
+        if self.index_mode == 'ann':
+            extra.update(index_mode='ann', ann_clusters=self.ann_clusters)
+        if self.latent_dims:
+            extra['latent_dims'] = self.latent_dims
+        return extra
+
+    def _model_fingerprint(self):
+        """计算当前数据库和模型参数对应的指纹"""
+        with get_db_connection() as conn:
+            return model_store.table_fingerprint(conn, extra=self._model_options())
+
+    def _load_from_store(self):
+        """
+        尝试从模型缓存中加载模型。数据库自上次构建以来没有变化时，
+        只需读取 id/标题/评分/类别 并内存映射模型文件，无需分词和重新训练。
+
+        返回:
+        - bool: 是否加载成功。
+        """
+        with instrumentation.span('recommend.store_load'):
+            stored = model_store.load_model(self.store_dir, self.fingerprint)
+        if stored is None:
+            return False
+
+        df = self._load_data_from_db()
+        # id映射必须和数据库完全一致，否则说明缓存已过期
+        if df.empty or not np.array_equal(df.index.to_numpy(), stored['movie_ids']):
+            return False
+
+        self.df = df
+        self.features = FieldFeatures.from_store(stored['vocabulary'], stored['idf'])
+        if self.index_mode == 'ann':
+            self.ann_index = ClusterIndex.from_arrays(stored, self.ann_probes)
+            if self.ann_index is None:
+                return False
+        else:
+            self.neighbor_ids = stored['neighbor_ids']
+            self.neighbor_scores = stored['neighbor_scores']
+        if self.latent_dims:
+            self.latent_components = stored['latent_components']
+            self.embedding = stored['latent_embedding']
+        self.tfidf_matrix = stored['tfidf_matrix']
+        self.drift_oov_tokens, self.drift_total_tokens = (int(x) for x in stored['drift_stats'][:2])
+        self.baseline_oov_ratio = float(stored['drift_stats'][2])
+        self.refit_pending = False
+        self.mapped_fingerprint = self.fingerprint
+        print(f"已从模型缓存加载推荐模型，共 {len(df)} 部电影。\n")
+        return True
+
+    def _save_to_store(self):
+        """把当前模型写入模型缓存，失败时不影响推荐功能"""
+        if not self.ready:
+            return
+        if self.index_mode == 'ann':
+            arrays = self.ann_index.to_arrays()
+        else:
+            arrays = {'neighbor_ids': self.neighbor_ids, 'neighbor_scores': self.neighbor_scores}
+        if self.latent_dims:
+            arrays.update(latent_components=self.latent_components, latent_embedding=self.embedding)
+        try:
+            vocabulary, idf = self.features.to_store()
+            with instrumentation.span('recommend.store_save', rows=len(self.df)):
+                model_store.save_model(
+                    self.store_dir, self.fingerprint, vocabulary, idf, self.tfidf_matrix,
+                    {'movie_ids': self.df.index.to_numpy(dtype=np.int64),
+                     'drift_stats': np.array([self.drift_oov_tokens, self.drift_total_tokens,
+                                              self.baseline_oov_ratio], dtype=np.float64),
+                     **arrays},
+                    variant=model_store.model_variant(self._model_options()), keep=[self.mapped_fingerprint])
+            print(f"推荐模型已保存到缓存目录 '{self.store_dir}'。")
+        except OSError as e:
+            print(f"保存模型缓存失败: {e}")
+
     def load_and_build(self):
-        """封装加载和构建的完整流程"""
-        self.df = self._load_data_from_db()
-        self._build_model()
+        """封装加载和构建的完整流程：优先从缓存加载，缓存无效时重新构建并保存"""
+        self._title_index = None
+        self._vectors_t = None
+        self.model_version += 1
+        with instrumentation.span('recommend.load_and_build') as record:
+            # 旧版本的数据库先补上描述字段，指纹和特征都要用到它们
+            create_movies_table()
+            rss_before = instrumentation.current_rss_mb()
+            if self.store_dir:
+                self.fingerprint = self._model_fingerprint()
+                if self._load_from_store():
+                    record.rows = len(self.df)
+                    instrumentation.incr('recommend.store_hits')
+                    self._report_memory(rss_before)
+                    return
+
+            with read_snapshot():
+                self.df = self._load_data_from_db()
+                with instrumentation.span('recommend.build', rows=len(self.df)):
+                    self._build_model()
+            if self.store_dir:
+                self._save_to_store()
+            record.rows = len(self.df)
+            self._report_memory(rss_before)
+
+    def memory_usage(self):
+        """
+        推荐模型各部分占用的内存（MB）。内存映射的数组按文件大小计算，其中只有被访问过的页面才计入常驻内存。
+
+        返回:
+        - dict: {'dataframe', 'vectors', 'neighbors', 'rss'}，'rss' 为进程常驻内存，平台不支持时为 None。
+        """
+        def nbytes(array):
+            if array is None:
+                return 0
+            if sp.issparse(array):
+                return array.data.nbytes + array.indices.nbytes + array.indptr.nbytes
+            return array.nbytes
+
+        neighbors = (self.ann_index.to_arrays().values() if self.index_mode == 'ann' and self.ann_index is not None
+                     else [self.neighbor_ids, self.neighbor_scores])
+        return {
+            'dataframe': 0.0 if self.df is None else self.df.memory_usage(deep=True).sum() / 1024 / 1024,
+            'vectors': (nbytes(self.tfidf_matrix) + nbytes(self.embedding) + nbytes(self.latent_components)) / 1024 / 1024,
+            'neighbors': sum(nbytes(a) for a in neighbors) / 1024 / 1024,
+            'rss': instrumentation.current_rss_mb(),
+        }
+
+    def _report_memory(self, rss_before):
+        usage = self.memory_usage()
+        message = (f"内存占用：DataFrame {usage['dataframe']:.1f} MB，电影向量 {usage['vectors']:.1f} MB，"
+                   f"近邻表/索引 {usage['neighbors']:.1f} MB")
+        if rss_before is not None and usage['rss'] is not None:
+            message += f"；进程常驻内存 {rss_before:.0f} MB -> {usage['rss']:.0f} MB"
+        print(message)
+
+    def update_movies(self, movie_ids=None, drift_threshold=REFIT_DRIFT_THRESHOLD, persist=True):
+        """
+        增量更新模型，用于爬虫或CSV导入新增数据之后，无需重新训练整个模型。
+
+        只对新增或修改的电影做分词，并用现有词表和IDF权重向量化；然后重新计算
+        这些电影自己的近邻表，并把它们插入到其它受影响电影的近邻表中。
+        分词和向量化的开销只与更新的电影数量成正比，近邻计算是 (更新数 × N)，
+        而完整重建是 (N × N)。'ann' 模式只需把这些电影分配到最近的簇。
+
+        新文本中不在词表里的词累计占比超过 drift_threshold 时，设置 refit_pending，
+        由调用方在空闲时调用 refit_if_pending() 做一次完整重建。
+
+        参数:
+        - movie_ids (list): 新增或修改过的电影id；None 表示自动找出数据库中比模型更新的电影。
+        - drift_threshold (float): 触发完整重建的词表漂移阈值。
+        - persist (bool): 更新后是否把模型写回缓存目录。
+
+        返回:
+        - dict: {'added': 新增数, 'updated': 修改数, 'drift': 当前漂移率, 'refit_pending': 是否需要重建}
+        """
+        with instrumentation.span('recommend.update') as record:
+            result = self._update_movies(movie_ids, drift_threshold, persist)
+            record.rows = result['added'] + result['updated']
+        return result
+
+    def _update_movies(self, movie_ids, drift_threshold, persist):
+        if not self.ready:
+            # 还没有模型，增量更新无从谈起，直接完整构建
+            self.load_and_build()
+            return {'added': 0 if self.df is None else len(self.df), 'updated': 0,
+                    'drift': 0.0, 'refit_pending': False}
+
+        with get_db_connection() as conn:
+            if movie_ids is None:
+                movie_ids = [row[0] for row in conn.execute(
+                    'SELECT id FROM movies WHERE id > ? ORDER BY id', (int(self.df.index.max()),))]
+            movie_ids = list(dict.fromkeys(int(i) for i in movie_ids))
+            # 分批组装 IN 查询，避免超过SQLite的参数个数上限
+            frames = []
+            for start in range(0, len(movie_ids), 500):
+                batch = movie_ids[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                frames.append(pd.read_sql_query(
+                    f'SELECT id, {", ".join(MOVIE_COLUMNS)} FROM movies WHERE id IN ({placeholders})',
+                    conn, params=batch))
+
+        rows = pd.concat(frames).set_index('id').sort_index() if frames else pd.DataFrame()
+        if len(rows) < len(movie_ids):
+            # 有电影已被删除，增量更新无法处理删除，安排完整重建
+            self.refit_pending = True
+        if rows.empty:
+            return {'added': 0, 'updated': 0, 'drift': self._drift_ratio(), 'refit_pending': self.refit_pending}
+
+        print(f"正在增量更新推荐模型，共 {len(rows)} 部电影...")
+        # 1. 只对这些电影分词，并按现有词表向量化
+        plot_cut = self._chinese_word_cut(rows['comments'])
+        oov_tokens, total_tokens = self._count_oov_tokens(plot_cut)
+        self.drift_oov_tokens += oov_tokens
+        self.drift_total_tokens += total_tokens
+        vectors = self.features.transform(self._field_docs(rows, plot_cut))
+        if self.latent_dims:
+            vectors = latent_space.project(self._latent_input(vectors), self.latent_components)
+
+        # 2. 更新 DataFrame 和 TF-IDF 矩阵：已有的电影替换对应行，新电影追加到末尾
+        is_existing = rows.index.isin(self.df.index)
+        existing_ids = rows.index[is_existing]
+        changed_rows = self.df.index.get_indexer(existing_ids)
+        n_old = len(self.df)
+
+        # 分类列先转回普通字符串，新类别合并进来后再重新编码
+        df = self.df.astype({'category': object})
+        columns = list(QUERY_COLUMNS)
+        df.loc[existing_ids, columns] = rows.loc[existing_ids, columns]
+        df = _lean_frame(pd.concat([df, rows.loc[~is_existing, columns]]))
+
+        if self.latent_dims:
+            matrix = np.concatenate([self.embedding, vectors[~is_existing]])
+            matrix[changed_rows] = vectors[is_existing]
+        else:
+            matrix = sp.vstack([self.tfidf_matrix, vectors[~is_existing]], format='csr')
+            if len(changed_rows):
+                # 把修改过的行指向新向量：先把新向量追加到末尾，再按行号重排一次
+                order = np.arange(matrix.shape[0])
+                order[changed_rows] = matrix.shape[0] + np.arange(len(changed_rows))
+                matrix = sp.vstack([matrix, vectors[is_existing]], format='csr')[order]
+
+        query_rows = np.concatenate([changed_rows, n_old + np.arange((~is_existing).sum())]).astype(np.int64)
+        if self.index_mode == 'ann':
+            ann = self.ann_index.updated(matrix, query_rows)
+        else:
+            neighbor_ids, neighbor_scores = self._refresh_neighbors(matrix, query_rows, changed_rows)
+
+        # 3. 一次性替换模型的各个部分
+        if len(changed_rows):
+            # 标题可能被修改，下次查找时重建标题索引
+            self._title_index = None
+        elif self._title_index is not None:
+            new_rows = df.iloc[n_old:]
+            self._title_index.add(new_rows.index, new_rows['title'], new_rows['rating'])
+        self.df = df
+        self._vectors_t = None
+        self.model_version += 1
+        if self.latent_dims:
+            self.embedding = matrix
+        else:
+            self.tfidf_matrix = matrix
+        if self.index_mode == 'ann':
+            self.ann_index = ann
+        else:
+            self.neighbor_ids, self.neighbor_scores = neighbor_ids, neighbor_scores
+
+        drift = self._drift_ratio()
+        if drift > drift_threshold:
+            self.refit_pending = True
+        print(f"增量更新完成：新增 {len(query_rows) - len(changed_rows)} 部，修改 {len(changed_rows)} 部，"
+              f"词表漂移率 {drift:.1%}。")
+        if self.refit_pending:
+            print("词表漂移超过阈值（或有电影被删除），建议完整重建模型。")
+
+        if persist and self.store_dir:
+            self.fingerprint = self._model_fingerprint()
+            self._save_to_store()
+
+        return {'added': len(query_rows) - len(changed_rows), 'updated': len(changed_rows),
+                'drift': drift, 'refit_pending': self.refit_pending}
+
+    def _count_oov_tokens(self, docs):
+        """统计分词后的剧情/评论中不在词表里的词数和总词数"""
+        vectorizer = self.features.plot_vectorizer
+        analyzer = vectorizer.build_analyzer() if vectorizer is not None else str.split
+        vocabulary = vectorizer.vocabulary_ if vectorizer is not None else {}
+        oov_tokens = total_tokens = 0
+        for doc in docs:
+            tokens = analyzer(doc)
+            total_tokens += len(tokens)
+            oov_tokens += sum(1 for token in tokens if token not in vocabulary)
+        return oov_tokens, total_tokens
+
+    def _oov_ratio(self, docs):
+        """文本中不在词表里的词所占比例"""
+        oov_tokens, total_tokens = self._count_oov_tokens(docs)
+        return oov_tokens / total_tokens if total_tokens else 0.0
+
+    def _drift_ratio(self):
+        """增量更新以来，新文本的词表外词比例比训练语料高出多少"""
+        if not self.drift_total_tokens:
+            return 0.0
+        return max(0.0, self.drift_oov_tokens / self.drift_total_tokens - self.baseline_oov_ratio)
 
-    # ---  ↓↓↓  修改这个方法  ↓↓↓  ---
-    def get_recommendations(self, partial_title, top_n=5):
+    def _refresh_neighbors(self, matrix, query_rows, changed_rows):
+        """
+        在更新后的矩阵上刷新近邻表。
+
+        - query_rows（新增和修改的电影）重新计算自己的近邻；
+        - 近邻表中含有被修改电影的行，其旧分数已失效，也完整重新计算；
+        - 其余电影只需把 query_rows 中分数更高的电影合并进自己的 top-K。
+
+        返回:
+        - a tuple: (新的近邻编号数组, 新的近邻分数数组)
+        """
+        n_total = matrix.shape[0]
+        k = self.neighbor_ids.shape[1]
+        if k < min(self.top_k, n_total - 1):
+            # 原来的电影太少、近邻表不满，直接整体重算
+            return _topk_similar(self._query_vectors(matrix), matrix, self.top_k, self_rows=np.arange(n_total),
+                                 max_block_bytes=self.max_block_bytes)
+
+        n_old = self.neighbor_ids.shape[0]
+        # 复制一份，内存映射加载的数组是只读的
+        neighbor_ids = np.empty((n_total, k), dtype=np.int32)
+        neighbor_scores = np.empty((n_total, k), dtype=np.float32)
+        neighbor_ids[:n_old] = self.neighbor_ids
+        neighbor_scores[:n_old] = self.neighbor_scores
+
+        stale_rows = np.empty(0, dtype=np.int64)
+        if len(changed_rows):
+            stale_mask = np.isin(neighbor_ids[:n_old], changed_rows).any(axis=1)
+            stale_mask[changed_rows] = False
+            stale_rows = np.flatnonzero(stale_mask)
+        recompute_rows = np.concatenate([query_rows, stale_rows])
+        neighbor_ids[recompute_rows], neighbor_scores[recompute_rows] = _topk_similar(
+            self._query_vectors(matrix[recompute_rows]), matrix, k, self_rows=recompute_rows,
+            max_block_bytes=self.max_block_bytes)
+
+        # 其余电影：若某个更新的电影比自己近邻表中最不相似的那个更相似，就合并进去
+        others = np.ones(n_total, dtype=bool)
+        others[recompute_rows] = False
+        block_rows = max(1, self.max_block_bytes // (n_total * 8))
+        matrix_t = _transpose(matrix)
+        for start in range(0, len(query_rows), block_rows):
+            block = query_rows[start:start + block_rows]
+            # 权重矩阵是对角的，加权相似度对称，新电影作为查询得到的分数也就是其余电影对它的分数
+            scores = _scores(self._query_vectors(matrix[block]), matrix_t).T  # (N, 块大小)
+            scores[~others] = -np.inf
+            targets = np.flatnonzero((scores > neighbor_scores[:, -1:]).any(axis=1))
+            if len(targets) == 0:
+                continue
+            cand_ids = np.concatenate([neighbor_ids[targets], np.tile(block, (len(targets), 1))], axis=1)
+            cand_scores = np.concatenate([neighbor_scores[targets], scores[targets]], axis=1)
+            order = np.argsort(-cand_scores, axis=1, kind='stable')[:, :k]
+            neighbor_ids[targets] = np.take_along_axis(cand_ids, order, axis=1)
+            neighbor_scores[targets] = np.take_along_axis(cand_scores, order, axis=1)
+
+        return neighbor_ids, neighbor_scores
+
+    def refit_if_pending(self):
+        """如果增量更新安排了完整重建，则执行一次完整重建"""
+        if not self.refit_pending:
+            return False
+        print("词表漂移超过阈值，开始完整重建推荐模型...")
+        self.load_and_build()
+        return True
+
+    @property
+    def title_index(self):
+        """标题索引，首次使用时构建，模型重建后自动失效"""
+        if self._title_index is None and self.df is not None and not self.df.empty:
+            self._title_index = TitleIndex(self.df.index, self.df['title'], self.df['rating'])
+        return self._title_index
+
+    def resolve_title(self, partial_title, limit=10):
+        """
+        根据用户输入的（部分）标题查找候选电影，不做任何交互。
+
+        返回:
+        - list: 按匹配程度排序的候选电影，每项为 {'id', 'title', 'rating'} 字典；
+          模型未初始化时返回空列表。
+        """
+        if self.title_index is None:
+            return []
+        with instrumentation.span('recommend.search'):
+            return self.title_index.search(partial_title, limit=limit)
+
+    def _neighbors(self, rows, top_n, weights=None):
+        """
+        取出若干矩阵行的 top_n 近邻（不含自身）。
+
+        按默认权重且 top_n 不超过近邻表保存的个数时直接切片近邻表；否则把查询向量按权重缩放后
+        对这些行一次性做矩阵乘法，再用 argpartition 做局部选择。'ann' 模式只对近似索引给出的候选打分。
+
+        参数:
+        - weights (dict): 临时使用的字段权重，只需提供与默认权重不同的部分；None 表示使用默认权重。
+
+        返回:
+        - a tuple: (矩阵行号数组, 相似度数组)，形状均为 (len(rows), top_n)；
+          'ann' 模式下候选不足时行号以 -1 补齐。
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        weights = self._custom_weights(weights)
+        if self.index_mode != 'ann' and weights is None and top_n <= self.neighbor_ids.shape[1]:
+            return self.neighbor_ids[rows, :top_n], self.neighbor_scores[rows, :top_n]
+
+        query = self._query_vectors(self.vectors[rows], weights)
+        if self.index_mode == 'ann':
+            return self.ann_index.query(query, self.vectors, top_n, self_rows=rows)
+        return _topk_similar(query, self.vectors, top_n, self_rows=rows, max_block_bytes=self.max_block_bytes,
+                             matrix_t=self._transposed_vectors())
+
+    def _custom_weights(self, weights):
+        """校验临时字段权重；与默认权重相同（或未提供）时返回 None"""
+        if weights is None:
+            return None
+        weights = resolve_weights(dict(self.field_weights, **weights))
+        if weights == self.field_weights:
+            return None
+        if self.latent_dims:
+            raise ValueError("潜在语义模式的向量已按默认权重降维，不支持查询时调整字段权重")
+        return weights
+
+    def _weights_key(self, weights):
+        """临时字段权重在缓存键中的形式；与默认权重相同时为 None"""
+        weights = self._custom_weights(weights)
+        return None if weights is None else tuple(sorted(weights.items()))
+
+    def cached_result(self, key, compute, weights=None):
+        """
+        按 (key, 字段权重) 从推荐结果缓存中取结果，未命中时调用 compute() 计算并缓存。
+        缓存与 model_version 绑定，模型重建或增量更新后自动失效；返回的结果是共享的，不应修改。
+
+        异常:
+        - ValueError: weights 无效。
+        """
+        key = key + (self._weights_key(weights),)
+        return self.result_cache.get_or_compute(key, self.model_version, compute)
+
+    def _transposed_vectors(self):
+        if self._vectors_t is None:
+            self._vectors_t = _transpose(self.vectors)
+        return self._vectors_t
+
+    def _profile_neighbors(self, liked_sum, n_liked, disliked_sum, n_disliked, exclude_rows, top_n,
+                           weights=None, dislike_weight=DISLIKE_WEIGHT):
+        """
+        按口味画像取 top_n 部电影。画像向量为
+            喜欢的电影向量的均值 - dislike_weight × 不喜欢的电影向量的均值
+        归一化后按字段权重缩放，与全部电影做一次矩阵乘法，exclude_rows（种子电影）不会出现在结果中。
+
+        返回:
+        - a tuple: (矩阵行号数组, 相似度数组)，按相似度降序；画像为空时均为空数组。
+        """
+        profile = liked_sum / max(n_liked, 1)
+        if n_disliked:
+            profile = profile - disliked_sum * (dislike_weight / n_disliked)
+        norm = np.sqrt(profile.multiply(profile).sum()) if sp.issparse(profile) else np.linalg.norm(profile)
+        if not n_liked and not n_disliked or norm == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = self._query_vectors(profile / norm, self._custom_weights(weights))
+        exclude_rows = np.asarray(exclude_rows, dtype=np.int64)
+
+        if self.index_mode == 'ann':
+            ids, scores = self.ann_index.query(query, self.vectors, top_n + len(exclude_rows))
+            keep = (ids[0] >= 0) & ~np.isin(ids[0], exclude_rows)
+            return ids[0][keep][:top_n], scores[0][keep][:top_n]
+
+        scores = _scores(query, self._transposed_vectors()).ravel()
+        scores[exclude_rows] = -np.inf
+        top_n = min(top_n, len(scores) - len(set(exclude_rows.tolist())))
+        if top_n <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        top = np.argpartition(-scores, top_n - 1)[:top_n] if top_n < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return top, scores[top]
+
+    def _movie_rows(self, movie_ids):
+        movie_ids = np.asarray(list(movie_ids), dtype=np.int64)
+        rows = self.df.index.get_indexer(movie_ids)
+        if (rows < 0).any():
+            raise KeyError(f"数据库中不存在这些电影id: {movie_ids[rows < 0].tolist()}")
+        return rows
+
+    @staticmethod
+    def _profile_key(liked_rows, disliked_rows, top_n, dislike_weight):
+        # 画像与电影的选择顺序无关，用集合作为缓存键
+        return ('profile', frozenset(liked_rows.tolist()), frozenset(disliked_rows.tolist()), top_n, dislike_weight)
+
+    def _profile_frame(self, rows, scores):
+        result = self.df.iloc[rows][['title', 'rating', 'category']].copy()
+        result['score'] = scores
+        return result
+
+    def recommend_profile(self, liked_ids, disliked_ids=(), top_n=10, weights=None, dislike_weight=DISLIKE_WEIGHT):
+        """
+        按多部电影组成的口味画像推荐：一次向量化计算出画像向量，再与全部电影打分。
+
+        比对每部种子电影分别查询再合并更快，而且推荐的是与这些电影整体最接近的电影，
+        不会被其中某一部的近邻占满。需要随用户选择逐步更新时使用 TasteProfile。
+
+        参数:
+        - liked_ids (list): 喜欢的电影id。
+        - disliked_ids (list): 不喜欢的电影id，与它们相似的电影排名会降低。
+        - top_n (int): 推荐数量，种子电影不计入。
+        - weights (dict): 临时使用的字段权重，见 _neighbors。
+        - dislike_weight (float): 不喜欢的电影在画像中的权重。
+
+        返回:
+        - DataFrame: 以id为索引，包含 title、rating、category、score 列。
+        """
+        liked_rows, disliked_rows = self._movie_rows(liked_ids), self._movie_rows(disliked_ids)
+        key = self._profile_key(liked_rows, disliked_rows, top_n, dislike_weight)
+
+        def compute():
+            with instrumentation.span('recommend.profile', rows=len(liked_rows) + len(disliked_rows)):
+                rows, scores = self._profile_neighbors(
+                    _row_sum(self.vectors, liked_rows), len(liked_rows),
+                    _row_sum(self.vectors, disliked_rows), len(disliked_rows),
+                    np.concatenate([liked_rows, disliked_rows]), top_n, weights, dislike_weight)
+                return self._profile_frame(rows, scores)
+
+        return self.cached_result(key, compute, weights)
+
+    def recommend_by_id(self, movie_id, top_n=5, weights=None):
+        """
+        返回与指定id的电影最相似的 top_n 部电影（不含自身）。
+        weights 为临时使用的字段权重，见 _neighbors。
+
+        结果按 (movie_id, top_n, weights) 缓存，重复查询直接返回缓存的 DataFrame（不应修改）。
+
+        返回:
+        - DataFrame: 以id为索引，包含 title、rating、category 列。
+        """
+        key = ('id', int(movie_id), top_n)
+
+        def compute():
+            with instrumentation.span('recommend.query', rows=1):
+                # 1. 找到电影在TF-IDF矩阵中的行号，取出它的近邻
+                matrix_idx = self.df.index.get_loc(movie_id)
+                top_movie_indices, _ = self._neighbors([matrix_idx], top_n, weights)
+                top_movie_indices = top_movie_indices[0][top_movie_indices[0] >= 0]
+
+                # 2. 通过矩阵行号找到DataFrame中的原始id，返回推荐电影的详细信息
+                recommended_movie_ids = self.df.index[top_movie_indices]
+                return self.df.loc[recommended_movie_ids][['title', 'rating', 'category']]
+
+        return self.cached_result(key, compute, weights)
+
+    def recommend_many(self, movie_ids, top_n=5, weights=None):
+        """
+        批量推荐：一次性为多部电影计算各自最相似的 top_n 部电影。
+
+        整批查询只做一次近邻表切片（或一次分块矩阵乘法），没有逐条的Python循环，
+        适合离线为成千上万部电影生成推荐。
+
+        参数:
+        - movie_ids (list): 查询电影的id。
+        - top_n (int): 每部电影的推荐数量。
+        - weights (dict): 临时使用的字段权重，见 _neighbors。
+
+        返回:
+        - DataFrame: 列式结果，每个查询 top_n 行（'ann' 模式下候选不足时可能更少），
+          列为 query_id、rank（从1开始）、movie_id、score。
+        """
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        rows = self._movie_rows(movie_ids)
+
+        with instrumentation.span('recommend.batch', rows=len(movie_ids)):
+            neighbor_rows, scores = self._neighbors(rows, top_n, weights)
+        n_queries, k = neighbor_rows.shape
+        found = neighbor_rows.ravel() >= 0
+        return pd.DataFrame({
+            'query_id': np.repeat(movie_ids, k)[found],
+            'rank': np.tile(np.arange(1, k + 1, dtype=np.int32), n_queries)[found],
+            'movie_id': self.df.index.to_numpy()[neighbor_rows.ravel()[found]],
+            'score': np.asarray(scores, dtype=np.float32).ravel()[found],
+        })
+
+    def get_recommendations(self, partial_title, top_n=5, choose=None, weights=None):
         """
         根据给定的电影标题（支持部分匹配），返回最相似的 top_n 部电影。
+
+        参数:
+        - partial_title (str): 用户输入的（部分）电影标题。
+        - top_n (int): 推荐数量。
+        - choose (function): 匹配到多部电影时的选择函数，接收候选列表，返回选中的候选
+          或 None（表示取消）。不提供时直接返回候选提示，不会阻塞等待输入。
+        - weights (dict): 临时使用的字段权重，如 {'genre': 2, 'plot': 0.5}，不需要重新训练模型。
+
+        返回:
+        - DataFrame 或 str: 推荐结果，或错误/提示信息。
         """
-        if self.df is None or self.df.empty or self.cosine_sim is None:
+        if not self.ready:
             return "模型未初始化或数据库为空，无法提供推荐。"
 
         # 1. 查找部分匹配的电影（忽略大小写）
-        # na=False确保标题中的空值不会导致错误
-        matching_movies = self.df[self.df['title'].str.contains(partial_title, case=False, na=False)]
+        candidates = self.resolve_title(partial_title, limit=MAX_TITLE_CANDIDATES)
 
         # 2. 处理查找结果
-        if matching_movies.empty:
+        if not candidates:
             return f"错误：数据库中未找到任何包含 '{partial_title}' 的电影。"
 
-        chosen_title = None
-        movie_index = None
-
-        if len(matching_movies) == 1:
-            # 2a. 只有一个匹配项，直接选中
-            chosen_title = matching_movies['title'].iloc[0]
-            movie_index = matching_movies.index[0]
-            print(f"已为您精确匹配到电影: 《{chosen_title}》")
+        if len(candidates) == 1 or candidates[0]['title'].lower() == partial_title.strip().lower():
+            # 2a. 只有一个匹配项（或标题完全一致），直接选中
+            chosen = candidates[0]
+            print(f"已为您精确匹配到电影: 《{chosen['title']}》")
+        elif choose is not None:
+            # 2b. 有多个匹配项，交给调用方选择
+            chosen = choose(candidates)
+            if chosen is None:
+                return "操作已取消。"
         else:
-            # 2b. 有多个匹配项，让用户选择
-            print(f"找到多部包含 '{partial_title}' 的电影，请选择一部：")
-            for i, title in enumerate(matching_movies['title']):
-                print(f"  {i + 1}. {title}")
-
-            while True:
-                try:
-                    choice_str = input(f"请输入序号 [1-{len(matching_movies)}] (或输入 'q' 取消): ")
-                    if choice_str.lower() == 'q':
-                        return "操作已取消。"
-
-                    choice_idx = int(choice_str) - 1
-                    if 0 <= choice_idx < len(matching_movies):
-                        chosen_title = matching_movies['title'].iloc[choice_idx]
-                        movie_index = matching_movies.index[choice_idx]
-                        break
-                    else:
-                        print("无效的序号，请重新输入。")
-                except ValueError:
-                    print("请输入一个有效的数字。")
-
-        # --- 从这里开始，我们已经有了一个确定的 movie_index，后续逻辑不变 ---
-
-        # 3. 找到电影在余弦相似度矩阵中的位置
-        matrix_idx = self.df.index.get_loc(movie_index)
-
-        # 4. 获取该电影与其他所有电影的相似度分数
-        sim_scores = list(enumerate(self.cosine_sim[matrix_idx]))
-
-        # 5. 根据相似度分数降序排序
-        sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
-
-        # 6. 获取除了自身以外最相似的 top_n 个电影的矩阵索引
-        top_movie_indices_in_sim = [i[0] for i in sim_scores[1:top_n + 1]]
-
-        # 7. 通过矩阵索引找到DataFrame中的原始id
-        recommended_movie_ids = self.df.iloc[top_movie_indices_in_sim].index
-
-        # 8. 返回推荐电影的详细信息
-        return self.df.loc[recommended_movie_ids][['title', 'rating', 'category']]
\ No newline at end of file
+            titles = '\n'.join(f"  {i + 1}. {c['title']}" for i, c in enumerate(candidates))
+            return f"找到多部包含 '{partial_title}' 的电影，请输入更完整的名称：\n{titles}"
+
+        return self.recommend_by_id(chosen['id'], top_n, weights)
+
+
+class TasteProfile:
+    """
+    随用户选择逐步更新的口味画像。
+
+    只保存喜欢/不喜欢的电影向量之和，每次添加或移除一部电影只加减一行向量，
+    不需要从头重新计算。推荐模型重建或增量更新后，下次推荐时自动按电影id重新求和。
+    """
+
+    def __init__(self, recommender, dislike_weight=DISLIKE_WEIGHT):
+        self.recommender = recommender
+        self.dislike_weight = dislike_weight
+        # 电影id -> True（喜欢）/ False（不喜欢），保持添加顺序
+        self.picks = {}
+        self._sums = None
+        self._vectors = None
+
+    @property
+    def liked(self):
+        return [movie_id for movie_id, liked in self.picks.items() if liked]
+
+    @property
+    def disliked(self):
+        return [movie_id for movie_id, liked in self.picks.items() if not liked]
+
+    def _recompute(self):
+        vectors = self.recommender.vectors
+        self._sums = {True: _row_sum(vectors, self.recommender._movie_rows(self.liked)),
+                      False: _row_sum(vectors, self.recommender._movie_rows(self.disliked))}
+        self._vectors = vectors
+
+    def _apply(self, movie_id, liked, sign):
+        if self._vectors is not self.recommender.vectors:
+            # 模型已更新，稍后整体重新求和
+            self._sums = None
+            return
+        row = self.recommender._movie_rows([movie_id])
+        self._sums[liked] = self._sums[liked] + sign * _row_sum(self._vectors, row)
+
+    def add(self, movie_id, liked=True):
+        """把一部电影加入画像（liked=False 表示不喜欢）；已在画像中的电影会改为新的选择"""
+        movie_id = int(movie_id)
+        self.recommender._movie_rows([movie_id])  # 不存在的id直接抛出 KeyError
+        if movie_id in self.picks:
+            self.remove(movie_id)
+        self.picks[movie_id] = liked
+        if self._sums is not None:
+            self._apply(movie_id, liked, 1)
+
+    def remove(self, movie_id):
+        movie_id = int(movie_id)
+        liked = self.picks.pop(movie_id, None)
+        if liked is not None and self._sums is not None:
+            self._apply(movie_id, liked, -1)
+
+    def clear(self):
+        self.picks.clear()
+        self._sums = None
+
+    def recommend(self, top_n=10, weights=None):
+        """
+        按当前画像推荐，返回格式同 MovieRecommender.recommend_profile。
+        画像中没有电影时返回空的 DataFrame。
+        """
+        recommender = self.recommender
+        liked_rows = recommender._movie_rows(self.liked)
+        disliked_rows = recommender._movie_rows(self.disliked)
+        key = recommender._profile_key(liked_rows, disliked_rows, top_n, self.dislike_weight)
+
+        def compute():
+            if self._sums is None or self._vectors is not recommender.vectors:
+                self._recompute()
+            with instrumentation.span('recommend.profile', rows=len(self.picks)):
+                rows, scores = recommender._profile_neighbors(
+                    self._sums[True], len(liked_rows), self._sums[False], len(disliked_rows),
+                    np.concatenate([liked_rows, disliked_rows]), top_n, weights, self.dislike_weight)
+                return recommender._profile_frame(rows, scores)
+
+        return recommender.cached_result(key, compute, weights)
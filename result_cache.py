@@ -0,0 +1,105 @@
+# result_cache.py
+# 推荐结果缓存：有容量上限的 LRU 缓存，条目带过期时间，并与模型版本绑定。
+#
+# 热门电影会被反复查询，每次都要重新打分、排序。缓存命中时直接返回上次的结果对象，
+# 只需一次字典查找。模型每次重建或增量更新都会递增版本号，版本号变化后整个缓存自动清空，
+# 不会返回旧模型的结果。
+import threading
+import time
+from collections import OrderedDict
+
+import instrumentation
+
+DEFAULT_CACHE_SIZE = 1024
+# 条目的存活时间（秒），None 表示不过期
+DEFAULT_CACHE_TTL = 600.0
+
+
+class ResultCache:
+    """
+    线程安全的 LRU + TTL 缓存。
+
+    每次 get/put 都要带上当前模型版本；与缓存记录的版本不同时先清空缓存（计为一次失效）。
+    命中、未命中、淘汰次数同时累计到 instrumentation 的计数器中，显示在性能统计面板里。
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL, clock=time.monotonic):
+        """
+        参数:
+        - maxsize (int): 最多缓存的结果数，0 表示不缓存。
+        - ttl (float): 条目的存活时间（秒），None 表示只按容量淘汰。
+        - clock (function): 返回当前时间（秒）的函数。
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()  # 键 -> (过期时间, 结果)，最近使用的在末尾
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+                instrumentation.incr('cache.invalidations')
+            self._entries.clear()
+            self._version = version
+
+    def get(self, key, version):
+        """返回缓存的结果，未命中（或已过期）时返回 None"""
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] <= self.clock():
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                instrumentation.incr('cache.misses')
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        instrumentation.incr('cache.hits')
+        return entry[1]
+
+    def put(self, key, version, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._check_version(version)
+            expires = None if self.ttl is None else self.clock() + self.ttl
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                evicted += 1
+            self.evictions += evicted
+        if evicted:
+            instrumentation.incr('cache.evictions', evicted)
+
+    def get_or_compute(self, key, version, compute):
+        """命中时返回缓存的结果，否则调用 compute() 计算并缓存。返回的结果对象是共享的，调用方不应修改"""
+        value = self.get(key, version)
+        if value is None:
+            value = compute()
+            self.put(key, version, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """返回 {'size', 'maxsize', 'hits', 'misses', 'hit_rate', 'evictions', 'expirations', 'invalidations'}"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'size': len(self._entries), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / lookups if lookups else 0.0, 'evictions': self.evictions,
+                    'expirations': self.expirations, 'invalidations': self.invalidations}
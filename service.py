@@ -0,0 +1,345 @@
+# service.py
+# 无界面的本地推荐服务：HTTP/JSON 接口，多个工作进程共享同一份只读模型。
+#
+# 用法:
+#   python service.py --port 8765 --workers 4
+#   python service.py --index-mode ann --ann-probes 8    # 大型电影库使用近似近邻索引
+#   python service.py --latent-dims 128                  # 使用 128 维潜在语义向量
+#
+# 接口（均返回JSON）:
+#   GET  /health                              服务状态
+#   GET  /search?q=狄仁杰&limit=10              标题搜索
+#   GET  /recommend?id=123&top_n=5             按id推荐（也可用 title=完整或部分标题）
+#   GET  /recommend/batch?ids=1,2,3&top_n=5    批量推荐
+#   POST /recommend/batch  {"ids": [1, 2, 3], "top_n": 5, "weights": {"genre": 2}}
+#   GET  /recommend/profile?liked=1,2&disliked=3&top_n=10   按多部电影组成的口味画像推荐
+#   推荐接口都可以用 weights 参数临时调整字段权重，如 &weights=genre:2,director:1（字段见 field_features）
+#   GET  /stats                               当前工作进程的性能统计和推荐结果缓存的命中率
+#
+# 主进程先确保模型缓存是最新的，再启动工作进程；各工作进程从模型缓存内存映射加载
+# TF-IDF 矩阵和近邻表，操作系统只在内存中保留一份，进程数增加时内存几乎不增加。
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import db_function
+import instrumentation
+import model_store
+import result_cache
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# 单次批量推荐最多允许的电影数
+MAX_BATCH_IDS = 1000
+MAX_TOP_N = 100
+
+
+# 各接口对应的埋点名称
+ROUTE_SPANS = {
+    '/health': 'service.health',
+    '/stats': 'service.stats',
+    '/search': 'service.search',
+    '/recommend': 'service.recommend',
+    '/recommend/batch': 'service.batch',
+    '/recommend/profile': 'service.profile',
+}
+
+
+class ServiceError(Exception):
+    """请求参数错误等需要以 4xx 状态码返回给客户端的错误"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class RecommendService:
+    """把 MovieRecommender 的只读查询包装成可JSON序列化的结果"""
+
+    def __init__(self, recommender):
+        self.recommender = recommender
+        # 预先构建标题索引，避免第一个请求承担构建开销
+        _ = recommender.title_index
+
+    def health(self):
+        df = self.recommender.df
+        return {'status': 'ok', 'pid': os.getpid(), 'movies': 0 if df is None else len(df),
+                'fingerprint': self.recommender.fingerprint}
+
+    def search(self, query, limit=10):
+        if not query:
+            raise ServiceError(400, "缺少参数 q")
+        return {'query': query, 'results': self.recommender.resolve_title(query, limit=limit)}
+
+    def recommend(self, movie_id=None, title=None, top_n=5, weights=None):
+        if movie_id is None:
+            if not title:
+                raise ServiceError(400, "需要提供 id 或 title 参数")
+            candidates = self.recommender.resolve_title(title, limit=10)
+            if not candidates:
+                raise ServiceError(404, f"未找到包含 '{title}' 的电影")
+            exact = [c for c in candidates if c['title'].lower() == title.strip().lower()]
+            if len(candidates) > 1 and not exact:
+                # 与 get_recommendations 一致：有多个候选时不替调用方做选择
+                return {'query': None, 'candidates': candidates, 'results': []}
+            movie_id = (exact or candidates)[0]['id']
+        # 热门电影会被反复查询，单部电影的结果按 (id, top_n, weights) 缓存，模型更新后自动失效
+        try:
+            results = self.recommender.cached_result(
+                ('service.recommend', int(movie_id), top_n),
+                lambda: self.batch([movie_id], top_n, weights)['results'][str(movie_id)], weights)
+        except ValueError as e:
+            raise ServiceError(400, str(e))
+        return {'query': self._movie(movie_id), 'results': results}
+
+    def batch(self, movie_ids, top_n=5, weights=None):
+        if not movie_ids:
+            raise ServiceError(400, "缺少参数 ids")
+        if len(movie_ids) > MAX_BATCH_IDS:
+            raise ServiceError(400, f"一次最多查询 {MAX_BATCH_IDS} 部电影")
+        try:
+            frame = self.recommender.recommend_many(movie_ids, top_n=top_n, weights=weights)
+        except KeyError as e:
+            raise ServiceError(404, str(e.args[0]))
+        except ValueError as e:
+            raise ServiceError(400, str(e))
+        df = self.recommender.df
+        details = df.loc[frame['movie_id'], ['title', 'rating', 'category']]
+        results = {str(movie_id): [] for movie_id in movie_ids}
+        for query_id, movie_id, score, title, rating, category in zip(
+                frame['query_id'].tolist(), frame['movie_id'].tolist(), frame['score'].tolist(),
+                details['title'].tolist(), details['rating'].tolist(), details['category'].tolist()):
+            results[str(query_id)].append({'id': movie_id, 'title': title, 'rating': rating,
+                                           'category': category, 'score': round(score, 6)})
+        return {'results': results}
+
+    def profile(self, liked_ids, disliked_ids=(), top_n=10, weights=None):
+        if not liked_ids and not disliked_ids:
+            raise ServiceError(400, "需要提供 liked 或 disliked 参数")
+        if len(liked_ids) + len(disliked_ids) > MAX_BATCH_IDS:
+            raise ServiceError(400, f"口味画像最多包含 {MAX_BATCH_IDS} 部电影")
+        try:
+            frame = self.recommender.recommend_profile(liked_ids, disliked_ids, top_n=top_n, weights=weights)
+        except KeyError as e:
+            raise ServiceError(404, str(e.args[0]))
+        except ValueError as e:
+            raise ServiceError(400, str(e))
+        return {'liked': liked_ids, 'disliked': disliked_ids,
+                'results': [{'id': movie_id, 'title': title, 'rating': rating, 'category': category,
+                             'score': round(score, 6)}
+                            for movie_id, title, rating, category, score in zip(
+                                frame.index.tolist(), frame['title'].tolist(), frame['rating'].tolist(),
+                                frame['category'].tolist(), frame['score'].tolist())]}
+
+    def _movie(self, movie_id):
+        row = self.recommender.df.loc[movie_id]
+        return {'id': int(movie_id), 'title': row['title'], 'rating': row['rating'], 'category': row['category']}
+
+
+def _int_param(params, name, default=None, maximum=None):
+    values = params.get(name)
+    if not values:
+        return default
+    try:
+        value = int(values[0])
+    except ValueError:
+        raise ServiceError(400, f"参数 {name} 必须是整数")
+    if value < 1 or (maximum is not None and value > maximum):
+        raise ServiceError(400, f"参数 {name} 超出范围")
+    return value
+
+
+def _parse_ids(value, name='ids'):
+    try:
+        return [int(i) for i in value.split(',') if i.strip()]
+    except ValueError:
+        raise ServiceError(400, f"参数 {name} 必须是逗号分隔的整数")
+
+
+def _parse_weights(value):
+    """解析 'genre:2,director:1' 形式的字段权重，未提供时返回 None"""
+    if not value:
+        return None
+    try:
+        return {field.strip(): float(weight) for field, weight in
+                (item.split(':') for item in value.split(',') if item.strip())}
+    except ValueError:
+        raise ServiceError(400, "参数 weights 的格式应为 字段:权重,字段:权重")
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 保持长连接，负载测试时不必为每个请求重新建立TCP连接
+    protocol_version = 'HTTP/1.1'
+    # 响应头和响应体缓冲后一次发出，并关闭 Nagle 算法，避免小响应被延迟确认拖慢约40毫秒
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+    service = None  # 由工作进程在启动时设置
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def _handle(self, method):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        try:
+            with instrumentation.span(ROUTE_SPANS.get(url.path, 'service.other')):
+                body = self._route(method, url.path, params)
+            self._send(200, body)
+        except ServiceError as e:
+            self._send(e.status, {'error': str(e)})
+        except Exception as e:
+            self._send(500, {'error': f"{type(e).__name__}: {e}"})
+
+    def _route(self, method, path, params):
+        service = self.service
+        top_n = _int_param(params, 'top_n', 5, MAX_TOP_N)
+        weights = _parse_weights(params.get('weights', [''])[0])
+        if path == '/health':
+            return service.health()
+        if path == '/stats':
+            return dict(instrumentation.summary(), result_cache=service.recommender.result_cache.stats())
+        if path == '/search':
+            return service.search(params.get('q', [''])[0], _int_param(params, 'limit', 10, MAX_BATCH_IDS))
+        if path == '/recommend':
+            return service.recommend(_int_param(params, 'id'), params.get('title', [None])[0], top_n, weights)
+        if path == '/recommend/batch':
+            if method == 'POST':
+                payload = self._read_json()
+                ids = payload.get('ids') or []
+                if not all(isinstance(i, int) for i in ids):
+                    raise ServiceError(400, "ids 必须是整数列表")
+                top_n = payload.get('top_n', top_n)
+                if not isinstance(top_n, int) or not 1 <= top_n <= MAX_TOP_N:
+                    raise ServiceError(400, "参数 top_n 超出范围")
+                weights = payload.get('weights', weights)
+                if weights is not None and not isinstance(weights, dict):
+                    raise ServiceError(400, "weights 必须是 {字段: 权重} 对象")
+                return service.batch(ids, top_n, weights)
+            return service.batch(_parse_ids(params.get('ids', [''])[0]), top_n, weights)
+        if path == '/recommend/profile':
+            return service.profile(_parse_ids(params.get('liked', [''])[0], 'liked'),
+                                   _parse_ids(params.get('disliked', [''])[0], 'disliked'),
+                                   _int_param(params, 'top_n', 10, MAX_TOP_N), weights)
+        raise ServiceError(404, f"未知的路径 {path}")
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            return json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            raise ServiceError(400, "请求体不是有效的JSON")
+
+    def _send(self, status, body):
+        data = json.dumps(body, ensure_ascii=False, default=_json_default).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _json_default(value):
+    # numpy 标量
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"无法序列化 {type(value).__name__}")
+
+
+def _serve(listen_socket, store_dir, model_options):
+    """工作进程：从模型缓存加载只读模型，在共享的监听套接字上处理请求"""
+    from recommend import MovieRecommender
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # 由主进程统一处理 Ctrl+C
+    recommender = MovieRecommender(store_dir=store_dir, **model_options)
+    RequestHandler.service = RecommendService(recommender)
+
+    server = ThreadingHTTPServer(listen_socket.getsockname()[:2], RequestHandler, bind_and_activate=False)
+    server.daemon_threads = True
+    server.socket.close()
+    server.socket = listen_socket
+    print(f"工作进程 {os.getpid()} 已就绪，共 {len(recommender.df)} 部电影。", flush=True)
+    server.serve_forever()
+
+
+def prepare_model(store_dir=model_store.DEFAULT_STORE_DIR, model_options=None):
+    """确保模型缓存与数据库一致（必要时完整构建一次），返回电影数"""
+    from recommend import MovieRecommender
+    recommender = MovieRecommender(store_dir=store_dir, **(model_options or {}))
+    if recommender.df is None or recommender.df.empty:
+        return 0
+    return len(recommender.df)
+
+
+def run_service(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=None, store_dir=model_store.DEFAULT_STORE_DIR,
+                model_options=None):
+    """
+    启动推荐服务，阻塞直到 Ctrl+C。
+
+    参数:
+    - host, port: 监听地址，默认只监听本机。
+    - workers (int): 工作进程数，默认与CPU核数相同。
+    - store_dir (str): 模型缓存目录，所有工作进程从这里内存映射加载同一份模型。
+    - model_options (dict): 传给 MovieRecommender 的其它参数，如 index_mode、ann_probes。
+    """
+    model_options = model_options or {}
+    print("正在准备推荐模型...")
+    movies = prepare_model(store_dir, model_options)
+    if not movies:
+        print("数据库为空，无法启动推荐服务。")
+        return
+    # 工作进程会自己打开数据库连接，主进程的连接不需要保留
+    db_function.close_all_connections()
+
+    listen_socket = socket.create_server((host, port), backlog=128)
+    workers = workers or os.cpu_count() or 1
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=_serve, args=(listen_socket, store_dir, model_options), daemon=True)
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    print(f"推荐服务已启动: http://{host}:{listen_socket.getsockname()[1]} ，"
+          f"{workers} 个工作进程，共 {movies} 部电影。按 Ctrl+C 停止。")
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        print("正在停止推荐服务...")
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+        listen_socket.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="本地电影推荐HTTP服务")
+    parser.add_argument('--host', default=DEFAULT_HOST, help="监听地址")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="监听端口")
+    parser.add_argument('--workers', type=int, default=None, help="工作进程数，默认与CPU核数相同")
+    parser.add_argument('--store-dir', default=model_store.DEFAULT_STORE_DIR, help="模型缓存目录")
+    parser.add_argument('--index-mode', choices=('exact', 'ann'), default='exact',
+                        help="近邻检索方式：exact 为精确近邻表，ann 为分簇近似索引")
+    parser.add_argument('--ann-clusters', type=int, default=None, help="ann 模式的簇数，默认按电影数自动选择")
+    parser.add_argument('--ann-probes', type=int, default=8, help="ann 模式查询时探查的簇数")
+    parser.add_argument('--latent-dims', type=int, default=None, help="潜在语义向量的维数（建议64~256），默认直接使用TF-IDF")
+    parser.add_argument('--cache-size', type=int, default=result_cache.DEFAULT_CACHE_SIZE,
+                        help="每个工作进程缓存的推荐结果数，0 表示不缓存")
+    parser.add_argument('--cache-ttl', type=float, default=result_cache.DEFAULT_CACHE_TTL,
+                        help="缓存结果的存活时间（秒）")
+    args = parser.parse_args()
+    sys.exit(run_service(args.host, args.port, args.workers, args.store_dir,
+                         {'index_mode': args.index_mode, 'ann_clusters': args.ann_clusters,
+                          'ann_probes': args.ann_probes, 'latent_dims': args.latent_dims,
+                          'cache_size': args.cache_size, 'cache_ttl': args.cache_ttl}))
@@ -0,0 +1,128 @@
+# service_loadtest.py
+# 推荐服务的负载测试：多个客户端进程各自保持一个长连接，持续发送搜索、单部推荐和批量推荐请求。
+#
+# 用法:
+#   python service.py --workers 4            # 先在另一个终端启动服务
+#   python service_loadtest.py --concurrency 8 --duration 10
+import argparse
+import http.client
+import json
+import multiprocessing
+import random
+import sqlite3
+import time
+from contextlib import closing
+from urllib.parse import quote
+
+import db_function
+from service import DEFAULT_HOST, DEFAULT_PORT
+
+# 各类请求所占的比例
+DEFAULT_MIX = {'search': 0.3, 'recommend': 0.6, 'batch': 0.1}
+DEFAULT_BATCH_SIZE = 20
+
+
+def sample_movies(db_path, size, seed):
+    """从数据库中随机抽取用于构造请求的 (id, title)"""
+    with closing(sqlite3.connect(db_path)) as conn:
+        rows = conn.execute('SELECT id, title FROM movies').fetchall()
+    return random.Random(seed).sample(rows, min(size, len(rows)))
+
+
+def _make_request(rng, movies, mix, batch_size):
+    kind = rng.choices(list(mix), weights=list(mix.values()))[0]
+    movie_id, title = rng.choice(movies)
+    if kind == 'search':
+        offset = rng.randrange(max(len(title) - 1, 1))
+        return kind, 'GET', f"/search?q={quote(title[offset:offset + 2])}", None
+    if kind == 'recommend':
+        return kind, 'GET', f"/recommend?id={movie_id}&top_n=10", None
+    ids = [m[0] for m in rng.sample(movies, min(batch_size, len(movies)))]
+    return kind, 'POST', '/recommend/batch', json.dumps({'ids': ids, 'top_n': 10})
+
+
+def _client(host, port, movies, mix, batch_size, duration, seed):
+    """单个客户端进程：在 duration 秒内串行发送请求，返回 {类型: [耗时...]} 和错误数"""
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    latencies = {kind: [] for kind in mix}
+    errors = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        kind, method, path, body = _make_request(rng, movies, mix, batch_size)
+        start = time.perf_counter()
+        try:
+            headers = {'Content-Type': 'application/json'} if body else {}
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+                continue
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        latencies[kind].append(time.perf_counter() - start)
+    conn.close()
+    return latencies, errors
+
+
+def run_load_test(host=DEFAULT_HOST, port=DEFAULT_PORT, concurrency=8, duration=10.0, db_path=None,
+                  mix=None, batch_size=DEFAULT_BATCH_SIZE, seed=0):
+    """
+    运行负载测试并打印结果。
+
+    返回:
+    - dict: 总请求数、错误数、每秒请求数，以及各类请求的 p50/p95/p99 延迟（毫秒）
+    """
+    from benchmark import latency_summary
+    mix = mix or DEFAULT_MIX
+    movies = sample_movies(db_path or db_function.DATABASE, 5000, seed)
+    if not movies:
+        print("数据库为空，无法构造请求。")
+        return None
+
+    context = multiprocessing.get_context('spawn')
+    start = time.perf_counter()
+    with context.Pool(concurrency) as pool:
+        outputs = pool.starmap(_client, [(host, port, movies, mix, batch_size, duration, seed + i)
+                                         for i in range(concurrency)])
+    elapsed = time.perf_counter() - start
+
+    report = {'concurrency': concurrency, 'duration_s': elapsed, 'requests': 0,
+              'errors': sum(errors for _, errors in outputs)}
+    for kind in mix:
+        samples = [value for latencies, _ in outputs for value in latencies[kind]]
+        report['requests'] += len(samples)
+        report[f'{kind}_requests'] = len(samples)
+        report.update(latency_summary(samples, kind))
+    # 客户端进程的启动时间不计入，按请求实际发送的时长计算吞吐量
+    report['requests_per_s'] = report['requests'] / duration
+
+    print(f"并发 {concurrency}，{duration:.0f} 秒内完成 {report['requests']} 个请求"
+          f"（错误 {report['errors']} 个），{report['requests_per_s']:.1f} 请求/秒")
+    for kind in mix:
+        if report[f'{kind}_requests']:
+            print(f"  {kind:<10} {report[f'{kind}_requests']:>7} 个  p50 {report[f'{kind}_p50_ms']:.2f} ms  "
+                  f"p95 {report[f'{kind}_p95_ms']:.2f} ms  p99 {report[f'{kind}_p99_ms']:.2f} ms")
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="推荐服务负载测试")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--concurrency', type=int, default=8, help="并发客户端（进程）数")
+    parser.add_argument('--duration', type=float, default=10.0, help="测试时长（秒）")
+    parser.add_argument('--db', default=db_function.DATABASE, help="用于抽取请求参数的电影数据库")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="批量推荐每次包含的电影数")
+    parser.add_argument('--output', help="把结果写入该JSON文件")
+    args = parser.parse_args()
+
+    result = run_load_test(args.host, args.port, args.concurrency, args.duration, args.db,
+                           batch_size=args.batch_size)
+    if result and args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,102 @@
+# startup_report.py
+# 启动耗时报告：各入口模块的导入耗时（按顶层包汇总）以及 jieba 词典加载、推荐模型加载等初始化耗时。
+#
+# 每项都在全新的子进程中测量，不受当前进程已导入模块的影响。导入耗时来自 `python -X importtime`。
+#
+# 用法:
+#   python startup_report.py                       # 默认测量 gui、recommend、crawler、text_segment
+#   python startup_report.py --modules gui --top 10
+#   python startup_report.py --gui                 # 另外启动一次界面（无窗口模式），测量窗口显示和模型可用的时间
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MODULES = ['gui', 'recommend', 'crawler', 'text_segment']
+DEFAULT_TOP = 8
+
+_IMPORTTIME_LINE = re.compile(r'import time:\s+(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)')
+
+
+def _run_python(args, env=None, cwd=None):
+    env = dict(os.environ, **(env or {}))
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [PACKAGE_DIR, env.get('PYTHONPATH')]))
+    return subprocess.run([sys.executable] + args, capture_output=True, text=True, encoding='utf-8',
+                          errors='replace', env=env, cwd=cwd or os.getcwd())
+
+
+def import_costs(module):
+    """
+    在子进程中导入 module，解析 -X importtime 的输出。
+
+    返回:
+    - a tuple: (总耗时（秒）, {顶层包: 自身耗时之和（秒）})
+    """
+    result = _run_python(['-X', 'importtime', '-c', f'import {module}'])
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{result.stderr[-2000:]}")
+    total, packages = 0.0, {}
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0.0) + int(self_us) / 1e6
+        if name == module:
+            total = int(cumulative_us) / 1e6
+    return total, packages
+
+
+def jieba_costs():
+    """jieba 词典的加载耗时：没有序列化缓存时从词典文本构建，以及有缓存时直接加载"""
+    code = ('import time, text_segment; start = time.perf_counter(); text_segment.load_jieba(); '
+            'print(time.perf_counter() - start)')
+    work_dir = tempfile.mkdtemp(prefix='startup_report_')
+    try:
+        costs = {}
+        for label in ('构建词典（无缓存）', '从缓存加载'):
+            result = _run_python(['-c', code], cwd=work_dir)
+            costs[label] = float(result.stdout.strip().splitlines()[-1]) if result.returncode == 0 else None
+        return costs
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def gui_costs():
+    """以无窗口模式启动一次界面，返回 gui_main --startup-report 输出的报告"""
+    result = _run_python([os.path.join(PACKAGE_DIR, 'gui_main.py'), '--startup-report'],
+                         env={'QT_QPA_PLATFORM': 'offscreen'})
+    lines = [line for line in result.stdout.splitlines() if line.strip()]
+    return '\n'.join(lines) if result.returncode == 0 else f"界面启动失败:\n{result.stderr[-2000:]}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="测量各模块的导入耗时和启动时的初始化耗时")
+    parser.add_argument('--modules', nargs='+', default=DEFAULT_MODULES, help="要测量的入口模块")
+    parser.add_argument('--top', type=int, default=DEFAULT_TOP, help="每个模块列出耗时最多的几个顶层包")
+    parser.add_argument('--gui', action='store_true', help="另外测量界面的窗口显示和模型可用时间（需要 PyQt5）")
+    args = parser.parse_args()
+
+    print("== 导入耗时（全新进程，包含全部依赖）==")
+    for module in args.modules:
+        try:
+            total, packages = import_costs(module)
+        except RuntimeError as e:
+            print(e)
+            continue
+        print(f"{module}: {total:.3f} 秒")
+        for package, seconds in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"    {package:<24}{seconds:>8.3f} 秒  {seconds / total:>6.1%}" if total else f"    {package}")
+
+    print("\n== jieba 词典 ==")
+    for label, seconds in jieba_costs().items():
+        print(f"  {label:<16}{'失败' if seconds is None else f'{seconds:.3f} 秒'}")
+
+    if args.gui:
+        print("\n== 界面启动 ==")
+        print(gui_costs())
@@ -0,0 +1,185 @@
+# table_model.py
+# “浏览数据”页使用的表格模型：按页从数据库懒加载，只在内存中保留最近访问的若干页。
+from collections import OrderedDict
+
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, QObject, QThread, Qt, pyqtSignal, pyqtSlot
+
+import db_function
+
+# 每次从数据库读取的行数
+PAGE_SIZE = 200
+# 内存中最多缓存的页数，超出后淘汰最久未访问的页
+MAX_CACHED_PAGES = 50
+
+COLUMNS = ['id', 'title', 'rating', 'category']
+HEADERS = ["ID", "标题", "评分", "类别"]
+
+
+class PageReader(QObject):
+    """在后台线程中读取数据库的对象，读完后通过信号把结果交回模型"""
+    countLoaded = pyqtSignal(int, int)  # (代数, 总行数)
+    pageLoaded = pyqtSignal(int, int, object)  # (代数, 页号, 行列表)
+    error = pyqtSignal(str)
+
+    def __init__(self):
+        super().__init__()
+        # 模型每次重置时递增；读取请求排队期间若代数已变化，说明结果已过期，直接跳过
+        self.generation = 0
+
+    @pyqtSlot(int)
+    def load_count(self, generation):
+        if generation != self.generation:
+            return
+        try:
+            db_function.create_movies_table()  # 确保表和排序用的索引存在
+            self.countLoaded.emit(generation, db_function.count_movies())
+        except Exception as e:
+            self.error.emit(str(e))
+
+    @pyqtSlot(int, int, object, int, str, bool)
+    def load_page(self, generation, page, after, page_size, order_by, descending):
+        if generation != self.generation:
+            return
+        try:
+            rows = db_function.get_movies_page(page_size, after=after, order_by=order_by, descending=descending)
+            self.pageLoaded.emit(generation, page, rows)
+        except Exception as e:
+            self.error.emit(str(e))
+
+
+class MovieTableModel(QAbstractTableModel):
+    """
+    虚拟化的电影表格模型。
+
+    视图滚动到底部时通过 canFetchMore/fetchMore 按页追加行，数据由后台线程读取，界面不会卡顿。
+    已加载的页放在LRU缓存里，最多保留 MAX_CACHED_PAGES 页；被淘汰的页再次显示时重新读取，
+    所以无论表有多大，内存占用都是恒定的。排序在数据库中完成，只支持 SORTABLE_COLUMNS 中的列。
+    每页只记住最后一行的翻页键，读取下一页或重新读取被淘汰的页都用键集分页，滚动再深也不会变慢。
+    """
+    # 发给后台读取线程的请求
+    _requestCount = pyqtSignal(int)
+    _requestPage = pyqtSignal(int, int, object, int, str, bool)
+    # 总行数更新后发出，参数为总行数
+    totalChanged = pyqtSignal(int)
+    error = pyqtSignal(str)
+
+    def __init__(self, parent=None, page_size=PAGE_SIZE, max_cached_pages=MAX_CACHED_PAGES):
+        super().__init__(parent)
+        self.page_size = page_size
+        self.max_cached_pages = max_cached_pages
+        self.order_by = 'id'
+        self.descending = False
+        self.total = 0
+        self._loaded_rows = 0  # 已经插入到视图中的行数
+        self._pages = OrderedDict()  # 页号 -> 行列表
+        self._page_keys = []  # 第 i 项是第 i 页最后一行的翻页键
+        self._pending = set()  # 已发出请求但尚未返回的页号
+        self._generation = 0
+
+        self._thread = QThread()
+        self._reader = PageReader()
+        self._reader.moveToThread(self._thread)
+        self._requestCount.connect(self._reader.load_count)
+        self._requestPage.connect(self._reader.load_page)
+        self._reader.countLoaded.connect(self._on_count_loaded)
+        self._reader.pageLoaded.connect(self._on_page_loaded)
+        self._reader.error.connect(self.error)
+        self._thread.start()
+
+    def shutdown(self):
+        """停止后台读取线程（关闭窗口时调用）"""
+        self._thread.quit()
+        self._thread.wait()
+
+    # --- Qt 模型接口 ---
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._loaded_rows
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        page, offset = divmod(index.row(), self.page_size)
+        rows = self._pages.get(page)
+        if rows is None:
+            # 该页已被淘汰，先显示占位文字，读取完成后再刷新
+            self._request_page(page)
+            return "加载中..." if index.column() == 1 else None
+        self._pages.move_to_end(page)
+        if offset >= len(rows):
+            return None
+        return str(rows[offset][index.column()])
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._loaded_rows < self.total
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        self._request_page(self._loaded_rows // self.page_size)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if COLUMNS[column] not in db_function.SORTABLE_COLUMNS:
+            return
+        descending = order == Qt.DescendingOrder
+        if (COLUMNS[column], descending) == (self.order_by, self.descending):
+            return
+        self.order_by, self.descending = COLUMNS[column], descending
+        self.refresh()
+
+    # --- 数据加载 ---
+    def refresh(self):
+        """丢弃所有缓存的页，按当前排序从头重新加载"""
+        self.beginResetModel()
+        self._generation += 1
+        self._reader.generation = self._generation
+        self._pages.clear()
+        self._page_keys = []
+        self._pending.clear()
+        self._loaded_rows = 0
+        self.total = 0
+        self.endResetModel()
+        self._requestCount.emit(self._generation)
+
+    def _request_page(self, page):
+        if page in self._pending or page in self._pages or page > len(self._page_keys):
+            return
+        after = self._page_keys[page - 1] if page else None
+        self._pending.add(page)
+        self._requestPage.emit(self._generation, page, after, self.page_size, self.order_by, self.descending)
+
+    def _on_count_loaded(self, generation, total):
+        if generation != self._generation:
+            return
+        self.total = total
+        self.totalChanged.emit(total)
+        if total:
+            self.fetchMore()
+
+    def _on_page_loaded(self, generation, page, rows):
+        if generation != self._generation:
+            return
+        self._pending.discard(page)
+        self._pages[page] = rows
+        while len(self._pages) > self.max_cached_pages:
+            self._pages.popitem(last=False)
+
+        first = page * self.page_size
+        if first == self._loaded_rows:
+            # 视图末尾的新一页：追加行，并记住它的翻页键
+            if rows:
+                self._page_keys.append(db_function.row_key(rows[-1], self.order_by))
+                self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+                self._loaded_rows += len(rows)
+                self.endInsertRows()
+        elif first < self._loaded_rows:
+            # 重新读取的已淘汰页：通知视图刷新这一段
+            last = min(first + self.page_size, self._loaded_rows) - 1
+            self.dataChanged.emit(self.index(first, 0), self.index(last, len(COLUMNS) - 1))
@@ -0,0 +1,288 @@
+# task_scheduler.py
+# 界面的后台任务调度：导入、爬取、模型加载/更新、推荐查询都作为任务提交到同一个 QThreadPool，可以同时进行。
+#
+# - 优先级：排队的任务按优先级出队；线程池总会为交互任务（PRIORITY_INTERACTIVE）保留 RESERVED_THREADS 个线程，
+#   长时间的导入、爬取占满其余线程时，推荐查询仍然可以立即开始。
+# - 分组：同一分组的任务依次执行。读写推荐模型的任务同属 'model' 组，查询不会读到更新了一半的模型；
+#   组内排队的任务同样按优先级出队，查询会排在等待中的模型重建前面。
+# - 取消：排队中的任务直接丢弃；运行中的任务在下一次报告进度时抛出 TaskCancelled 退出，
+#   不报告进度的任务会运行完，但结果被丢弃。
+# - 任务的状态和最近一条进度信息变化时发出 TaskScheduler.taskChanged，界面据此刷新任务列表。
+#
+# 任务的 progress/result/error/finished 信号都在界面线程中发出，可以直接连接到任意槽函数或 lambda。
+import heapq
+import itertools
+import threading
+import time
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal, pyqtSlot
+
+# 任务优先级，数值越大越先执行
+PRIORITY_INTERACTIVE = 10  # 推荐查询等用户正在等待结果的操作
+PRIORITY_MODEL = 5  # 推荐模型的加载、增量更新和重建
+PRIORITY_BACKGROUND = 0  # 导入、爬取等长时间任务
+
+DEFAULT_MAX_THREADS = 4
+# 为交互任务保留的线程数
+RESERVED_THREADS = 1
+# 任务列表中最多保留的已结束任务数，超出后丢弃最早结束的
+MAX_FINISHED_TASKS = 50
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+STATE_LABELS = {QUEUED: "排队中", RUNNING: "运行中", DONE: "已完成", FAILED: "失败", CANCELLED: "已取消"}
+
+
+class TaskCancelled(BaseException):
+    """
+    任务被取消时从进度回调中抛出。
+
+    继承 BaseException 而不是 Exception，任务函数里用来兜底的 except Exception 不会把它吞掉。
+    """
+
+
+class _TaskSignals(QObject):
+    # 对外的信号，由调度器在界面线程中发出
+    progress = pyqtSignal(str)
+    result = pyqtSignal(object)
+    error = pyqtSignal(tuple)
+    finished = pyqtSignal()  # 无论成功、失败还是取消都会发出
+    # 线程池线程 -> 调度器
+    _started = pyqtSignal(int)
+    _progressed = pyqtSignal(int, str)
+    _ended = pyqtSignal(int, str, object)  # (任务id, 结束状态, 结果或异常信息)
+
+
+class Task(QRunnable):
+    """一个后台任务。由 TaskScheduler.submit 创建，不要直接构造"""
+
+    def __init__(self, task_id, name, fn, args, kwargs, priority, group, use_progress_callback, transient=False):
+        super().__init__()
+        self.setAutoDelete(False)  # 由调度器持有引用
+        self.id = task_id
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.group = group
+        self.use_progress_callback = use_progress_callback
+        self.transient = transient
+        self.state = QUEUED
+        self.message = ''
+        self.submitted_at = time.perf_counter()
+        self.started_at = None
+        self.ended_at = None
+        self.signals = _TaskSignals()
+        self._cancel_event = threading.Event()
+        self._dispatched = False
+
+    # 兼容原先 Worker 的用法：task.result.connect(...)
+    @property
+    def progress(self):
+        return self.signals.progress
+
+    @property
+    def result(self):
+        return self.signals.result
+
+    @property
+    def error(self):
+        return self.signals.error
+
+    @property
+    def finished(self):
+        return self.signals.finished
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    @property
+    def active(self):
+        return self.state in (QUEUED, RUNNING)
+
+    def elapsed(self):
+        """运行用时（秒），尚未开始时返回 None"""
+        if self.started_at is None:
+            return None
+        return (self.ended_at or time.perf_counter()) - self.started_at
+
+    def _report(self, message):
+        if self._cancel_event.is_set():
+            raise TaskCancelled()
+        self.signals._progressed.emit(self.id, message)
+
+    def run(self):
+        if self._cancel_event.is_set():
+            self.signals._ended.emit(self.id, CANCELLED, None)
+            return
+        self.signals._started.emit(self.id)
+        kwargs = dict(self.kwargs)
+        if self.use_progress_callback:
+            kwargs['progress_callback'] = self._report
+        try:
+            result = self.fn(*self.args, **kwargs)
+        except TaskCancelled:
+            self.signals._ended.emit(self.id, CANCELLED, None)
+        except Exception as e:
+            self.signals._ended.emit(self.id, FAILED, (type(e), e, e.__traceback__))
+        else:
+            # 运行期间被取消（例如查询已被新的查询取代）时丢弃结果
+            self.signals._ended.emit(self.id, CANCELLED if self._cancel_event.is_set() else DONE, result)
+
+
+class TaskScheduler(QObject):
+    """
+    基于 QThreadPool 的任务调度器，需在界面线程中创建和调用。
+
+    submit 返回 Task，调用方连接它的 result/error/finished 信号处理结果；cancel 取消任务。
+    """
+    taskChanged = pyqtSignal(object)  # 参数为 Task
+
+    def __init__(self, parent=None, max_threads=DEFAULT_MAX_THREADS, reserved_threads=RESERVED_THREADS):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self.max_threads = max_threads
+        self.reserved_threads = min(reserved_threads, max_threads - 1)
+        self.tasks = {}  # 任务id -> Task，按提交顺序
+        self._waiting = []  # (-优先级, 提交序号, 任务id) 组成的堆
+        self._running = set()  # 已交给线程池的任务id
+        self._busy_groups = set()
+        self._ids = itertools.count(1)
+
+    def submit(self, name, fn, *args, priority=PRIORITY_BACKGROUND, group=None, use_progress_callback=False,
+               transient=False, **kwargs):
+        """
+        提交一个任务。
+
+        参数:
+        - name (str): 显示在任务列表中的名称。
+        - fn (function): 在线程池中执行的函数，args/kwargs 原样传给它。
+        - priority (int): 优先级，见 PRIORITY_*。
+        - group (str): 分组，同组任务依次执行；None 表示不限制。
+        - use_progress_callback (bool): 是否给 fn 传入 progress_callback 参数。
+          任务的进度信息和取消检查都经由这个回调完成。
+        - transient (bool): 结束后不保留在任务列表中。用于输入时的标题补全这类频繁的小任务，
+          它们不会挤掉导入、爬取等任务的记录。
+
+        返回:
+        - Task: 提交的任务。
+        """
+        task_id = next(self._ids)
+        task = Task(task_id, name, fn, args, kwargs, priority, group, use_progress_callback, transient)
+        task.signals._started.connect(self._on_started)
+        task.signals._progressed.connect(self._on_progressed)
+        task.signals._ended.connect(self._on_ended)
+        self.tasks[task_id] = task
+        heapq.heappush(self._waiting, (-priority, task_id, task_id))
+        self.taskChanged.emit(task)
+        self._dispatch()
+        return task
+
+    def cancel(self, task):
+        """
+        取消任务。排队中的任务立即结束；运行中的任务在下次报告进度时退出。
+
+        返回:
+        - bool: 任务是否仍在排队或运行（即这次取消是否有效）。
+        """
+        if not task.active:
+            return False
+        task._cancel_event.set()
+        if task._dispatched:
+            task.message = "正在取消..."
+            self.taskChanged.emit(task)
+        else:
+            # 堆中的条目在出队时跳过
+            self._finish(task, CANCELLED, None)
+        return True
+
+    def cancel_all(self):
+        for task in list(self.tasks.values()):
+            self.cancel(task)
+
+    def active_tasks(self):
+        return [task for task in self.tasks.values() if task.active]
+
+    def clear_finished(self):
+        for task_id in [task_id for task_id, task in self.tasks.items() if not task.active]:
+            del self.tasks[task_id]
+
+    def shutdown(self, msecs=-1):
+        """取消全部任务并等待运行中的任务退出，窗口关闭时调用"""
+        self.cancel_all()
+        return self.pool.waitForDone(msecs)
+
+    def _dispatch(self):
+        """按优先级把可以开始的任务交给线程池：同组没有任务在运行，且有空闲线程（后台任务不占用保留线程）"""
+        deferred = []
+        while self._waiting:
+            entry = heapq.heappop(self._waiting)
+            task = self.tasks.get(entry[2])
+            if task is None or task.state != QUEUED:
+                continue
+            limit = self.max_threads
+            if task.priority < PRIORITY_INTERACTIVE:
+                limit -= self.reserved_threads
+            if len(self._running) >= limit or (task.group is not None and task.group in self._busy_groups):
+                deferred.append(entry)
+                continue
+            task._dispatched = True
+            self._running.add(task.id)
+            if task.group is not None:
+                self._busy_groups.add(task.group)
+            self.pool.start(task, task.priority)
+        for entry in deferred:
+            heapq.heappush(self._waiting, entry)
+
+    @pyqtSlot(int)
+    def _on_started(self, task_id):
+        task = self.tasks.get(task_id)
+        if task is not None and task.state == QUEUED:
+            task.state = RUNNING
+            task.started_at = time.perf_counter()
+            self.taskChanged.emit(task)
+
+    @pyqtSlot(int, str)
+    def _on_progressed(self, task_id, message):
+        task = self.tasks.get(task_id)
+        if task is None or not task.active:
+            return
+        task.message = message
+        task.signals.progress.emit(message)
+        self.taskChanged.emit(task)
+
+    @pyqtSlot(int, str, object)
+    def _on_ended(self, task_id, state, payload):
+        task = self.tasks.get(task_id)
+        if task is None:
+            return
+        self._running.discard(task_id)
+        if task.group is not None:
+            self._busy_groups.discard(task.group)
+        if task.active:
+            self._finish(task, state, payload)
+        self._dispatch()
+
+    def _finish(self, task, state, payload):
+        task.state = state
+        task.ended_at = time.perf_counter()
+        if state == DONE:
+            task.message = task.message or "完成"
+            task.signals.result.emit(payload)
+        elif state == FAILED:
+            task.message = f"错误: {payload[1]}"
+            task.signals.error.emit(payload)
+        else:
+            task.message = "已取消"
+        task.signals.finished.emit()
+        if task.transient:
+            self.tasks.pop(task.id, None)
+        self.taskChanged.emit(task)
+        self._prune()
+
+    def _prune(self):
+        finished = [task_id for task_id, task in self.tasks.items() if not task.active]
+        for task_id in finished[:max(0, len(finished) - MAX_FINISHED_TASKS)]:
+            del self.tasks[task_id]
@@ -0,0 +1,40 @@
+# tests/conftest.py
+# 测试共用的夹具：每个测试使用临时目录中的独立 movies.db，不会读写仓库自带的数据库。
+import os
+import sqlite3
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import db_function
+
+# movies 夹具写入的电影数
+SAMPLE_SIZE = 300
+
+
+@pytest.fixture
+def tmp_db(tmp_path, monkeypatch):
+    """切换到临时目录并建好 movies 表，返回数据库文件路径"""
+    monkeypatch.chdir(tmp_path)
+    db_function.close_all_connections()
+    db_function.create_movies_table()
+    yield str(tmp_path / db_function.DATABASE)
+    db_function.close_all_connections()
+
+
+def movie_row(title, rating=8.0, category='剧情', comments='', director='', years=''):
+    """按 MOVIE_COLUMNS 顺序排列的一行"""
+    return (title, rating, category, comments, director, '', '', years, '')
+
+
+@pytest.fixture
+def movies(tmp_db):
+    """在临时数据库中写入仓库自带 movies.db 的前 SAMPLE_SIZE 部电影，返回行数"""
+    with sqlite3.connect(os.path.join(REPO_DIR, 'movies.db')) as source:
+        rows = source.execute('SELECT title, rating, category, comments FROM movies ORDER BY id LIMIT ?',
+                              (SAMPLE_SIZE,)).fetchall()
+    db_function.insert_movies_bulk(rows)
+    return len(rows)
@@ -0,0 +1,84 @@
+# tests/test_crawl.py
+# 爬虫的续爬和条件请求，使用 crawl_fixtures 的本地样例网站。
+import pytest
+
+import crawl_fixtures
+import crawler
+import db_function
+from crawl_frontier import CrawlFrontier, IMPORTED
+from http_cache import HttpCache
+
+PAGES = 3
+PER_PAGE = 5
+
+
+@pytest.fixture
+def site(tmp_db, tmp_path):
+    directory = str(tmp_path / 'site')
+    crawl_fixtures.write_fixture_site(directory, pages=PAGES, per_page=PER_PAGE, seed=0)
+    with crawl_fixtures.FixtureServer(directory) as server:
+        yield server
+
+
+def run(server, tmp_path, **options):
+    return crawler.pachong(PAGES, progress_callback=lambda message: None, base_url=server.base_url,
+                           cache_dir=str(tmp_path / 'http_cache'), workers=4, **options)
+
+
+def test_interrupted_crawl_resumes_saved_payloads(site, tmp_path):
+    # 下载解析完成、写入数据库之前被中断
+    movies, _ = crawler.crawl(1, PAGES, base_url=site.base_url, progress_callback=lambda message: None,
+                              frontier=CrawlFrontier(), cache=HttpCache(str(tmp_path / 'http_cache')))
+    assert len(movies) == PAGES * PER_PAGE
+    assert db_function.count_movies() == 0
+
+    stats = run(site, tmp_path)
+    assert stats['resumed'] == PAGES * PER_PAGE
+    assert stats['requests'] == PAGES
+    assert stats['inserted'] == PAGES * PER_PAGE
+    # 导入后不再保留解析结果
+    with db_function.get_db_connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM crawl_frontier WHERE payload IS NOT NULL').fetchone()[0] == 0
+        assert conn.execute("SELECT COUNT(*) FROM crawl_frontier WHERE kind = 'detail' AND state = ?",
+                            (IMPORTED,)).fetchone()[0] == PAGES * PER_PAGE
+
+
+def test_recrawl_uses_conditional_requests(site, tmp_path):
+    first = run(site, tmp_path)
+    assert first['inserted'] == PAGES * PER_PAGE and first['not_modified'] == 0
+
+    # 不跳过已有电影时，所有页面都重新请求，且全部返回 304 使用缓存，而不是沿用上次保存的结果
+    second = run(site, tmp_path, skip_known=False)
+    assert second['resumed'] == 0
+    assert second['requests'] == PAGES + PAGES * PER_PAGE
+    assert second['not_modified'] == second['requests']
+    assert second['inserted'] == 0
+
+
+def test_deleted_movie_is_fetched_again(site, tmp_path):
+    run(site, tmp_path)
+    with db_function.get_db_connection() as conn:
+        conn.execute('DELETE FROM movies WHERE id = (SELECT MIN(id) FROM movies)')
+        conn.commit()
+
+    stats = run(site, tmp_path)
+    assert stats['resumed'] == 0
+    assert stats['requests'] == PAGES + 1
+    assert stats['not_modified'] == stats['requests']
+    assert stats['inserted'] == 1
+
+
+def test_changed_page_is_downloaded(site, tmp_path):
+    run(site, tmp_path)
+    detail = tmp_path / 'site' / 'movie' / '1.html'
+    html = detail.read_text(encoding='utf-8')
+    detail.write_text(html.replace('剧情：', '剧情：新版简介。'), encoding='utf-8')
+    with db_function.get_db_connection() as conn:
+        conn.execute("DELETE FROM movies")
+        conn.commit()
+
+    stats = run(site, tmp_path)
+    assert stats['not_modified'] == stats['requests'] - 1
+    with db_function.get_db_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM movies WHERE comments LIKE '新版简介。%'").fetchone()[0] == 1
+
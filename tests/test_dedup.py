@@ -0,0 +1,97 @@
+# tests/test_dedup.py
+import sqlite3
+
+import dedup
+import db_function
+from conftest import movie_row
+
+SE7EN_PLOT = ('“暴食”、“贪婪”、“懒惰”、“嫉妒”、“骄傲”、“淫欲”、“愤怒”，这是天主教教义所指的人性七宗罪。'
+              '城市中发生的连坏杀人案，死者恰好都是犯有这些教义的人。凶手故弄玄虚的作案手法，'
+              '令资深冷静的警员沙摩塞（摩根•弗里曼 Morgan Freeman 饰）和血气方刚的新扎警员米尔斯'
+              '（布拉德•皮特 Brad Pitt 饰）都陷入了破案的谜团中。')
+OTHER_PLOT = ('某东南亚政府与跨国企业合作，在落后地区大肆发展基建。美国工程师杰克带着妻子和两个女儿来到这里，'
+              '不料刚刚抵达便遭遇政变，叛军在街头疯狂屠杀外国人，一家人只能在混乱的城市中四处逃亡。')
+
+
+def douban_se7en():
+    # 豆瓣 CSV：标题带外文原名，有年份、导演和简介
+    return dedup.sketch('七宗罪 Se7en', SE7EN_PLOT, '1995-09-22(美国)', '大卫·芬奇 David Fincher')
+
+
+def hdmoli_se7en():
+    # hdmoli 爬虫：只有中文标题和简介（简介末尾被截断、空白不同）
+    return dedup.sketch('七宗罪', SE7EN_PLOT.replace('，', '， ')[:-8])
+
+
+def test_cross_source_pair_confirmed_by_synopsis():
+    assert dedup.match_score(douban_se7en(), hdmoli_se7en()) is not None
+    assert dedup.match_score(hdmoli_se7en(), douban_se7en()) is not None
+
+
+def test_title_only_pair_is_not_confirmed():
+    assert dedup.match_score(dedup.sketch('七宗罪 Se7en', '', '1995', '大卫·芬奇'), dedup.sketch('七宗罪')) is None
+
+
+def test_different_foreign_titles_do_not_match():
+    a = dedup.sketch('无处可逃 The Company You Keep', OTHER_PLOT, '2012', '罗伯特·雷德福')
+    b = dedup.sketch('无处可逃 No Escape', OTHER_PLOT, '2015', '约翰·埃里克·杜得')
+    assert dedup.match_score(a, b) is None
+
+
+def test_same_title_with_different_synopsis_does_not_match():
+    assert dedup.match_score(dedup.sketch('七宗罪', SE7EN_PLOT), dedup.sketch('七宗罪 ', OTHER_PLOT)) is None
+
+
+def test_remake_and_sequel_do_not_match():
+    assert dedup.match_score(dedup.sketch('美女与野兽', '', '1991', '加里·特朗斯代尔'),
+                             dedup.sketch('美女与野兽', '', '2017', '比尔·康顿')) is None
+    assert dedup.match_score(dedup.sketch('速度与激情7', '', '2015'), dedup.sketch('速度与激情8', '', '2017')) is None
+    assert dedup.match_score(dedup.sketch('教父 The Godfather', SE7EN_PLOT),
+                             dedup.sketch('教父 The Godfather Part 2', SE7EN_PLOT)) is None
+
+
+def test_conflicting_director_overrides_synopsis():
+    a = dedup.sketch('七宗罪 Se7en', SE7EN_PLOT, '', '大卫·芬奇')
+    b = dedup.sketch('七宗罪', SE7EN_PLOT, '', '另一位导演')
+    assert dedup.match_score(a, b) is None
+
+
+def test_crawled_row_merges_into_imported_movie(tmp_db):
+    douban = movie_row('七宗罪 Se7en', comments=SE7EN_PLOT, director='大卫·芬奇 David Fincher', years='1995')
+    assert db_function.insert_movies_bulk([douban], detector=dedup.DuplicateDetector('merge')) == (1, 0)
+
+    detector = dedup.DuplicateDetector('merge')
+    crawled = ('七宗罪', 8.8, '犯罪/惊悚', SE7EN_PLOT)
+    assert db_function.insert_movies_bulk([crawled], detector=detector) == (0, 1)
+    assert detector.merged == 1
+    with sqlite3.connect(tmp_db) as conn:
+        assert conn.execute('SELECT COUNT(*) FROM movies').fetchone()[0] == 1
+        assert conn.execute("SELECT action FROM dedup_log").fetchall() == [('merged',)]
+
+
+def test_flag_mode_inserts_and_logs(tmp_db):
+    db_function.insert_movies_bulk([movie_row('七宗罪 Se7en', comments=SE7EN_PLOT, years='1995')],
+                                   detector=dedup.DuplicateDetector('flag'))
+    detector = dedup.DuplicateDetector()
+    assert db_function.insert_movies_bulk([('七宗罪', 8.8, '犯罪', SE7EN_PLOT)], detector=detector) == (1, 0)
+    assert detector.flagged == 1
+
+
+def test_rows_skipped_by_unique_constraint_are_not_indexed(tmp_db):
+    db_function.insert_movies_bulk([movie_row('七宗罪', comments=SE7EN_PLOT)], detector=dedup.DuplicateDetector())
+    with sqlite3.connect(tmp_db) as conn:
+        before = conn.execute('SELECT movie_id, text_signature FROM dedup_signatures').fetchall()
+
+    # 同名的行被 INSERT OR IGNORE 忽略，不能用它的简介覆盖已有电影的签名
+    db_function.insert_movies_bulk([movie_row('七宗罪', comments=OTHER_PLOT)], detector=dedup.DuplicateDetector())
+    with sqlite3.connect(tmp_db) as conn:
+        assert conn.execute('SELECT movie_id, text_signature FROM dedup_signatures').fetchall() == before
+
+
+def test_scan_finds_existing_cross_source_duplicates(tmp_db):
+    db_function.insert_movies_bulk([movie_row('七宗罪 Se7en', comments=SE7EN_PLOT, years='1995'),
+                                    movie_row('七宗罪', comments=SE7EN_PLOT),
+                                    movie_row('无处可逃 No Escape', comments=OTHER_PLOT, years='2015')])
+    with db_function.get_db_connection() as conn:
+        pairs = dedup.scan_duplicates(conn)
+    assert [(title_a, title_b) for _, _, title_a, _, title_b in pairs] == [('七宗罪 Se7en', '七宗罪')]
@@ -0,0 +1,72 @@
+# tests/test_model_store.py
+import os
+
+import numpy as np
+import scipy.sparse as sp
+
+import db_function
+import model_store
+from recommend import MovieRecommender
+
+
+def save(store_dir, fingerprint, variant='exact', keep=()):
+    matrix = sp.random(20, 30, density=0.2, format='csr', random_state=0, dtype=np.float64)
+    model_store.save_model(str(store_dir), fingerprint, {'plot': ['a', 'b']}, np.arange(30, dtype=np.float64),
+                           matrix, {'movie_ids': np.arange(20, dtype=np.int64)}, variant=variant, keep=keep)
+    return matrix
+
+
+def test_save_load_round_trip(tmp_path):
+    matrix = save(tmp_path, 'f1')
+    stored = model_store.load_model(str(tmp_path), 'f1')
+    assert stored['vocabulary'] == {'plot': ['a', 'b']}
+    assert np.array_equal(stored['idf'], np.arange(30))
+    assert np.array_equal(stored['movie_ids'], np.arange(20))
+    assert (stored['tfidf_matrix'] != matrix).nnz == 0
+    assert isinstance(stored['movie_ids'], np.memmap)
+    assert model_store.load_model(str(tmp_path), 'missing') is None
+
+
+def test_fingerprint_changes_on_same_length_edits(tmp_db, movies):
+    with db_function.get_db_connection() as conn:
+        before = model_store.table_fingerprint(conn)
+        assert model_store.table_fingerprint(conn) == before
+        # 长度不变的修改和相互抵消的评分修改，聚合值都不变，只有修订号能发现
+        conn.execute("UPDATE movies SET title = title || '' , comments = upper(comments) WHERE id = 1")
+        conn.execute('UPDATE movies SET rating = rating + 1 WHERE id = 1')
+        conn.execute('UPDATE movies SET rating = rating - 1 WHERE id = 2')
+        conn.commit()
+        assert model_store.table_fingerprint(conn) != before
+        assert model_store.table_fingerprint(conn, extra={'top_k': 5}) != model_store.table_fingerprint(conn)
+
+
+def test_prune_keeps_other_variants_and_mapped_versions(tmp_path):
+    save(tmp_path, 'exact1', 'exact')
+    save(tmp_path, 'latent1', 'latent')
+    save(tmp_path, 'exact2', 'exact')
+    save(tmp_path, 'exact3', 'exact', keep=['exact1'])
+    # exact1 正在被映射，exact2 是上一个版本，latent1 属于另一种模式
+    assert sorted(os.listdir(tmp_path)) == ['exact1', 'exact2', 'exact3', 'latent1']
+    save(tmp_path, 'exact4', 'exact')
+    assert sorted(os.listdir(tmp_path)) == ['exact3', 'exact4', 'latent1']
+
+
+def test_modes_share_a_store_without_rebuilding_each_other(movies, tmp_path):
+    store_dir = str(tmp_path / 'model_cache')
+    exact = MovieRecommender(top_k=10, store_dir=store_dir, workers=1)
+    latent = MovieRecommender(top_k=10, store_dir=store_dir, workers=1, latent_dims=16)
+    assert exact.fingerprint != latent.fingerprint
+    # 构建潜在语义模型不会删除精确模式的模型，也不会删除自己正在映射的版本
+    assert model_store.load_model(store_dir, exact.fingerprint) is not None
+    assert model_store.load_model(store_dir, latent.fingerprint) is not None
+
+
+def test_stale_model_is_not_loaded(movies, tmp_path):
+    store_dir = str(tmp_path / 'model_cache')
+    recommender = MovieRecommender(top_k=10, store_dir=store_dir, workers=1)
+    with db_function.get_db_connection() as conn:
+        conn.execute('UPDATE movies SET comments = upper(comments) WHERE id = 1')
+        conn.commit()
+        fingerprint = model_store.table_fingerprint(conn, extra=recommender._model_options())
+    assert fingerprint != recommender.fingerprint
+    assert model_store.load_model(store_dir, fingerprint) is None
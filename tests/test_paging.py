@@ -0,0 +1,51 @@
+# tests/test_paging.py
+import pytest
+
+import db_function
+from conftest import SAMPLE_SIZE
+
+PAGE_SIZE = 7
+
+
+def expected_rows(order_by, descending):
+    """用一次完整的 ORDER BY 查询得到的参照顺序（值相同时按 id）"""
+    direction = 'DESC' if descending else 'ASC'
+    order = f'id {direction}' if order_by == 'id' else f'{order_by} {direction}, id {direction}'
+    with db_function.get_db_connection() as conn:
+        return conn.execute(f'SELECT id, title, rating, category FROM movies ORDER BY {order}').fetchall()
+
+
+@pytest.mark.parametrize('order_by', db_function.SORTABLE_COLUMNS)
+@pytest.mark.parametrize('descending', [False, True])
+def test_forward_and_backward_pages_cover_every_row_once(movies, order_by, descending):
+    expected = expected_rows(order_by, descending)
+    assert len(expected) == SAMPLE_SIZE
+
+    forward, page = [], db_function.get_movies_page(PAGE_SIZE, order_by=order_by, descending=descending)
+    while page:
+        forward.extend(page)
+        page = db_function.get_movies_page(PAGE_SIZE, after=db_function.row_key(page[-1], order_by),
+                                           order_by=order_by, descending=descending)
+    assert forward == expected
+
+    backward, page = [], db_function.get_movies_page(PAGE_SIZE, order_by=order_by, descending=descending, last=True)
+    while page:
+        backward[:0] = page
+        page = db_function.get_movies_page(PAGE_SIZE, before=db_function.row_key(page[0], order_by),
+                                           order_by=order_by, descending=descending)
+    assert backward == expected
+
+
+def test_keyset_pages_match_offset_pages(movies):
+    movies_page, total_pages = db_function.get_movies_paginated(1, PAGE_SIZE)
+    page = db_function.get_movies_page(PAGE_SIZE)
+    for number in range(1, total_pages + 1):
+        movies_page, _ = db_function.get_movies_paginated(number, PAGE_SIZE)
+        assert page == [tuple(row) for row in movies_page]
+        page = db_function.get_movies_page(PAGE_SIZE, after=db_function.row_key(page[-1]))
+    assert page == []
+
+
+def test_unknown_sort_column_is_rejected(tmp_db):
+    with pytest.raises(ValueError):
+        db_function.get_movies_page(order_by='comments')
@@ -0,0 +1,96 @@
+# tests/test_recommend.py
+import os
+import sqlite3
+
+import numpy as np
+import pytest
+import scipy.sparse as sp
+
+import db_function
+from conftest import REPO_DIR, SAMPLE_SIZE
+from recommend import MovieRecommender, _topk_similar
+
+TOP_K = 10
+
+
+def dense_scores(recommender):
+    """在全部电影上直接算出的 N×N 加权相似度，对角线（自身）排除在外"""
+    vectors = recommender.vectors
+    scores = recommender._query_vectors(vectors) @ vectors.T
+    scores = scores.toarray() if sp.issparse(scores) else np.array(scores)
+    np.fill_diagonal(scores, -np.inf)
+    return scores
+
+
+def assert_matches_dense(neighbor_ids, neighbor_scores, scores, k=TOP_K):
+    """近邻表的分数应等于稠密相似度的前 k 大（分数相同的电影可以任意排列）"""
+    expected = -np.sort(-scores, axis=1)[:, :k]
+    np.testing.assert_allclose(neighbor_scores[:, :k], expected, atol=1e-5)
+    np.testing.assert_allclose(np.take_along_axis(scores, neighbor_ids[:, :k].astype(np.int64), axis=1),
+                               neighbor_scores[:, :k], atol=1e-5)
+
+
+def test_blockwise_topk_matches_dense_cosine():
+    rng = np.random.default_rng(0)
+    matrix = sp.random(120, 60, density=0.1, format='csr', random_state=1, dtype=np.float64)
+    matrix = sp.csr_matrix(matrix.multiply(1 / np.sqrt(matrix.multiply(matrix).sum(axis=1) + 1e-12)))
+    scores = (matrix @ matrix.T).toarray()
+    np.fill_diagonal(scores, -np.inf)
+    # 块很小，迫使结果跨越多个分数块拼接
+    ids, topk_scores = _topk_similar(matrix, matrix, TOP_K, self_rows=np.arange(120), max_block_bytes=8 * 120 * 7)
+    assert_matches_dense(ids, topk_scores, scores)
+    assert not (ids == np.arange(120)[:, None]).any()
+
+    dense = rng.standard_normal((50, 16)).astype(np.float32)
+    dense /= np.linalg.norm(dense, axis=1, keepdims=True)
+    scores = dense @ dense.T
+    np.fill_diagonal(scores, -np.inf)
+    ids, topk_scores = _topk_similar(dense, dense, TOP_K, self_rows=np.arange(50), max_block_bytes=8 * 50 * 3)
+    assert_matches_dense(ids, topk_scores, scores)
+
+
+@pytest.mark.parametrize('latent_dims', [None, 32])
+def test_neighbor_table_matches_dense_cosine(movies, latent_dims):
+    recommender = MovieRecommender(top_k=TOP_K, store_dir=None, workers=1, latent_dims=latent_dims,
+                                   max_block_bytes=64 * 1024)
+    assert recommender.neighbor_ids.shape == (movies, TOP_K)
+    assert_matches_dense(recommender.neighbor_ids, recommender.neighbor_scores, dense_scores(recommender))
+
+
+def more_movies(count):
+    """仓库自带 movies.db 中 movies 夹具之后的 count 部电影"""
+    with sqlite3.connect(os.path.join(REPO_DIR, 'movies.db')) as source:
+        return source.execute('SELECT title, rating, category, comments FROM movies ORDER BY id LIMIT ? OFFSET ?',
+                              (count, SAMPLE_SIZE)).fetchall()
+
+
+@pytest.mark.parametrize('latent_dims', [None, 32])
+def test_incremental_update_matches_exact_recompute(movies, latent_dims):
+    recommender = MovieRecommender(top_k=TOP_K, store_dir=None, workers=1, latent_dims=latent_dims)
+    # 修改一部出现在很多近邻表里的电影，它原来的分数都会失效
+    popular_row = np.bincount(recommender.neighbor_ids.ravel()).argmax()
+    edited_id = int(recommender.df.index[popular_row])
+    with db_function.get_db_connection() as conn:
+        conn.execute("UPDATE movies SET comments = '一个关于太空探险和人工智能的全新故事' WHERE id = ?", (edited_id,))
+        conn.commit()
+    db_function.insert_movies_bulk(more_movies(20))
+    new_ids = [row[0] for row in db_function.get_movies_page(100, after=(int(recommender.df.index.max()),))]
+
+    result = recommender.update_movies([edited_id, *new_ids], persist=False)
+    assert (result['added'], result['updated']) == (20, 1)
+    assert len(recommender.df) == movies + 20
+
+    # 增量结果与在更新后的向量上整体重算的近邻表一致
+    assert_matches_dense(recommender.neighbor_ids, recommender.neighbor_scores, dense_scores(recommender))
+    _, expected_scores = _topk_similar(recommender._query_vectors(recommender.vectors), recommender.vectors, TOP_K,
+                                       self_rows=np.arange(len(recommender.df)))
+    np.testing.assert_allclose(recommender.neighbor_scores, expected_scores, atol=1e-5)
+
+
+def test_update_without_ids_picks_up_new_movies(movies):
+    recommender = MovieRecommender(top_k=TOP_K, store_dir=None, workers=1)
+    db_function.insert_movies_bulk(more_movies(5))
+    result = recommender.update_movies(persist=False)
+    assert (result['added'], result['updated']) == (5, 0)
+    assert_matches_dense(recommender.neighbor_ids, recommender.neighbor_scores, dense_scores(recommender))
+    assert recommender.update_movies(persist=False)['added'] == 0
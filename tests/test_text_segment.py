@@ -0,0 +1,44 @@
+# tests/test_text_segment.py
+import sqlite3
+import time
+
+import text_segment
+
+
+def cache_rows(cache_path):
+    with sqlite3.connect(cache_path) as conn:
+        return dict(conn.execute('SELECT hash, last_used FROM token_cache'))
+
+
+def test_cache_hits_match_fresh_segmentation(tmp_db, tmp_path):
+    cache_path = str(tmp_path / 'cache.db')
+    texts = ['我爱北京天安门', '今天天气不错', '我爱北京天安门']
+    first = text_segment.cut_texts(texts, workers=1, cache_path=cache_path)
+    assert first == text_segment.cut_texts_parallel(texts, workers=1)
+    assert len(cache_rows(cache_path)) == 2
+    assert text_segment.cut_texts(texts, workers=1, cache_path=cache_path) == first
+
+
+def test_unused_entries_expire_and_used_ones_are_refreshed(tmp_db, tmp_path):
+    cache_path = str(tmp_path / 'cache.db')
+    text_segment.cut_texts(['旧的剧情简介', '没有改过的简介'], workers=1, cache_path=cache_path)
+    long_ago = int(time.time()) - 40 * 86400
+    with sqlite3.connect(cache_path) as conn:
+        conn.execute('UPDATE token_cache SET last_used = ?', (long_ago,))
+
+    # 电影简介被编辑：旧内容不再出现，没改过的简介命中缓存并刷新使用时间
+    text_segment.cut_texts(['新的剧情简介', '没有改过的简介'], workers=1, cache_path=cache_path, max_age_days=30)
+    rows = cache_rows(cache_path)
+    assert set(rows) == {text_segment.text_hash('新的剧情简介'), text_segment.text_hash('没有改过的简介')}
+    assert min(rows.values()) > long_ago
+
+
+def test_cache_without_last_used_is_migrated(tmp_db, tmp_path):
+    cache_path = str(tmp_path / 'cache.db')
+    with sqlite3.connect(cache_path) as conn:
+        conn.execute('CREATE TABLE token_cache (hash TEXT PRIMARY KEY, tokens TEXT NOT NULL)')
+        conn.executemany('INSERT INTO token_cache VALUES (?, ?)',
+                         [(text_segment.text_hash('保留的文本'), '保留 的 文本'), ('stale', 'x')])
+
+    assert text_segment.cut_texts(['保留的文本'], workers=1, cache_path=cache_path) == ['保留 的 文本']
+    assert set(cache_rows(cache_path)) == {text_segment.text_hash('保留的文本')}
@@ -0,0 +1,226 @@
+# text_segment.py
+# 中文分词模块：多进程并行分词 + SQLite 持久化分词缓存。
+import argparse
+import hashlib
+import logging
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing, contextmanager
+
+import instrumentation
+from db_function import get_db_connection
+
+# 分词缓存数据库，与 movies.db 分开存放，重置电影数据库不会清空缓存
+TOKEN_CACHE_DB = 'token_cache.db'
+
+# 分词缓存中超过这么多天没有被用到的条目会被删除。每次分词都会刷新命中条目的使用时间，
+# 所以当前数据库中的文本不会过期；被编辑或删除的电影留下的旧条目最终会被清理掉，缓存不会无限增长
+CACHE_MAX_AGE_DAYS = 30
+
+# 每个进程任务处理的文本条数
+DEFAULT_CHUNK_SIZE = 256
+
+# 待分词文本少于该数量时直接在当前进程分词，避免进程池的启动开销
+MIN_PARALLEL_TEXTS = 512
+
+# jieba 前缀词典的序列化缓存（marshal）。jieba 默认放在系统临时目录，可能被清理；
+# 放在工作目录下与分词缓存放在一起，所有进程共用，只有第一次运行需要从词典文本构建
+JIEBA_CACHE_FILE = 'jieba.cache'
+
+# 已加载词典的 jieba 模块；导入 jieba 本身就要约0.2秒，加载词典约1秒，都推迟到第一次分词（或预热）时
+_jieba = None
+_jieba_lock = threading.Lock()
+_warm_up_lock = threading.Lock()
+_warm_up_thread = None
+
+
+def load_jieba():
+    """导入 jieba 并从序列化缓存加载词典，返回 jieba 模块；只有第一次调用有开销，可在多个线程中同时调用"""
+    global _jieba
+    if _jieba is not None:
+        return _jieba
+    with _jieba_lock:
+        if _jieba is None:
+            with instrumentation.span('startup.jieba'):
+                import jieba
+                jieba.setLogLevel(logging.WARNING)
+                jieba.dt.cache_file = os.path.abspath(JIEBA_CACHE_FILE)
+                jieba.initialize()
+            _jieba = jieba
+    return _jieba
+
+
+def warm_up():
+    """
+    在后台线程中预热 jieba，让第一次建模或增量更新不必等待词典加载。
+
+    返回:
+    - threading.Thread: 预热线程；已经预热过（或正在预热）时返回同一个线程。
+    """
+    global _warm_up_thread
+    with _warm_up_lock:
+        if _warm_up_thread is None:
+            _warm_up_thread = threading.Thread(target=load_jieba, name='jieba-warm-up', daemon=True)
+            _warm_up_thread.start()
+    return _warm_up_thread
+
+
+def cut_text(text):
+    """中文分词函数，返回以空格分隔的分词结果"""
+    return " ".join((_jieba or load_jieba()).cut(text))
+
+
+def _init_worker():
+    """子进程初始化：预先加载 jieba 词典（与主进程共用序列化缓存），并关闭各进程重复的加载日志"""
+    load_jieba()
+
+
+def _cut_chunk(texts):
+    """进程池中执行的任务：对一批文本分词"""
+    return [cut_text(text) for text in texts]
+
+
+def text_hash(text):
+    """文本内容的哈希，作为分词缓存的键"""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+@contextmanager
+def _cache_connection(cache_path):
+    with get_db_connection(cache_path) as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS token_cache (
+                hash TEXT PRIMARY KEY,
+                tokens TEXT NOT NULL,
+                last_used INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        # 迁移：旧版本的缓存表没有使用时间，已有条目视为很久没用过，下次命中时再刷新
+        if 'last_used' not in {row[1] for row in conn.execute('PRAGMA table_info(token_cache)')}:
+            conn.execute('ALTER TABLE token_cache ADD COLUMN last_used INTEGER NOT NULL DEFAULT 0')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_token_cache_last_used ON token_cache (last_used)')
+        yield conn
+
+
+def _default_workers():
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+def cut_texts_parallel(texts, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    用进程池对一组文本分词，不使用缓存。
+
+    文本按 chunk_size 分批提交给进程池，每个子进程启动时预先加载 jieba 词典。
+    使用 spawn 方式创建子进程，在GUI等多线程程序中调用也是安全的。
+
+    参数:
+    - texts (list): 待分词的文本。
+    - workers (int): 进程数，None 表示 CPU核数-1，1 表示在当前进程串行分词。
+    - chunk_size (int): 每个任务包含的文本条数。
+
+    返回:
+    - list: 与 texts 一一对应的分词结果。
+    """
+    workers = workers or _default_workers()
+    if workers <= 1 or len(texts) < MIN_PARALLEL_TEXTS:
+        return _cut_chunk(texts)
+
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as pool:
+        results = []
+        for chunk_result in pool.map(_cut_chunk, chunks):
+            results.extend(chunk_result)
+    return results
+
+
+def cut_texts(texts, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, cache_path=TOKEN_CACHE_DB,
+              max_age_days=CACHE_MAX_AGE_DAYS):
+    """
+    对一组文本分词，优先使用分词缓存，只对内容变化过的文本重新分词。
+    用到的缓存条目会刷新使用时间，超过 max_age_days 天没用到的条目在分词后删除。
+
+    参数:
+    - texts (list): 待分词的文本。
+    - workers (int): 并行分词的进程数，含义同 cut_texts_parallel。
+    - chunk_size (int): 每个进程任务包含的文本条数。
+    - cache_path (str): 分词缓存数据库路径，None 表示不使用缓存。
+    - max_age_days (float): 缓存条目的最长闲置天数，None 表示不清理。
+
+    返回:
+    - list: 与 texts 一一对应的分词结果。
+    """
+    texts = list(texts)
+    if cache_path is None:
+        return cut_texts_parallel(texts, workers, chunk_size)
+
+    start = time.perf_counter()
+    now = int(time.time())
+    hashes = [text_hash(text) for text in texts]
+    cached = {}
+    with _cache_connection(cache_path) as conn:
+        unique_hashes = list(dict.fromkeys(hashes))
+        # 分批查询，避免超过SQLite的参数个数上限
+        for i in range(0, len(unique_hashes), 500):
+            batch = unique_hashes[i:i + 500]
+            placeholders = ','.join('?' * len(batch))
+            cached.update(conn.execute(
+                f'SELECT hash, tokens FROM token_cache WHERE hash IN ({placeholders})', batch))
+            conn.execute(f'UPDATE token_cache SET last_used = ? WHERE hash IN ({placeholders})', [now, *batch])
+        # 命中数按缓存中找到的不同内容计算，同一批中重复出现的文本只算一次
+        hits = len(cached)
+
+        # 只对缓存中没有的文本分词（相同内容只分一次）
+        missing = {}
+        for h, text in zip(hashes, texts):
+            if h not in cached and h not in missing:
+                missing[h] = text
+        if missing:
+            results = cut_texts_parallel(list(missing.values()), workers, chunk_size)
+            new_entries = list(zip(missing.keys(), results))
+            cached.update(new_entries)
+            conn.executemany('INSERT OR REPLACE INTO token_cache (hash, tokens, last_used) VALUES (?, ?, ?)',
+                             [(h, tokens, now) for h, tokens in new_entries])
+        pruned = 0
+        if max_age_days is not None:
+            pruned = conn.execute('DELETE FROM token_cache WHERE last_used < ?',
+                                  (now - int(max_age_days * 86400),)).rowcount
+        conn.commit()
+
+    instrumentation.incr('segment.cache_hits', hits)
+    instrumentation.incr('segment.cache_misses', len(missing))
+    print(f"分词完成：共 {len(texts)} 条（不同内容 {len(unique_hashes)} 条），缓存命中 {hits} 条，"
+          f"重新分词 {len(missing)} 条，清理过期缓存 {pruned} 条，用时 {time.perf_counter() - start:.2f} 秒。")
+    return [cached[h] for h in hashes]
+
+
+def _benchmark(db_path, max_workers, chunk_size):
+    """对比不同进程数下的分词耗时，输出加速比"""
+    with closing(sqlite3.connect(db_path)) as conn:
+        rows = conn.execute('SELECT category, comments FROM movies').fetchall()
+    texts = [category.replace('/', ' ') * 3 + ' ' + comments for category, comments in rows]
+    print(f"共 {len(texts)} 条文本，CPU核数 {os.cpu_count()}")
+
+    load_jieba()
+    baseline = None
+    workers = 1
+    while workers <= max_workers:
+        start = time.perf_counter()
+        cut_texts_parallel(texts, workers=workers, chunk_size=chunk_size)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        print(f"进程数 {workers:>2}: {elapsed:7.2f} 秒, {len(texts) / elapsed:8.1f} 条/秒, 加速比 {baseline / elapsed:.2f}x")
+        workers *= 2
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="测试不同进程数下的并行分词速度")
+    parser.add_argument('--db', default='movies.db', help="电影数据库路径")
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1, help="最大进程数")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="每个任务的文本条数")
+    args = parser.parse_args()
+    _benchmark(args.db, args.max_workers, args.chunk_size)
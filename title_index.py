@@ -0,0 +1,98 @@
+# title_index.py
+# 电影标题索引：基于字符 n-gram 的倒排索引，支持子串/前缀查找和候选排序。
+import heapq
+import re
+
+
+def _rating_value(rating):
+    """把评分转换为数字；爬虫写入的评分可能是 '6.8分' 这样的文本"""
+    try:
+        return float(rating)
+    except (TypeError, ValueError):
+        match = re.match(r'\s*(\d+(?:\.\d+)?)', str(rating))
+        return float(match.group(1)) if match else 0.0
+
+
+def _grams(text, n):
+    """文本中所有长度为 n 的字符片段"""
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class TitleIndex:
+    """
+    标题倒排索引。
+
+    对每个标题（转为小写）建立单字和二元字符片段到行号的倒排表。查询时取查询串
+    所有片段中倒排表最短的一个作为候选集，再逐个确认确实包含查询串，
+    因此查询开销只与最稀有片段的出现次数有关，而不是与电影总数有关。
+    """
+
+    def __init__(self, ids=(), titles=(), ratings=()):
+        """
+        参数:
+        - ids: 电影id，与 titles 一一对应。
+        - titles: 电影标题。
+        - ratings: 电影评分，同等匹配程度下评分高的排在前面。
+        """
+        self.ids = []
+        self.titles = []
+        self.ratings = []
+        self._lower_titles = []
+        self._postings = {}
+        self.add(ids, titles, ratings)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def add(self, ids, titles, ratings):
+        """追加一批电影到索引中"""
+        for movie_id, title, rating in zip(ids, titles, ratings):
+            position = len(self.titles)
+            lower = title.lower()
+            self.ids.append(int(movie_id))
+            self.titles.append(title)
+            self.ratings.append(_rating_value(rating))
+            self._lower_titles.append(lower)
+            for gram in _grams(lower, 1) | _grams(lower, 2):
+                self._postings.setdefault(gram, []).append(position)
+
+    def _candidates(self, query):
+        """返回可能包含 query 的行号列表（最短的倒排表）"""
+        grams = _grams(query, 2) if len(query) >= 2 else {query}
+        shortest = None
+        for gram in grams:
+            posting = self._postings.get(gram)
+            if posting is None:
+                return []
+            if shortest is None or len(posting) < len(shortest):
+                shortest = posting
+        return shortest
+
+    def search(self, query, limit=10):
+        """
+        查找标题中包含 query 的电影（忽略大小写），按匹配程度排序。
+
+        排序规则：完全相同 > 前缀匹配 > 其它子串匹配；同一类中匹配位置越靠前、
+        标题越短、评分越高的越靠前。
+
+        返回:
+        - list: 候选电影列表，每项为 {'id', 'title', 'rating'} 字典。
+        """
+        query = query.strip().lower()
+        if not query:
+            return []
+
+        def rank(position):
+            lower = self._lower_titles[position]
+            offset = lower.find(query)
+            if lower == query:
+                kind = 0
+            elif offset == 0:
+                kind = 1
+            else:
+                kind = 2
+            return kind, offset, len(lower), -self.ratings[position]
+
+        matches = [p for p in self._candidates(query) if query in self._lower_titles[p]]
+        best = heapq.nsmallest(limit, matches, key=rank) if limit else sorted(matches, key=rank)
+        return [{'id': self.ids[p], 'title': self.titles[p], 'rating': self.ratings[p]} for p in best]